@@ -0,0 +1,233 @@
+# Offline backtest of the ranking formula (nlp.calculate_final_radar_score).
+# Every restaurant and its review totals are loaded once into numpy arrays; a parameter configuration is then
+# a handful of vector operations over all restaurants, and the sweep is spread over worker processes.
+# Each configuration is compared with the production formula (DEFAULT_PARAMS):
+#   rank_stability  Spearman correlation of its ranking with the production ranking
+#   mean_rank_shift average number of places a restaurant moves
+#   top10_churn     share of the production top 10 that drops out of its top 10
+#   google_corr     Spearman correlation of its scores with the raw Google rating
+# Read-only against DATABASE_URL:
+#   python backtest.py --workers 4 --top 15 --sort google_corr --csv sweep.csv
+import argparse
+import csv
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, fields
+from types import SimpleNamespace
+
+import numpy as np
+from sqlalchemy import func
+
+import models
+from database import SessionLocal
+from nlp import DEFAULT_PARAMS, RankingEngine, ScoringParams
+
+METRICS = ["rank_stability", "mean_rank_shift", "top10_churn", "google_corr"]
+
+
+def load_dataset(db) -> dict:
+    """ One row per restaurant: the formula's inputs, with live and archived reviews folded into weight sums """
+    restaurants = db.query(
+        models.Restaurant.id, models.Restaurant.google_rating,
+        models.Restaurant.google_ratings_total, models.Restaurant.wolt_rating, models.Restaurant.social_volume,
+        models.Restaurant.bayesian_average
+    ).order_by(models.Restaurant.id).all()
+    weight_sums = {}
+    live = db.query(
+        models.Review.restaurant_id,
+        func.sum(func.coalesce(models.Review.weight, 1.0)),
+        func.sum(func.coalesce(models.Review.weight, 1.0) * models.Review.sentiment_score)
+    ).filter(models.Review.sentiment_score.isnot(None)).group_by(models.Review.restaurant_id)
+    archived = db.query(
+        models.ReviewAggregate.restaurant_id,
+        func.sum(models.ReviewAggregate.weight_sum),
+        func.sum(models.ReviewAggregate.weighted_sentiment_sum)
+    ).group_by(models.ReviewAggregate.restaurant_id)
+    for restaurant_id, weight, weighted_sentiment in list(live) + list(archived):
+        total = weight_sums.setdefault(restaurant_id, [0.0, 0.0])
+        total[0] += weight or 0.0
+        total[1] += weighted_sentiment or 0.0
+
+    n = len(restaurants)
+    data = {
+        "id": np.array([r[0] for r in restaurants], dtype=np.int64),
+        "google_rating": np.array([r[1] or 0.0 for r in restaurants], dtype=np.float64),
+        "ratings_total": np.array([r[2] or 0 for r in restaurants], dtype=np.float64),
+        "wolt_rating": np.array([r[3] or 0.0 for r in restaurants], dtype=np.float64),
+        "social_volume": np.array([r[4] or 0 for r in restaurants], dtype=np.float64),
+        "stored_score": np.array([r[5] or 0.0 for r in restaurants], dtype=np.float64),
+        "weight_sum": np.zeros(n),
+        "weighted_sentiment": np.zeros(n),
+    }
+    for i, r in enumerate(restaurants):
+        data["weight_sum"][i], data["weighted_sentiment"][i] = weight_sums.get(r[0], (0.0, 0.0))
+    has_sentiment = data["weight_sum"] > 0
+    data["has_sentiment"] = has_sentiment
+    data["avg_sentiment"] = np.divide(data["weighted_sentiment"], data["weight_sum"],
+                                      out=np.zeros(n), where=has_sentiment)
+    return data
+
+
+def scores(data: dict, p: ScoringParams) -> np.ndarray:
+    """ calculate_final_radar_score for every restaurant at once """
+    n = data["ratings_total"]
+    c = p.confidence_threshold
+    bayesian = (n / (n + c)) * data["google_rating"] + (c / (n + c)) * p.global_avg_rating
+    google = bayesian / 5.0 * p.google_points
+    buzz = np.minimum(p.buzz_points, data["social_volume"] / p.buzz_cap * p.buzz_points)
+    nlp = np.where(data["has_sentiment"], (data["avg_sentiment"] + 1.0) / 2.0 * p.nlp_points, p.nlp_points / 2.0)
+    wolt = np.where(data["wolt_rating"] > 0, data["wolt_rating"] / 10.0 * p.wolt_points, p.wolt_baseline)
+    return np.clip(google + buzz + nlp + wolt, 0.0, 100.0)
+
+
+def ranks(values: np.ndarray) -> np.ndarray:
+    """ 0-based ranks, ties sharing their average rank """
+    order = np.argsort(values, kind="mergesort")
+    _, inverse, counts = np.unique(values[order], return_inverse=True, return_counts=True)
+    ends = np.cumsum(counts)
+    average = (ends - counts + ends - 1) / 2.0
+    result = np.empty(len(values))
+    result[order] = average[inverse]
+    return result
+
+
+def spearman(a: np.ndarray, b: np.ndarray) -> float:
+    if len(a) < 2:
+        return float("nan")
+    ra, rb = ranks(a), ranks(b)
+    if ra.std() == 0 or rb.std() == 0:
+        return float("nan")
+    return float(np.corrcoef(ra, rb)[0, 1])
+
+
+def top_ids(values: np.ndarray, ids: np.ndarray, k: int = 10) -> set:
+    # Highest score first, lower id first among ties, like the API's ORDER BY
+    order = np.lexsort((ids, -values))
+    return set(ids[order[:k]].tolist())
+
+
+def evaluate(data: dict, p: ScoringParams, baseline: dict) -> dict:
+    values = scores(data, p)
+    rated = data["ratings_total"] > 0
+    top = top_ids(values, data["id"])
+    return {
+        "rank_stability": spearman(values, baseline["scores"]),
+        "mean_rank_shift": float(np.abs(ranks(values) - baseline["ranks"]).mean()),
+        "top10_churn": 1.0 - len(top & baseline["top10"]) / max(1, len(baseline["top10"])),
+        "google_corr": spearman(values[rated], data["google_rating"][rated]),
+    }
+
+
+def baseline_for(data: dict) -> dict:
+    values = scores(data, DEFAULT_PARAMS)
+    return {"scores": values, "ranks": ranks(values), "top10": top_ids(values, data["id"])}
+
+
+_worker_data = None
+_worker_baseline = None
+
+def _init_worker(data: dict):
+    # Each process gets the arrays once, not once per configuration
+    global _worker_data, _worker_baseline
+    _worker_data = data
+    _worker_baseline = baseline_for(data)
+
+def _evaluate_chunk(configs: list) -> list:
+    return [dict(asdict(p), **evaluate(_worker_data, p, _worker_baseline)) for p in configs]
+
+
+def default_grid() -> list:
+    """ 852 configurations around the production formula; the four point budgets always add up to 100 """
+    configs = []
+    for google, buzz, nlp in itertools.product([30, 35, 40, 45, 50], [15, 20, 25, 30, 35], [10, 15, 20]):
+        wolt = 100 - google - buzz - nlp
+        if wolt < 5:
+            continue
+        for confidence, cap in itertools.product([25, 50, 100, 200], [10, 20, 40]):
+            configs.append(ScoringParams(
+                google_points=google, buzz_points=buzz, nlp_points=nlp, wolt_points=wolt,
+                confidence_threshold=confidence, buzz_cap=cap,
+                # Same share of the Wolt budget as production's 10 of 15
+                wolt_baseline=round(wolt * 2 / 3, 3)
+            ))
+    return configs
+
+
+def verify(data: dict, limit: int = 500) -> float:
+    """ Largest gap between the vectorized formula and RankingEngine for the first `limit` restaurants """
+    engine = RankingEngine()
+    vector = scores(data, DEFAULT_PARAMS)
+    worst = 0.0
+    for i in range(min(limit, len(vector))):
+        reviews = [SimpleNamespace(weight=data["weight_sum"][i], sentiment_score=data["avg_sentiment"][i])] \
+            if data["has_sentiment"][i] else []
+        scalar = engine.calculate_final_radar_score(
+            data["google_rating"][i], data["ratings_total"][i], reviews,
+            wolt_rating=data["wolt_rating"][i], social_volume=data["social_volume"][i]
+        )
+        worst = max(worst, abs(scalar - vector[i]))
+    return worst
+
+
+def run_sweep(data: dict, configs: list, workers: int) -> list:
+    chunk = max(1, len(configs) // (workers * 8))
+    chunks = [configs[i:i + chunk] for i in range(0, len(configs), chunk)]
+    if workers <= 1:
+        _init_worker(data)
+        return [row for c in chunks for row in _evaluate_chunk(c)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(data,)) as pool:
+        return [row for rows in pool.map(_evaluate_chunk, chunks) for row in rows]
+
+
+def print_table(rows: list, top: int):
+    columns = [f.name for f in fields(ScoringParams) if f.name != "global_avg_rating"] + METRICS
+    print(" ".join(f"{name:>{len(name)}}" for name in columns))
+    for row in rows[:top]:
+        print(" ".join(f"{row[name]:>{len(name)}.4g}" for name in columns))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep ScoringParams over the current dataset")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--top", type=int, default=15, help="Configurations to print")
+    parser.add_argument("--sort", choices=METRICS, default="google_corr")
+    parser.add_argument("--ascending", action="store_true", help="Sort smallest first (e.g. for top10_churn)")
+    parser.add_argument("--csv", help="Write every configuration's results to this file")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    session = SessionLocal()
+    try:
+        dataset = load_dataset(session)
+    finally:
+        session.close()
+    restaurants = len(dataset["id"])
+    print(f"Loaded {restaurants} restaurants in {time.perf_counter() - started:.2f}s")
+    if not restaurants:
+        raise SystemExit("Nothing to backtest.")
+    print(f"Vectorized formula vs RankingEngine: max difference {verify(dataset):.2e}")
+    rescored = np.abs(scores(dataset, DEFAULT_PARAMS) - dataset["stored_score"])
+    print(f"Production params vs stored scores: median drift {np.median(rescored):.3f} points")
+
+    grid = default_grid()
+    started = time.perf_counter()
+    results = run_sweep(dataset, grid, args.workers)
+    elapsed = time.perf_counter() - started
+    print(f"Evaluated {len(results)} configurations on {args.workers} processes in {elapsed:.2f}s\n")
+
+    baseline = dict(asdict(DEFAULT_PARAMS), **evaluate(dataset, DEFAULT_PARAMS, baseline_for(dataset)))
+    print("Production formula:")
+    print_table([baseline], 1)
+    missing = np.inf if args.ascending else -np.inf
+    results.sort(key=lambda row: missing if np.isnan(row[args.sort]) else row[args.sort], reverse=not args.ascending)
+    print(f"\nBest {min(args.top, len(results))} by {args.sort}:")
+    print_table(results, args.top)
+
+    if args.csv:
+        with open(args.csv, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+            writer.writeheader()
+            writer.writerows(results)
+        print(f"\nWrote {len(results)} rows to {args.csv}")
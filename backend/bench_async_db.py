@@ -0,0 +1,237 @@
+# Load comparison of the read endpoints on the sync session path (threadpool) versus the async engine.
+# Seeds a throwaway SQLite database, serves each variant from its own uvicorn process and fires concurrent
+# requests at it. "api" is main.app as deployed on SQLite (threadpool handlers, see read_endpoint); "async" is
+# main.app forced onto the aiosqlite engine with ASYNC_READS=1, the path Postgres deployments take:
+#   python bench_async_db.py --concurrency 200 --requests 3000 [--db-latency-ms 20]
+import argparse
+import asyncio
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from urllib.parse import quote
+
+# Servers are started as `uvicorn bench_async_db:sync_app` / `uvicorn --factory bench_async_db:deployed_app`
+# subprocesses, so the load generator doesn't share a GIL with them; they inherit DATABASE_URL from this process
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--restaurants", type=int, default=300)
+    parser.add_argument("--reviews", type=int, default=20, help="Reviews per restaurant")
+    parser.add_argument("--requests", type=int, default=3000, help="Requests per variant")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--db-latency-ms", type=float, default=0.0,
+                        help="Extra time every statement spends in the database, like a network round trip to Postgres")
+    parser.add_argument("--paths", help="Comma-separated paths to request instead of the default mix")
+    args = parser.parse_args()
+    db_dir = tempfile.mkdtemp(prefix="bench_async_db_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(db_dir, 'bench.db')}"
+    os.environ["BENCH_DB_LATENCY_MS"] = str(args.db_latency_ms)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from fastapi import Depends, FastAPI, Response
+from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+import models, serialization
+from database import SessionLocal, engine, get_async_engine, get_db, ensure_schema
+from main import record_request_latency
+
+DB_LATENCY_MS = float(os.getenv("BENCH_DB_LATENCY_MS", "0"))
+
+
+def add_latency(target_engine):
+    """
+    Makes every statement first run SELECT bench_sleep(ms) on the same connection. The sleep happens wherever
+    that connection executes: a threadpool thread on the sync path, aiosqlite's connection thread on the async one.
+    """
+    @event.listens_for(target_engine, "connect")
+    def register_sleep(dbapi_connection, _):
+        dbapi_connection.create_function("bench_sleep", 1, lambda ms: time.sleep(ms / 1000) or 0)
+
+    @event.listens_for(target_engine, "before_cursor_execute")
+    def sleep_first(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            cursor.execute("SELECT bench_sleep(?)", (DB_LATENCY_MS,))
+
+
+if DB_LATENCY_MS and __name__ != "__main__":
+    add_latency(engine)
+    add_latency(get_async_engine().sync_engine)
+
+
+def deployed_app():
+    """ main.app, loaded through this module so the latency hooks above are in place first """
+    from main import app
+    return app
+
+# A mix of cached rankings and queries that hit the database on every request
+PATHS = [
+    "/api/rankings/national",
+    "/api/rankings/region/center",
+    "/api/regions/center",
+    "/api/reviews/recent",
+    "/api/reviews/recent?limit=50",
+    "/api/restaurants/search?q=שווארמה 1",
+]
+
+# The read handlers as they were before the async engine: sync def on get_db, run in Starlette's threadpool
+sync_app = FastAPI()
+sync_app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
+sync_app.middleware("http")(record_request_latency)
+sync_cache = serialization.PayloadCache()
+
+def json_bytes(payload: bytes) -> Response:
+    return Response(content=payload, media_type="application/json")
+
+@sync_app.get("/api/rankings/national")
+def sync_national(db: Session = Depends(get_db)):
+    return json_bytes(sync_cache.get(db, ("national",), serialization.national_payload))
+
+@sync_app.get("/api/rankings/region/{region_id}")
+def sync_region(region_id: str, db: Session = Depends(get_db)):
+    return json_bytes(sync_cache.get(db, ("region_top", region_id), lambda s: serialization.regional_top_payload(s, region_id)))
+
+@sync_app.get("/api/regions/{region_name}")
+def sync_region_full(region_name: str, db: Session = Depends(get_db)):
+    return json_bytes(sync_cache.get(db, ("region_full", region_name), lambda s: serialization.region_full_payload(s, region_name)))
+
+@sync_app.get("/api/reviews/recent")
+def sync_recent(limit: int = 20, db: Session = Depends(get_db)):
+    if limit == serialization.RECENT_FEED_LIMIT:
+        return json_bytes(sync_cache.get(db, ("recent",), serialization.recent_reviews_payload))
+    return serialization.recent_reviews_payload(db, limit)
+
+@sync_app.get("/api/restaurants/search")
+def sync_search(q: str = "", db: Session = Depends(get_db)):
+    exists = db.query(models.Restaurant).filter(models.Restaurant.name.like(f"%{q.strip()}%")).first()
+    return {"exists": exists is not None}
+
+
+def seed_database():
+    db = SessionLocal()
+    rng = random.Random(7)
+    now = datetime.now(timezone.utc)
+    for i in range(args.restaurants):
+        restaurant = models.Restaurant(
+            name=f"שווארמה {i}", city="תל אביב", platform_id=f"place-{i}", address=f"רחוב {i}",
+            region=rng.choice(["north", "haifa", "sharon", "center", "shfela", "south"]),
+            last_score=rng.uniform(0, 10), bayesian_average=rng.uniform(0, 10), total_reviews=args.reviews
+        )
+        db.add(restaurant)
+        db.flush()
+        db.add_all(models.Review(
+            restaurant_id=restaurant.id, source="google", content="פיתה טובה, בשר עסיסי " * 5,
+            sentiment_score=rng.uniform(-1, 1), weight=1.0,
+            published_at=now - timedelta(minutes=rng.randint(0, 100_000))
+        ) for _ in range(args.reviews))
+    db.commit()
+    db.close()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve(target: str, env: dict = None, factory: bool = False):
+    port = free_port()
+    command = [sys.executable, "-W", "ignore", "-m", "uvicorn", target, "--port", str(port), "--log-level", "warning"]
+    if factory:
+        command.append("--factory")
+    server = subprocess.Popen(command,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), env={**os.environ, **(env or {})})
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(200):
+        try:
+            httpx.get(base_url + "/api/health", timeout=1)
+            break
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    return server, base_url
+
+
+async def get(reader, writer, host: str, path: str) -> int:
+    """ One GET over a kept-alive connection; returns the status code """
+    writer.write(f"GET {quote(path, safe='/?=&')} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+    status_line = await reader.readline()
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.partition(b":")
+        if name.lower() == b"content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return int(status_line.split()[1])
+
+
+async def load(base_url: str) -> dict:
+    # A bare asyncio HTTP/1.1 client: httpx spends more CPU per request than the server does, which on a small
+    # machine would make the client the thing being measured
+    host, port = base_url.rsplit("/", 1)[1].split(":")
+    latencies = []
+    errors = 0
+    counter = iter(range(args.requests))
+    async def user():
+        nonlocal errors
+        reader, writer = await asyncio.open_connection(host, int(port))
+        for path in PATHS:
+            await get(reader, writer, host, path) # warm up caches and the connection
+        await ready.wait()
+        for i in counter:
+            started = time.perf_counter()
+            status = await get(reader, writer, host, PATHS[i % len(PATHS)])
+            latencies.append(time.perf_counter() - started)
+            errors += status != 200
+        writer.close()
+    ready = asyncio.Event()
+    users = [asyncio.create_task(user()) for _ in range(args.concurrency)]
+    await asyncio.sleep(1.0)
+    started = time.perf_counter()
+    ready.set()
+    await asyncio.gather(*users)
+    wall = time.perf_counter() - started
+    latencies.sort()
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000
+    return {"rps": len(latencies) / wall, "p50": pct(50), "p95": pct(95), "p99": pct(99),
+            "mean": statistics.mean(latencies) * 1000, "errors": errors}
+
+
+def run_variant(name: str, target: str, env: dict = None, factory: bool = False) -> dict:
+    server, base_url = serve(target, env, factory)
+    try:
+        result = asyncio.run(load(base_url))
+    finally:
+        server.terminate()
+        server.wait()
+    print(f"{name:6} {result['rps']:9.0f} {result['p50']:8.1f} {result['p95']:8.1f} {result['p99']:8.1f} {result['errors']:7}")
+    return result
+
+
+if __name__ == "__main__":
+    if args.paths:
+        PATHS = args.paths.split(",")
+    ensure_schema()
+    seed_database()
+    print(f"Seeded {args.restaurants} restaurants x {args.reviews} reviews in {db_dir}")
+    print(f"{args.requests} requests, {args.concurrency} concurrent, {len(PATHS)} read endpoints, "
+          f"{args.db_latency_ms:g} ms added per query")
+    print(f"{'path':6} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    before = run_variant("sync", "bench_async_db:sync_app")
+    results = {
+        "api": run_variant("api", "bench_async_db:deployed_app", factory=True),
+        "async": run_variant("async", "bench_async_db:deployed_app", {"ASYNC_READS": "1"}, factory=True),
+    }
+    for name, after in results.items():
+        print(f"{name} vs sync: throughput {after['rps'] / before['rps']:.2f}x, "
+              f"p50 {after['p50'] / before['p50']:.2f}x, p99 {after['p99'] / before['p99']:.2f}x")
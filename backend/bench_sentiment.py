@@ -0,0 +1,105 @@
+# Sentiment scoring against a rate-limited mock of the OpenAI API (mock_llm_server.py), one fresh server per run:
+#   python bench_sentiment.py --reviews 400 --rpm 600 --tpm 60000 [--latency-ms 200] [--error-rate 0.02]
+#   sequential  RankingEngine.analyze_sentiment, one blocking call at a time (the old worker path)
+#   dispatcher  SentimentDispatcher with client budgets at 95% of the server's limits
+#   oversubscribed  SentimentDispatcher with budgets 3x the server's limits, so it runs into 429s and has to
+#                   honour Retry-After and re-queue
+# Every answer is checked against the mock's expected score; "unscored" reviews would have been stored as 0.0
+# before the dispatcher.
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+os.environ["OPENAI_API_KEY"] = "mock"
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+
+from mock_llm_server import expected_score
+from nlp import RankingEngine, RateBudget, SentimentDispatcher
+
+PHRASES = ["שווארמה אש", "הפיתה הייתה יבשה", "שירות מהיר", "על הפנים", "בשר עסיסי ונדיר", "יקר מדי",
+           "הכי טוב בעיר", "חיכינו שעה", "פצצה של מקום", "בסדר, לא יותר", "the lamb was great", "too salty"]
+
+
+def reviews(count: int) -> list:
+    rng = random.Random(11)
+    return [f"{' '.join(rng.choice(PHRASES) for _ in range(rng.randint(2, 12)))} #{i}" for i in range(count)]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve():
+    port = free_port()
+    server = subprocess.Popen([sys.executable, "-W", "ignore", "mock_llm_server.py", "--port", str(port),
+                               "--rpm", str(args.rpm), "--tpm", str(args.tpm), "--latency-ms", str(args.latency_ms),
+                               "--error-rate", str(args.error_rate)],
+                              cwd=os.path.dirname(os.path.abspath(__file__)))
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            httpx.get(base_url + "/stats", timeout=1)
+            break
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    return server, base_url
+
+
+def run(name: str, score_all, texts: list):
+    server, base_url = serve()
+    os.environ["OPENAI_BASE_URL"] = base_url + "/v1"
+    try:
+        started = time.perf_counter()
+        scores = score_all(texts, base_url + "/v1")
+        elapsed = time.perf_counter() - started
+        stats = httpx.get(base_url + "/stats").json()
+    finally:
+        server.terminate()
+        server.wait()
+    unscored = sum(score is None for score in scores)
+    wrong = sum(score is not None and abs(score - expected_score(text)) > 0.005 for text, score in zip(texts, scores))
+    print(f"{name:15} {len(texts):8} {elapsed:8.1f} {len(texts) / elapsed:8.1f} {stats['rate_limited']:6} "
+          f"{stats['errors']:6} {unscored:9} {wrong:6}")
+    return unscored + wrong
+
+
+def sequential(texts: list, _) -> list:
+    engine = RankingEngine()
+    return [engine.analyze_sentiment(text) for text in texts]
+
+
+def dispatched(budget_share: float):
+    def score_all(texts: list, base_url: str) -> list:
+        dispatcher = SentimentDispatcher(requests=RateBudget(args.rpm * budget_share),
+                                         tokens=RateBudget(args.tpm * budget_share), base_url=base_url)
+        return asyncio.run(dispatcher.score_many(texts))
+    return score_all
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reviews", type=int, default=400)
+    parser.add_argument("--sequential", type=int, default=40, help="Reviews for the one-at-a-time baseline")
+    parser.add_argument("--rpm", type=float, default=600)
+    parser.add_argument("--tpm", type=float, default=60000)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    args = parser.parse_args()
+
+    texts = reviews(args.reviews)
+    print(f"Mock API: {args.rpm:g} requests/min, {args.tpm:g} tokens/min, {args.latency_ms:g} ms, "
+          f"{args.error_rate:.0%} 503s")
+    print(f"{'run':15} {'reviews':>8} {'seconds':>8} {'per sec':>8} {'429s':>6} {'503s':>6} {'unscored':>9} {'wrong':>6}")
+    run("sequential", sequential, texts[:args.sequential])
+    bad = run("dispatcher", dispatched(0.95), texts)
+    bad += run("oversubscribed", dispatched(3.0), texts)
+    raise SystemExit(1 if bad else 0)
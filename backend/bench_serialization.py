@@ -0,0 +1,109 @@
+# Compares requests/sec of the ranking endpoints before and after the PayloadCache fast path.
+# Seeds a throwaway SQLite database, so it never touches the real one:
+#   python bench_serialization.py --restaurants 300 --reviews 20 --requests 300
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--restaurants", type=int, default=300)
+parser.add_argument("--reviews", type=int, default=20, help="Reviews per restaurant")
+parser.add_argument("--requests", type=int, default=300, help="Requests per endpoint and variant")
+args = parser.parse_args()
+
+db_dir = tempfile.mkdtemp(prefix="bench_serialization_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(db_dir, 'bench.db')}"
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from typing import List
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+import models, schemas
+from database import SessionLocal, get_db, ensure_schema
+from main import app
+
+REGIONS = ["north", "haifa", "sharon", "center", "shfela", "south"]
+
+
+def seed_database():
+    db = SessionLocal()
+    rng = random.Random(7)
+    now = datetime.now(timezone.utc)
+    for i in range(args.restaurants):
+        restaurant = models.Restaurant(
+            name=f"שווארמה {i}", city="תל אביב", platform_id=f"place-{i}", address=f"רחוב {i}",
+            region=rng.choice(REGIONS), last_score=rng.uniform(0, 10), bayesian_average=rng.uniform(0, 10),
+            total_reviews=args.reviews
+        )
+        db.add(restaurant)
+        db.flush()
+        db.add_all(models.Review(
+            restaurant_id=restaurant.id, source="google", content="פיתה טובה, בשר עסיסי " * 5,
+            url=f"https://example.com/{i}/{j}", sentiment_score=rng.uniform(-1, 1), weight=1.0,
+            published_at=now - timedelta(minutes=rng.randint(0, 100_000))
+        ) for j in range(args.reviews))
+    db.commit()
+    db.close()
+
+
+# The handlers as they were before the fast path: ORM objects through jsonable_encoder / response_model
+legacy = FastAPI()
+
+@legacy.get("/api/rankings/national")
+def legacy_national(db: Session = Depends(get_db)):
+    top_restaurants = db.query(models.Restaurant).order_by(models.Restaurant.bayesian_average.desc()).limit(10).all()
+    if not top_restaurants:
+        return {"king": None, "runnersUp": []}
+    return {"king": top_restaurants[0], "runnersUp": top_restaurants[1:]}
+
+@legacy.get("/api/rankings/region/{region_id}")
+def legacy_region(region_id: str, db: Session = Depends(get_db)):
+    return db.query(models.Restaurant).filter(models.Restaurant.region == region_id)\
+        .order_by(models.Restaurant.bayesian_average.desc()).limit(10).all()
+
+@legacy.get("/api/regions/{region_name}", response_model=List[schemas.RestaurantSchema])
+def legacy_region_full(region_name: str, db: Session = Depends(get_db)):
+    return db.query(models.Restaurant).filter(models.Restaurant.region == region_name)\
+        .order_by(models.Restaurant.bayesian_average.desc()).all()
+
+@legacy.get("/api/reviews/recent")
+def legacy_recent(limit: int = 20, db: Session = Depends(get_db)):
+    recent_reviews = db.query(models.Review).order_by(models.Review.published_at.desc()).limit(limit).all()
+    return [{
+        "id": rev.id,
+        "restaurant_name": rev.restaurant.name if rev.restaurant else "Unknown Target",
+        "city": rev.restaurant.city if rev.restaurant else "",
+        "content": rev.content,
+        "sentiment": rev.sentiment_score,
+        "published_at": rev.published_at.isoformat() if rev.published_at else None
+    } for rev in recent_reviews]
+
+
+def requests_per_second(client: TestClient, path: str) -> float:
+    client.get(path)  # warm up (and fill the cache for the fast path)
+    started = time.perf_counter()
+    for _ in range(args.requests):
+        response = client.get(path)
+        assert response.status_code == 200, (path, response.status_code)
+    return args.requests / (time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    ensure_schema()
+    seed_database()
+    print(f"Seeded {args.restaurants} restaurants x {args.reviews} reviews in {db_dir}")
+
+    paths = ["/api/rankings/national", "/api/rankings/region/center", "/api/regions/center", "/api/reviews/recent"]
+    with TestClient(legacy) as legacy_client, TestClient(app) as fast_client:
+        print(f"{'endpoint':32} {'before rps':>11} {'after rps':>11} {'speedup':>8}")
+        for path in paths:
+            before = requests_per_second(legacy_client, path)
+            after = requests_per_second(fast_client, path)
+            print(f"{path:32} {before:11.0f} {after:11.0f} {after / before:7.1f}x")
@@ -0,0 +1,126 @@
+# Persistent progress for cron cycles.
+# Every finished seed is recorded right away, so a worker restarted mid-cycle (deploy, OOM)
+# skips what was already done instead of starting over from the first seed.
+import json
+import os
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models
+
+# A cycle left unfinished for longer than this is stale data; start a fresh pass instead of resuming it
+CYCLE_RESUME_MAX_AGE_HOURS = float(os.getenv("CYCLE_RESUME_MAX_AGE_HOURS", "24"))
+
+SKIP_OUTCOMES = ("not_found", "no_data")
+
+
+def seed_key(target: dict) -> str:
+    return f"{target['query']}|{target['city']}"
+
+
+def start_or_resume(db: Session, total_seeds: int):
+    """ Returns (cycle, completed_seed_keys) """
+    cycle = db.query(models.CrawlCycle)\
+        .filter(models.CrawlCycle.status == "running")\
+        .order_by(models.CrawlCycle.id.desc())\
+        .first()
+
+    if cycle:
+        started_at = cycle.started_at
+        if started_at and started_at.tzinfo is None:
+            # SQLite hands timestamps back without tzinfo; they are stored in UTC
+            started_at = started_at.replace(tzinfo=timezone.utc)
+        if started_at and datetime.now(timezone.utc) - started_at > timedelta(hours=CYCLE_RESUME_MAX_AGE_HOURS):
+            print(f"Abandoning stale cycle {cycle.id} started at {cycle.started_at}.")
+            cycle.status = "abandoned"
+            cycle.finished_at = datetime.now(timezone.utc)
+            db.commit()
+            cycle = None
+
+    if cycle:
+        done = {row.seed_key for row in db.query(models.CrawlCycleSeed.seed_key).filter(models.CrawlCycleSeed.cycle_id == cycle.id)}
+        cycle.total_seeds = total_seeds
+        db.commit()
+        print(f"Resuming cycle {cycle.id}: {len(done)} seeds already done.")
+        return cycle, done
+
+    cycle = models.CrawlCycle(status="running", total_seeds=total_seeds, started_at=datetime.now(timezone.utc))
+    db.add(cycle)
+    db.commit()
+    db.refresh(cycle)
+    print(f"Started cycle {cycle.id} over {total_seeds} seeds.")
+    return cycle, set()
+
+
+def record_seed(db: Session, cycle_id: int, key: str, outcome: str, duration: float, error: str = None):
+    db.add(models.CrawlCycleSeed(
+        cycle_id=cycle_id,
+        seed_key=key,
+        outcome=outcome,
+        error=error[:500] if error else None,
+        duration_seconds=duration,
+        finished_at=datetime.now(timezone.utc)
+    ))
+    try:
+        db.commit()
+    except IntegrityError:
+        # Already checkpointed (e.g. the same seed appears twice in the seed file)
+        db.rollback()
+
+
+def build_summary(db: Session, cycle: models.CrawlCycle) -> dict:
+    rows = db.query(models.CrawlCycleSeed).filter(models.CrawlCycleSeed.cycle_id == cycle.id).all()
+    outcomes = Counter(row.outcome for row in rows)
+    finished_at = cycle.finished_at or datetime.now(timezone.utc)
+    started_at = cycle.started_at
+    if started_at.tzinfo is None:
+        started_at = started_at.replace(tzinfo=timezone.utc)
+    if finished_at.tzinfo is None:
+        finished_at = finished_at.replace(tzinfo=timezone.utc)
+
+    return {
+        "cycle_id": cycle.id,
+        "status": cycle.status,
+        "total_seeds": cycle.total_seeds,
+        "processed": len(rows),
+        "outcomes": dict(outcomes),
+        "skipped": sum(outcomes[o] for o in SKIP_OUTCOMES),
+        "failed": outcomes["failed"],
+        # Wall clock includes any downtime between a crash and the resume; busy time is the sum of seed work
+        "wall_seconds": round((finished_at - started_at).total_seconds(), 1),
+        "busy_seconds": round(sum(row.duration_seconds or 0.0 for row in rows), 1),
+        "slowest": [
+            {"seed": row.seed_key, "seconds": round(row.duration_seconds, 1)}
+            for row in sorted(rows, key=lambda r: r.duration_seconds or 0.0, reverse=True)[:5]
+        ],
+        "failures": [{"seed": row.seed_key, "error": row.error} for row in rows if row.outcome == "failed"][:20],
+        "started_at": started_at.isoformat(),
+        "finished_at": finished_at.isoformat(),
+    }
+
+
+def complete(db: Session, cycle: models.CrawlCycle) -> dict:
+    cycle.status = "completed"
+    cycle.finished_at = datetime.now(timezone.utc)
+    summary = build_summary(db, cycle)
+    cycle.summary = json.dumps(summary, ensure_ascii=False)
+    db.commit()
+    return summary
+
+
+def recent_cycles(db: Session, limit: int = 10) -> list:
+    cycles = db.query(models.CrawlCycle).order_by(models.CrawlCycle.id.desc()).limit(limit).all()
+    # Completed cycles carry their frozen report; running ones get a live view of progress so far
+    return [json.loads(c.summary) if c.summary else build_summary(db, c) for c in cycles]
+
+
+def format_report(summary: dict) -> str:
+    return (
+        f"Cycle {summary['cycle_id']}: {summary['processed']}/{summary['total_seeds']} seeds, "
+        f"{summary['outcomes'].get('updated', 0)} updated, {summary['outcomes'].get('unchanged', 0)} unchanged, "
+        f"{summary['skipped']} skipped, {summary['failed']} failed, "
+        f"{summary['wall_seconds']:.0f}s wall / {summary['busy_seconds']:.0f}s busy"
+    )
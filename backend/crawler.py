@@ -0,0 +1,93 @@
+# Standalone crawler entry point: `python crawler.py`
+# Runs the cron cycle outside the API processes. Any number of crawler (or embedded) instances can be
+# started; a lease in the database elects one leader that starts, completes and publishes each cycle, and every
+# instance (the leader included) processes the cycle's seeds, claimed one at a time through seed leases.
+import asyncio
+import os
+import threading
+
+from database import ensure_schema
+from jobs import JobRunner
+from leader import LeaderLease, make_holder_id
+
+CRAWL_INTERVAL_SECONDS = float(os.getenv("CRAWL_INTERVAL_SECONDS", "1800"))
+# How often a follower checks whether the leader went away or started a new cycle
+LEADER_RETRY_SECONDS = float(os.getenv("LEADER_RETRY_SECONDS", "60"))
+
+
+def run_leader_cycle(lease: LeaderLease):
+    # Imported lazily so the API only pays for the scraping stack when it embeds the worker
+    from worker import run_cron_cycle_sync
+    run_cron_cycle_sync(stop_event=lease.lost, holder=lease.holder)
+
+
+def run_follower_shift(holder: str, stop_event):
+    from worker import work_running_cycle_sync
+    work_running_cycle_sync(holder, stop_event=stop_event)
+
+
+async def crawl_forever(lease: LeaderLease = None):
+    lease = lease or LeaderLease()
+    heartbeat_running = False
+    stopping = threading.Event()
+    try:
+        while True:
+            if lease.try_acquire():
+                if not heartbeat_running:
+                    print(f"Crawler {lease.holder} is now the leader.")
+                    lease.start_heartbeat()
+                    heartbeat_running = True
+                try:
+                    await asyncio.to_thread(run_leader_cycle, lease)
+                except Exception as e:
+                    print(f"Crawler cycle error: {e}")
+                if lease.lost.is_set():
+                    # The heartbeat saw a takeover and exited; a later re-acquire must start a fresh one
+                    lease.stop_heartbeat()
+                    heartbeat_running = False
+                    continue
+                # Keep heartbeating while idle so followers don't start a second cycle in between
+                await asyncio.sleep(CRAWL_INTERVAL_SECONDS)
+            else:
+                if heartbeat_running:
+                    lease.stop_heartbeat()
+                    heartbeat_running = False
+                # Share the seeds of the leader's cycle, if one is running
+                try:
+                    await asyncio.to_thread(run_follower_shift, lease.holder, stopping)
+                except Exception as e:
+                    print(f"Crawler seed work error: {e}")
+                await asyncio.sleep(LEADER_RETRY_SECONDS)
+    finally:
+        # Stop in-flight seed work between seeds and hand leadership over right away
+        stopping.set()
+        lease.lost.set()
+        if heartbeat_running:
+            lease.stop_heartbeat()
+        lease.release()
+
+
+def main():
+    ensure_schema()
+
+    metrics_port = os.getenv("METRICS_PORT")
+    if metrics_port:
+        # The API's /metrics only sees its own process, so the crawler exposes its own endpoint
+        from prometheus_client import start_http_server
+        start_http_server(int(metrics_port))
+        print(f"Crawler metrics exposed on :{metrics_port}/metrics")
+
+    # Every crawler instance serves on-demand jobs, leader or not; claims are atomic per job
+    holder = make_holder_id()
+    runner = JobRunner(holder)
+    runner.start()
+    try:
+        asyncio.run(crawl_forever(LeaderLease(holder=holder)))
+    except KeyboardInterrupt:
+        print("Crawler stopped.")
+    finally:
+        runner.stop()
+
+
+if __name__ == "__main__":
+    main()
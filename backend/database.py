@@ -1,19 +1,119 @@
-from sqlalchemy import create_engine
+import os
+from itertools import chain
+
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.exc import OperationalError, ProgrammingError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./shawarma_radar.db"
+# Shared by the API processes and the standalone crawler, so multi-process deployments
+# should point DATABASE_URL at a server database (Postgres) instead of the local SQLite file.
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./shawarma_radar.db")
+if SQLALCHEMY_DATABASE_URL.startswith("postgres://"):
+    # Render/Heroku style URLs use the legacy scheme SQLAlchemy no longer accepts
+    SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("postgres://", "postgresql://", 1)
+
+IS_SQLITE = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
 
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False} if IS_SQLITE else {}
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Writes to these tables move the rankings' data version, which tells API processes to re-render cached payloads
+VERSIONED_TABLES = {"restaurants", "reviews"}
+DATA_VERSION_NAME = "rankings"
+
+@event.listens_for(SessionLocal, "after_flush")
+def _note_flushed_changes(session, flush_context):
+    # new/dirty/deleted still hold the pre-flush state here
+    if any(getattr(obj, "__tablename__", None) in VERSIONED_TABLES for obj in chain(session.new, session.dirty, session.deleted)):
+        session.info["data_changed"] = True
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _note_bulk_changes(state):
+    # query.delete()/update() and update()/delete() statements skip the flush
+    if (state.is_update or state.is_delete or state.is_insert) and state.bind_mapper is not None \
+            and state.bind_mapper.local_table.name in VERSIONED_TABLES:
+        state.session.info["data_changed"] = True
+
+@event.listens_for(SessionLocal, "after_commit")
+def _bump_after_commit(session):
+    if session.info.pop("data_changed", False):
+        bump_data_version()
+
+@event.listens_for(SessionLocal, "after_soft_rollback")
+def _forget_rolled_back_changes(session, previous_transaction):
+    session.info.pop("data_changed", None)
+
+def bump_data_version():
+    """
+    Bumped in its own short transaction after the writer's commit, so concurrent crawlers never hold a lock on the
+    version row across their batches. Readers may see the new rows a moment before the bump; they re-render then.
+    """
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("UPDATE data_versions SET version = version + 1 WHERE name = :name"), {"name": DATA_VERSION_NAME})
+    except (OperationalError, ProgrammingError):
+        # Commits made by migrations that run before the table exists; readers start from the table's first row
+        pass
+
 Base = declarative_base()
 
+def async_database_url(url: str) -> str:
+    """ Same database through an asyncio driver: aiosqlite for SQLite, asyncpg for Postgres """
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    if url.startswith("postgresql://"):
+        # asyncpg takes ssl=..., not libpq's sslmode=...
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1).replace("sslmode=", "ssl=")
+    return url
+
+# The API's read endpoints use the async engine; the worker, migrations and write endpoints stay on the sync one.
+# Created on first use so processes that never serve reads (the crawler) don't need the async drivers.
+# Off by default on SQLite: aiosqlite hops every statement through its own connection thread, and next to handlers
+# on the event loop that starved the queries of a single core into a p99 about five times the threadpool's
+# (bench_async_db.py); there is no network wait to overlap anyway.
+ASYNC_READS = os.getenv("ASYNC_READS", "0" if IS_SQLITE else "1") == "1"
+_async_engine = None
+_async_sessionmaker = None
+
+def get_async_engine():
+    global _async_engine, _async_sessionmaker
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+        _async_engine = create_async_engine(async_database_url(SQLALCHEMY_DATABASE_URL))
+        _async_sessionmaker = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    return _async_engine
+
+async def dispose_async_engine():
+    global _async_engine, _async_sessionmaker
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = _async_sessionmaker = None
+
+def add_missing_columns(table: str, columns: dict):
+    """ create_all never alters existing tables, so new nullable columns are added in place """
+    existing = {c["name"] for c in inspect(engine).get_columns(table)}
+    with engine.begin() as conn:
+        for name, ddl in columns.items():
+            if name not in existing:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+                print(f"Added column {table}.{name}")
+
+def ensure_schema():
+    """ Applies pending one-time migrations (migrations.py); a no-op beyond one SELECT once they are applied """
+    from migrations import migrate
+    migrate()
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    get_async_engine()
+    async with _async_sessionmaker() as db:
+        yield db
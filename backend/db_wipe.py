@@ -1,11 +1,11 @@
-from database import engine, Base
+from database import engine, Base, ensure_schema
 import models
 
 def reset_db():
     print("Dropping all tables...")
     Base.metadata.drop_all(bind=engine)
     print("Recreating tables...")
-    Base.metadata.create_all(bind=engine)
+    ensure_schema()
     print("Database has been completely wiped and reinitialized.")
 
 if __name__ == "__main__":
@@ -0,0 +1,94 @@
+# Near-duplicate detection for social captions.
+# Reposts of the same clip differ only in emoji, hashtags or a word or two. Captions are normalized, cut into
+# character shingles and summarized by a MinHash signature; an LSH index over signature bands finds the few
+# candidate duplicates without comparing a caption against every caption seen before.
+import hashlib
+import os
+import re
+import struct
+from collections import defaultdict
+
+from matching import normalize_text
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS # 16 bands of 4 rows: pairs around 0.5 similarity and up become candidates
+SHINGLE_SIZE = 4
+DUPLICATE_THRESHOLD = float(os.getenv("DUPLICATE_THRESHOLD", "0.6"))
+
+# One SHAKE-128 read per shingle yields NUM_PERM independent 32-bit hashes, one per MinHash slot;
+# much cheaper in Python than NUM_PERM modular permutations per shingle, and stable across processes
+_SLOTS = struct.Struct(f"<{NUM_PERM}I")
+# Hashtags, mentions and links vary between reposts and say nothing about the content
+_DECORATION = re.compile(r"https?://\S+|[#@]\S+")
+
+
+def normalize_caption(text: str) -> str:
+    stripped = normalize_text(_DECORATION.sub(" ", text or ""))
+    # A caption made only of hashtags still deserves a signature
+    return stripped or normalize_text(text)
+
+
+def shingles(text: str) -> set:
+    caption = normalize_caption(text)
+    if len(caption) <= SHINGLE_SIZE:
+        return {caption} if caption else set()
+    return {caption[i:i + SHINGLE_SIZE] for i in range(len(caption) - SHINGLE_SIZE + 1)}
+
+
+def _slot_hashes(shingle: str) -> tuple:
+    return _SLOTS.unpack(hashlib.shake_128(shingle.encode("utf-8")).digest(_SLOTS.size))
+
+
+def signature(text: str):
+    """ MinHash signature of a caption, or None when there is nothing left to compare """
+    rows = [_slot_hashes(s) for s in shingles(text)]
+    if not rows:
+        return None
+    return tuple(map(min, zip(*rows)))
+
+
+def estimated_similarity(sig_a: tuple, sig_b: tuple) -> float:
+    """ Fraction of agreeing MinHash slots, an unbiased estimate of the shingle Jaccard similarity """
+    return sum(x == y for x, y in zip(sig_a, sig_b)) / NUM_PERM
+
+
+class NearDuplicateIndex:
+    """ LSH index of caption signatures; the first caption of each cluster is its representative """
+    def __init__(self, threshold: float = DUPLICATE_THRESHOLD):
+        self.threshold = threshold
+        self.buckets = defaultdict(list)
+        self.signatures = {}
+        self.members = defaultdict(list)
+
+    def _bands(self, sig: tuple):
+        for band in range(BANDS):
+            yield band, sig[band * ROWS:(band + 1) * ROWS]
+
+    def check(self, key, text: str):
+        """
+        Returns the representative key of an indexed near-duplicate of `text` (recording `key` in its
+        cluster), or None after indexing `text` under `key` as a new representative.
+        """
+        sig = signature(text)
+        if sig is None:
+            return None
+
+        candidates = {other for band in self._bands(sig) for other in self.buckets.get(band, ())}
+        best, best_score = None, 0.0
+        for other in candidates:
+            score = estimated_similarity(sig, self.signatures[other])
+            if score > best_score:
+                best, best_score = other, score
+        if best is not None and best_score >= self.threshold:
+            self.members[best].append(key)
+            return best
+
+        self.signatures[key] = sig
+        for band in self._bands(sig):
+            self.buckets[band].append(key)
+        return None
+
+    def clusters(self) -> dict:
+        """ representative key -> keys folded into it, for clusters that actually absorbed something """
+        return {rep: members for rep, members in self.members.items() if members}
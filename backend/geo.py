@@ -0,0 +1,99 @@
+# In-memory spatial index for "nearest shawarma" lookups.
+# Restaurants are bucketed into a fixed lat/lng grid; a radius query only scans the handful of
+# cells overlapping the search circle, so lookups stay well under a millisecond.
+import heapq
+import math
+import os
+import time
+from collections import defaultdict
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+import models
+
+EARTH_RADIUS_KM = 6371.0
+# ~5.5 km of latitude per cell: a 10 km radius touches at most a 5x5 block of cells
+CELL_DEGREES = 0.05
+# How often the API checks whether a newer cycle finished and the index must be rebuilt
+INDEX_CHECK_SECONDS = float(os.getenv("SPATIAL_INDEX_CHECK_SECONDS", "30"))
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def _cell(lat: float, lng: float) -> tuple:
+    return int(math.floor(lat / CELL_DEGREES)), int(math.floor(lng / CELL_DEGREES))
+
+
+class SpatialIndex:
+    def __init__(self, entries: list = None):
+        """ `entries` are dicts with at least lat, lng and bayesian_average """
+        self.cells = defaultdict(list)
+        self.size = 0
+        for entry in entries or []:
+            self.cells[_cell(entry["lat"], entry["lng"])].append(entry)
+            self.size += 1
+
+    def nearest_top(self, lat: float, lng: float, radius_km: float, k: int) -> list:
+        """ Top-k places by score within radius_km, each annotated with its distance """
+        lat_span = int(math.ceil(radius_km / 111.32 / CELL_DEGREES))
+        lng_km_per_degree = 111.32 * max(math.cos(math.radians(lat)), 0.01)
+        lng_span = int(math.ceil(radius_km / lng_km_per_degree / CELL_DEGREES))
+        center_lat, center_lng = _cell(lat, lng)
+
+        hits = []
+        for i in range(center_lat - lat_span, center_lat + lat_span + 1):
+            for j in range(center_lng - lng_span, center_lng + lng_span + 1):
+                for entry in self.cells.get((i, j), ()):
+                    distance = haversine_km(lat, lng, entry["lat"], entry["lng"])
+                    if distance <= radius_km:
+                        hits.append((entry["bayesian_average"], -distance, entry))
+
+        top = heapq.nlargest(k, hits, key=lambda h: (h[0], h[1]))
+        return [dict(entry, distance_km=round(-neg_distance, 2)) for _, neg_distance, entry in top]
+
+
+def build_index(db: Session) -> SpatialIndex:
+    rows = db.query(models.Restaurant)\
+        .filter(models.Restaurant.lat.isnot(None), models.Restaurant.lng.isnot(None))\
+        .all()
+    entries = [{
+        "id": r.id,
+        "name": r.name,
+        "city": r.city,
+        "region": r.region,
+        "address": r.address,
+        "bayesian_average": r.bayesian_average or 0.0,
+        "lat": r.lat,
+        "lng": r.lng,
+    } for r in rows]
+    return SpatialIndex(entries)
+
+
+class CycleBoundIndex:
+    """
+    Holds the current SpatialIndex and rebuilds it once per completed worker cycle.
+    The version check is a single indexed MAX() query, rate limited to INDEX_CHECK_SECONDS.
+    """
+    def __init__(self):
+        self.index = None
+        self.version = None
+        self.checked_at = 0.0
+
+    def get(self, db: Session) -> SpatialIndex:
+        now = time.monotonic()
+        if self.index is not None and now - self.checked_at < INDEX_CHECK_SECONDS:
+            return self.index
+        self.checked_at = now
+        version = db.query(func.max(models.CrawlCycle.id)).filter(models.CrawlCycle.status == "completed").scalar()
+        if self.index is None or version != self.version:
+            self.index = build_index(db)
+            self.version = version
+            print(f"Spatial index rebuilt for cycle {version}: {self.index.size} places")
+        return self.index
@@ -0,0 +1,249 @@
+# Durable on-demand scrape queue backed by the scrape_jobs table.
+# The API only inserts rows; a bounded pool of threads in the crawler process claims and runs them.
+# The pool is separate from the cron cycle, so on-demand jobs never wait behind the seed backlog.
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+# A finished job answers repeats of the same query for this long instead of scraping again
+JOB_COALESCE_SECONDS = int(os.getenv("JOB_COALESCE_SECONDS", "600"))
+# Runners renew the heartbeat of the jobs they are running this often; a running job whose heartbeat is older
+# than JOB_STALE_SECONDS belongs to a dead runner and gets re-queued, however long it has been running
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "30"))
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "150"))
+JOB_MAX_ATTEMPTS = 3
+# Every new job costs Google, Apify and OpenAI calls: cap how many one client may start per window, and how many
+# may wait in the queue altogether
+JOB_CLIENT_LIMIT = int(os.getenv("JOB_CLIENT_LIMIT", "5"))
+JOB_CLIENT_WINDOW_SECONDS = int(os.getenv("JOB_CLIENT_WINDOW_SECONDS", "3600"))
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "50"))
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+def make_dedup_key(query: str, city: str) -> str:
+    normalized = re.sub(r"\s+", " ", f"{query} {city}".strip().lower())
+    return normalized
+
+
+def find_coalescable(db: Session, dedup_key: str):
+    """ Returns an active job for the key, or one that finished recently enough to reuse """
+    active = db.query(models.ScrapeJob)\
+        .filter(models.ScrapeJob.dedup_key == dedup_key, models.ScrapeJob.status.in_(ACTIVE_STATUSES))\
+        .first()
+    if active:
+        return active
+
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=JOB_COALESCE_SECONDS)
+    return db.query(models.ScrapeJob)\
+        .filter(models.ScrapeJob.dedup_key == dedup_key,
+                models.ScrapeJob.status == "done",
+                models.ScrapeJob.finished_at >= cutoff)\
+        .order_by(models.ScrapeJob.id.desc())\
+        .first()
+
+
+class JobRejected(Exception):
+    """ A new job was refused because of a rate limit; retry_after is in seconds """
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def check_limits(db: Session, client: str = None):
+    """ Raises JobRejected when the queue is full or the client already started its share of jobs """
+    queued = db.query(func.count(models.ScrapeJob.id)).filter(models.ScrapeJob.status == "queued").scalar()
+    if queued >= JOB_MAX_QUEUED:
+        raise JobRejected("Too many scrapes are waiting, try again later", 60)
+    if client is None:
+        return
+    since = datetime.now(timezone.utc) - timedelta(seconds=JOB_CLIENT_WINDOW_SECONDS)
+    recent = db.query(models.ScrapeJob.created_at)\
+        .filter(models.ScrapeJob.client == client, models.ScrapeJob.created_at >= since)\
+        .order_by(models.ScrapeJob.created_at)\
+        .limit(JOB_CLIENT_LIMIT).all()
+    if len(recent) >= JOB_CLIENT_LIMIT:
+        oldest = recent[0].created_at
+        if oldest.tzinfo is None:
+            # SQLite hands back naive datetimes
+            oldest = oldest.replace(tzinfo=timezone.utc)
+        wait = (oldest - since).total_seconds()
+        raise JobRejected("Too many scrape requests, try again later", max(1, int(wait) + 1))
+
+
+def enqueue(db: Session, query: str, city: str, client: str = None):
+    """
+    Returns (job, created). Duplicate requests for the same query coalesce into the existing job; only requests
+    that would start a new job count against the limits, and raise JobRejected past them.
+    """
+    dedup_key = make_dedup_key(query, city)
+    existing = find_coalescable(db, dedup_key)
+    if existing:
+        return existing, False
+
+    check_limits(db, client)
+    job = models.ScrapeJob(query=query.strip(), city=city.strip(), dedup_key=dedup_key, status="queued", client=client)
+    db.add(job)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Lost the race against a concurrent request for the same key: join its job
+        db.rollback()
+        return find_coalescable(db, dedup_key), False
+    db.refresh(job)
+    return job, True
+
+
+def claim_next(db: Session, worker_id: str):
+    """ Atomically moves the oldest queued job to running. Returns None when the queue is empty. """
+    for _ in range(5):
+        job = db.query(models.ScrapeJob)\
+            .filter(models.ScrapeJob.status == "queued")\
+            .order_by(models.ScrapeJob.id)\
+            .first()
+        if not job:
+            return None
+        result = db.execute(
+            update(models.ScrapeJob)
+            .where(models.ScrapeJob.id == job.id, models.ScrapeJob.status == "queued")
+            .values(status="running", worker=worker_id, started_at=datetime.now(timezone.utc),
+                    heartbeat_at=time.time(), attempts=models.ScrapeJob.attempts + 1)
+        )
+        db.commit()
+        if result.rowcount == 1:
+            db.refresh(job)
+            return job
+        # Another worker took it between our select and update; try the next one
+    return None
+
+
+def heartbeat(db: Session, worker_id: str) -> int:
+    """ Marks every job `worker_id` is running as alive. Returns how many there were. """
+    result = db.execute(
+        update(models.ScrapeJob)
+        .where(models.ScrapeJob.worker == worker_id, models.ScrapeJob.status == "running")
+        .values(heartbeat_at=time.time())
+    )
+    db.commit()
+    return result.rowcount
+
+
+def requeue_stale(db: Session) -> int:
+    """ Re-queues running jobs whose runner stopped heartbeating, or fails them after JOB_MAX_ATTEMPTS """
+    cutoff = time.time() - JOB_STALE_SECONDS
+    # Jobs claimed before heartbeats existed have none; their start time stands in for it
+    started_cutoff = datetime.now(timezone.utc) - timedelta(seconds=JOB_STALE_SECONDS)
+    stale = (
+        models.ScrapeJob.status == "running",
+        (models.ScrapeJob.heartbeat_at < cutoff) |
+        (models.ScrapeJob.heartbeat_at.is_(None) & (models.ScrapeJob.started_at < started_cutoff)),
+    )
+    failed = db.execute(
+        update(models.ScrapeJob)
+        .where(*stale, models.ScrapeJob.attempts >= JOB_MAX_ATTEMPTS)
+        .values(status="failed", error="Worker died while running the job", finished_at=datetime.now(timezone.utc))
+    ).rowcount
+    requeued = db.execute(
+        update(models.ScrapeJob).where(*stale).values(status="queued", worker=None)
+    ).rowcount
+    db.commit()
+    if requeued or failed:
+        print(f"Job queue: re-queued {requeued} stale jobs, failed {failed}.")
+    return requeued
+
+
+def finish(db: Session, job_id: int, outcome: str = None, error: str = None, worker_id: str = None):
+    """ Records the result; with worker_id, only if the job wasn't re-queued away from that worker meanwhile """
+    conditions = [models.ScrapeJob.id == job_id]
+    if worker_id is not None:
+        conditions += [models.ScrapeJob.worker == worker_id, models.ScrapeJob.status == "running"]
+    result = db.execute(
+        update(models.ScrapeJob)
+        .where(*conditions)
+        .values(status="failed" if error else "done", outcome=outcome, error=error,
+                finished_at=datetime.now(timezone.utc))
+    )
+    db.commit()
+    if result.rowcount != 1:
+        print(f"Job {job_id} was re-queued while it ran; its result is dropped.")
+
+
+def run_job(job: models.ScrapeJob) -> str:
+    # Imported lazily: only processes that actually run jobs need the scraping stack
+    from worker import run_single_scrape_sync
+    return run_single_scrape_sync(job.query, job.city)
+
+
+class JobRunner:
+    """ A fixed-size pool of threads pulling jobs from the queue """
+    def __init__(self, worker_id: str, size: int = JOB_WORKERS):
+        self.worker_id = worker_id
+        self.size = size
+        self._stop = threading.Event()
+        self._threads = []
+        self._last_sweep = 0.0
+
+    def start(self):
+        self._stop.clear()
+        for i in range(self.size):
+            t = threading.Thread(target=self._loop, args=(i == 0,), name=f"scrape-job-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        t = threading.Thread(target=self._heartbeat_loop, name="scrape-job-heartbeat", daemon=True)
+        t.start()
+        self._threads.append(t)
+        print(f"Job runner started with {self.size} workers.")
+
+    def stop(self):
+        self._stop.set()
+        for t in self._threads:
+            t.join()
+        self._threads = []
+
+    def _heartbeat_loop(self):
+        # A separate thread, so a job stuck in a long scrape still shows it is alive
+        while not self._stop.wait(JOB_HEARTBEAT_SECONDS):
+            db = SessionLocal()
+            try:
+                heartbeat(db, self.worker_id)
+            except Exception as e:
+                # Fine as long as a later heartbeat lands within JOB_STALE_SECONDS
+                print(f"Job heartbeat failed: {e}")
+            finally:
+                db.close()
+
+    def _loop(self, sweeper: bool):
+        while not self._stop.is_set():
+            job = None
+            db = SessionLocal()
+            try:
+                # One thread per runner periodically rescues jobs orphaned by crashed processes
+                if sweeper and time.time() - self._last_sweep > JOB_STALE_SECONDS / 3:
+                    self._last_sweep = time.time()
+                    requeue_stale(db)
+                job = claim_next(db, self.worker_id)
+                if job:
+                    print(f"Job {job.id}: scraping '{job.query}'")
+                    try:
+                        outcome = run_job(job)
+                        finish(db, job.id, outcome=outcome, worker_id=self.worker_id)
+                    except Exception as e:
+                        print(f"Job {job.id} failed: {e}")
+                        finish(db, job.id, error=str(e), worker_id=self.worker_id)
+            except Exception as e:
+                print(f"Job runner error: {e}")
+            finally:
+                db.close()
+            if not job:
+                self._stop.wait(JOB_POLL_SECONDS)
@@ -0,0 +1,111 @@
+# Single-leader election through a lease row in the shared database.
+# Whoever holds an unexpired lease runs the crawl; everyone else stays idle and retries later.
+# The holder renews the lease from a heartbeat thread, so a crashed leader is replaced after one TTL.
+import os
+import socket
+import threading
+import time
+import uuid
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+import models
+from database import SessionLocal
+
+LEASE_TTL_SECONDS = float(os.getenv("LEADER_LEASE_TTL", "120"))
+
+
+def make_holder_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class LeaderLease:
+    def __init__(self, name: str = "crawler", ttl: float = LEASE_TTL_SECONDS, holder: str = None):
+        self.name = name
+        self.ttl = ttl
+        self.holder = holder or make_holder_id()
+        self.lost = threading.Event()
+        self._stop_heartbeat = threading.Event()
+        self._heartbeat = None
+
+    def try_acquire(self) -> bool:
+        """ Takes the lease if it is free, expired or already ours. Returns True when we are leader. """
+        now = time.time()
+        db = SessionLocal()
+        try:
+            # Atomic compare-and-set: only one contender can flip an expired row to itself
+            result = db.execute(
+                update(models.WorkerLease)
+                .where(models.WorkerLease.name == self.name)
+                .where((models.WorkerLease.holder == self.holder) | (models.WorkerLease.expires_at < now))
+                .values(holder=self.holder, expires_at=now + self.ttl, acquired_at=now)
+            )
+            db.commit()
+            if result.rowcount == 1:
+                return True
+
+            if db.get(models.WorkerLease, self.name) is not None:
+                return False
+
+            # First run ever: create the row, racing other processes on the primary key
+            db.add(models.WorkerLease(name=self.name, holder=self.holder, expires_at=now + self.ttl, acquired_at=now))
+            try:
+                db.commit()
+                return True
+            except IntegrityError:
+                db.rollback()
+                return False
+        finally:
+            db.close()
+
+    def renew(self) -> bool:
+        now = time.time()
+        db = SessionLocal()
+        try:
+            result = db.execute(
+                update(models.WorkerLease)
+                .where(models.WorkerLease.name == self.name)
+                .where(models.WorkerLease.holder == self.holder)
+                .values(expires_at=now + self.ttl)
+            )
+            db.commit()
+            return result.rowcount == 1
+        finally:
+            db.close()
+
+    def release(self):
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(models.WorkerLease)
+                .where(models.WorkerLease.name == self.name)
+                .where(models.WorkerLease.holder == self.holder)
+                .values(holder=None, expires_at=0.0)
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _heartbeat_loop(self):
+        while not self._stop_heartbeat.wait(self.ttl / 3):
+            try:
+                if not self.renew():
+                    print(f"Leader lease '{self.name}' was taken over, stopping work.")
+                    self.lost.set()
+                    return
+            except Exception as e:
+                # A transient DB error is fine as long as a later renewal lands before the TTL runs out
+                print(f"Leader lease heartbeat failed: {e}")
+
+    def start_heartbeat(self):
+        self.lost.clear()
+        self._stop_heartbeat.clear()
+        self._heartbeat = threading.Thread(target=self._heartbeat_loop, name=f"lease-{self.name}", daemon=True)
+        self._heartbeat.start()
+
+    def stop_heartbeat(self):
+        self._stop_heartbeat.set()
+        if self._heartbeat:
+            self._heartbeat.join()
+            self._heartbeat = None
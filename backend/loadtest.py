@@ -0,0 +1,513 @@
+# Load test of the dashboard-facing API: seeds a throwaway SQLite database shaped like production (every restaurant
+# in auto_seeds.json, a long-tailed number of reviews each), serves main:app from its own uvicorn process and replays
+# what open dashboards do:
+#   Home.tsx             fetchView('national') every poll
+#   RegionalDashboard    fetchView('region-{id}') every poll
+#   search box           /api/restaurants/search for each few characters typed, the way search-as-you-type would
+#   WebSocket viewers    /ws/radar connections sending a message now and then; latency is until its broadcast comes back
+# fetchView (snapshots.ts) reads the published snapshot first: latest.json, then the versioned file it names. With
+# --snapshots api (no VITE_SNAPSHOT_URL) both go through the API's /snapshots route; with --snapshots bucket a
+# bucket/CDN serves them and they cost the API nothing. --api-share of the polls fall back to the live
+# /api/rankings endpoints, as fetchView does when the snapshot is unavailable. No page polls /api/reviews/recent;
+# --recent adds it to Home's polls anyway.
+# Browsers poll once a minute; --poll-seconds compresses that, so 300 users polling every 5s stand for 3600 viewers.
+# Prints p50/p95/p99 and throughput per route and exits non-zero when a route breaks THRESHOLDS (or --thresholds),
+# or when --baseline is given and a route got more than --max-regression slower than in that saved run:
+#   python loadtest.py --users 300 --ws 50 --duration 60 --save loadtest_baseline.json
+#   python loadtest.py --users 300 --ws 50 --duration 60 --baseline loadtest_baseline.json
+import argparse
+import asyncio
+import base64
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from contextlib import suppress
+from datetime import datetime, timedelta, timezone
+from urllib.parse import quote
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the read API and /ws/radar against a seeded local database")
+    parser.add_argument("--users", type=int, default=300, help="Concurrent dashboard viewers")
+    parser.add_argument("--ws", type=int, default=50, help="Concurrent WebSocket connections")
+    parser.add_argument("--duration", type=float, default=60, help="Measured seconds, after the warm-up")
+    parser.add_argument("--warmup", type=float, default=10)
+    parser.add_argument("--poll-seconds", type=float, default=5, help="Dashboard refresh interval (browsers: 60)")
+    parser.add_argument("--ws-seconds", type=float, default=10, help="Interval between messages per WebSocket")
+    parser.add_argument("--search-share", type=float, default=0.1, help="Chance a Home poll comes with a search")
+    parser.add_argument("--snapshots", choices=["api", "bucket"], default="api",
+                        help="Where browsers read snapshots: through /snapshots, or from a bucket the API never sees")
+    parser.add_argument("--api-share", type=float, default=0.05,
+                        help="Share of dashboard polls falling back to the live /api/rankings endpoints")
+    parser.add_argument("--recent", action="store_true", help="Also poll /api/reviews/recent from Home")
+    parser.add_argument("--reviews", type=float, default=30, help="Median reviews per restaurant")
+    parser.add_argument("--server-workers", type=int, default=1)
+    parser.add_argument("--url", help="Load an already running server instead of seeding and starting one")
+    parser.add_argument("--thresholds", help="JSON file overriding THRESHOLDS, same shape")
+    parser.add_argument("--baseline", help="Results saved by an earlier --save run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="Allowed p95/p99 growth against --baseline")
+    parser.add_argument("--save", help="Write this run's results here")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    if not args.url:
+        db_dir = tempfile.mkdtemp(prefix="loadtest_")
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(db_dir, 'loadtest.db')}"
+        os.environ["EMBEDDED_WORKER"] = "0"
+        os.environ["SNAPSHOT_DIR"] = os.path.join(db_dir, "snapshots")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import models
+import publish
+from database import SessionLocal, ensure_schema
+from regions import get_region_by_city
+
+REGIONS = ["north", "center", "south", "sharon", "shfela"] # Layout.tsx
+HOME_SHARE = 0.6 # viewers on Home rather than a regional dashboard
+NAVIGATE_SHARE = 0.05 # chance per poll that a viewer switches page
+# Options that change the offered load; a baseline saved with other values isn't comparable
+LOAD_KEYS = ("users", "ws", "poll_seconds", "snapshots", "api_share", "recent")
+
+NATIONAL = "GET /api/rankings/national"
+REGION = "GET /api/rankings/region/{id}"
+RECENT = "GET /api/reviews/recent"
+SNAPSHOT_POINTER = "GET /snapshots/latest.json"
+SNAPSHOT_FILE = "GET /snapshots/v/{version}/{view}"
+SEARCH = "GET /api/restaurants/search"
+WEBSOCKET = "WS /ws/radar"
+ROUTES = [SNAPSHOT_POINTER, SNAPSHOT_FILE, NATIONAL, REGION, RECENT, SEARCH, WEBSOCKET]
+
+# Milliseconds, plus the share of failed requests; a route over any of them fails the run
+THRESHOLDS = {
+    SNAPSHOT_POINTER: {"p95": 100, "p99": 300, "error_rate": 0.005},
+    SNAPSHOT_FILE: {"p95": 100, "p99": 300, "error_rate": 0.005},
+    NATIONAL: {"p95": 150, "p99": 400, "error_rate": 0.005},
+    REGION: {"p95": 150, "p99": 400, "error_rate": 0.005},
+    RECENT: {"p95": 200, "p99": 500, "error_rate": 0.005},
+    SEARCH: {"p95": 300, "p99": 800, "error_rate": 0.005},
+    WEBSOCKET: {"p95": 300, "p99": 800, "error_rate": 0.005},
+}
+
+PHRASES = ["שווארמה אש", "הפיתה הייתה יבשה", "שירות מהיר", "על הפנים", "בשר עסיסי", "יקר מדי", "הכי טוב בעיר",
+           "חיכינו שעה", "פצצה של מקום", "בסדר, לא יותר", "נדיר", "פח", "עמבה מעולה", "צ'יפס קר"]
+SOURCES = ["google"] * 12 + ["tiktok"] * 4 + ["instagram"] * 3 + ["facebook"]
+
+
+def load_seed_targets() -> list:
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "auto_seeds.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def seed_database(rng: random.Random, median_reviews: float) -> int:
+    """ One restaurant per seed, with a long tail of review counts and mostly recent reviews """
+    db = SessionLocal()
+    now = datetime.now(timezone.utc)
+    total = 0
+    try:
+        for i, seed in enumerate(load_seed_targets()):
+            restaurant = models.Restaurant(
+                name=seed["query"].replace(f" {seed['city']}", "").strip(), city=seed["city"],
+                region=get_region_by_city(seed["city"]), platform_id=f"loadtest-{i}", address=f"{seed['city']} {i}",
+                google_rating=round(rng.uniform(3.0, 4.9), 1), google_ratings_total=int(rng.lognormvariate(5, 1)),
+                wolt_rating=round(rng.uniform(7, 9.8), 1) if rng.random() < 0.6 else None,
+                social_volume=rng.randint(0, 30), last_score=rng.uniform(30, 95), bayesian_average=rng.uniform(35, 92)
+            )
+            db.add(restaurant)
+            db.flush()
+            count = min(500, int(rng.lognormvariate(math.log(median_reviews), 0.9)))
+            restaurant.total_reviews = count
+            db.add_all(models.Review(
+                restaurant_id=restaurant.id, source=rng.choice(SOURCES),
+                content=" ".join(rng.choice(PHRASES) for _ in range(rng.randint(3, 25))),
+                sentiment_score=rng.uniform(-1, 1), weight=rng.uniform(0.1, 3.0),
+                published_at=now - timedelta(hours=rng.expovariate(1 / 400))
+            ) for _ in range(count))
+            total += count
+            if i % 50 == 0:
+                db.commit()
+        db.commit()
+    finally:
+        db.close()
+    return total
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve(workers: int):
+    port = free_port()
+    server = subprocess.Popen([sys.executable, "-W", "ignore", "-m", "uvicorn", "main:app", "--port", str(port),
+                               "--workers", str(workers), "--log-level", "warning"],
+                              cwd=os.path.dirname(os.path.abspath(__file__)))
+    for _ in range(300):
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1) as s:
+                s.sendall(b"GET /api/health HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+                if s.recv(32).startswith(b"HTTP/1.1 200"):
+                    break
+        except OSError:
+            pass
+        time.sleep(0.1)
+    return server, f"http://127.0.0.1:{port}"
+
+
+class Recorder:
+    def __init__(self):
+        self.recording = False
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+        self.causes = Counter()
+
+    def record(self, route: str, seconds: float, error: str = None):
+        if not self.recording:
+            return
+        self.latencies[route].append(seconds)
+        if error:
+            self.errors[route] += 1
+            self.causes[(route, error)] += 1
+
+
+class HttpConnection:
+    """ A kept-alive HTTP/1.1 connection; a bare client so the load generator isn't what saturates first """
+    def __init__(self, host: str, port: int):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def get(self, path: str):
+        """ (status, body); the body as sent, so still gzipped when the server compressed it """
+        reused = self.writer is not None
+        if not reused:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            # Every browser accepts gzip, and /snapshots answers with the precompressed copy when it's accepted
+            self.writer.write(f"GET {quote(path, safe='/?=&')} HTTP/1.1\r\nHost: {self.host}\r\n"
+                              f"Accept-Encoding: gzip\r\n\r\n".encode())
+            status_line = await self.reader.readline()
+            if not status_line and reused:
+                # The server closed the idle connection (uvicorn's keep-alive timeout); browsers retry on a new one
+                self.close()
+                return await self.get(path)
+            length = 0
+            while True:
+                line = await self.reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                name, _, value = line.partition(b":")
+                if name.lower() == b"content-length":
+                    length = int(value)
+            body = await self.reader.readexactly(length)
+            return int(status_line.split()[1]), body
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+async def ws_connect(host: str, port: int, path: str):
+    """ Minimal RFC 6455 client handshake; returns (reader, writer) """
+    reader, writer = await asyncio.open_connection(host, port)
+    key = base64.b64encode(os.urandom(16)).decode()
+    writer.write((f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                  f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n").encode())
+    status_line = await reader.readline()
+    while (await reader.readline()) not in (b"\r\n", b""):
+        pass
+    if b" 101 " not in status_line:
+        writer.close()
+        raise ConnectionError(f"WebSocket upgrade refused: {status_line.decode().strip()}")
+    return reader, writer
+
+
+def ws_frame(opcode: int, payload: bytes) -> bytes:
+    # Client frames must be masked
+    mask = os.urandom(4)
+    n = len(payload)
+    if n < 126:
+        header = bytes([0x80 | opcode, 0x80 | n])
+    elif n < 65536:
+        header = bytes([0x80 | opcode, 0x80 | 126]) + n.to_bytes(2, "big")
+    else:
+        header = bytes([0x80 | opcode, 0x80 | 127]) + n.to_bytes(8, "big")
+    return header + mask + bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+
+
+async def ws_receive(reader, writer):
+    """ The next text message, or None once the server closes """
+    while True:
+        first, second = await reader.readexactly(2)
+        n = second & 0x7F
+        if n == 126:
+            n = int.from_bytes(await reader.readexactly(2), "big")
+        elif n == 127:
+            n = int.from_bytes(await reader.readexactly(8), "big")
+        payload = await reader.readexactly(n)
+        opcode = first & 0x0F
+        if opcode == 0x8:
+            return None
+        if opcode == 0x9:
+            writer.write(ws_frame(0xA, payload))
+            continue
+        if opcode == 0x1:
+            return payload.decode("utf-8")
+
+
+class LoadTest:
+    def __init__(self, base_url: str, rng: random.Random):
+        host_port = base_url.split("//", 1)[1].rstrip("/")
+        self.host, port = host_port.split(":")
+        self.port = int(port)
+        self.rng = rng
+        self.recorder = Recorder()
+        self.stop = asyncio.Event()
+        self.names = [seed["query"].replace(f" {seed['city']}", "").strip() for seed in load_seed_targets()]
+
+    async def pause(self, seconds: float):
+        with suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(self.stop.wait(), seconds)
+
+    async def request(self, conn: HttpConnection, route: str, path: str):
+        """ The response body, or None when the request failed """
+        started = time.perf_counter()
+        try:
+            status, body = await conn.get(path)
+        except Exception as e:
+            self.recorder.record(route, time.perf_counter() - started, type(e).__name__)
+            return None
+        self.recorder.record(route, time.perf_counter() - started, None if status == 200 else f"HTTP {status}")
+        return body if status == 200 else None
+
+    async def fetch_view(self, conn: HttpConnection, view: str, route: str, api_path: str):
+        """ What fetchView does for one poll: the snapshot pointer and file, or the live endpoint as a fallback """
+        if self.rng.random() < args.api_share:
+            await self.request(conn, route, api_path)
+            return
+        if args.snapshots == "bucket":
+            return
+        pointer = await self.request(conn, SNAPSHOT_POINTER, "/snapshots/latest.json")
+        file = None
+        if pointer is not None:
+            with suppress(ValueError, KeyError):
+                # latest.json has no .gz copy, so it always arrives as plain JSON
+                file = json.loads(pointer)["files"].get(view)
+        if not file or await self.request(conn, SNAPSHOT_FILE, f"/snapshots/{file}") is None:
+            await self.request(conn, route, api_path)
+
+    async def type_search(self, conn: HttpConnection):
+        # Mostly places we track, sometimes one we don't (which also scans the seed file)
+        name = self.rng.choice(self.names) if self.rng.random() < 0.8 else f"שווארמה {self.rng.randint(1000, 9999)}"
+        typed = 2
+        while typed <= len(name) and not self.stop.is_set():
+            await self.request(conn, SEARCH, f"/api/restaurants/search?q={name[:typed]}")
+            typed += self.rng.randint(2, 4)
+            await self.pause(self.rng.uniform(0.2, 0.5))
+
+    async def viewer(self):
+        conn = HttpConnection(self.host, self.port)
+        page = "home" if self.rng.random() < HOME_SHARE else self.rng.choice(REGIONS)
+        # Viewers arrive spread over one poll interval instead of all at once
+        await self.pause(self.rng.uniform(0, args.poll_seconds))
+        while not self.stop.is_set():
+            if page == "home":
+                await self.fetch_view(conn, "national", NATIONAL, "/api/rankings/national")
+                if args.recent:
+                    await self.request(conn, RECENT, "/api/reviews/recent")
+                if self.rng.random() < args.search_share:
+                    await self.type_search(conn)
+            else:
+                await self.fetch_view(conn, f"region-{page}", REGION, f"/api/rankings/region/{page}")
+            if self.rng.random() < NAVIGATE_SHARE:
+                page = "home" if self.rng.random() < HOME_SHARE else self.rng.choice(REGIONS)
+            await self.pause(args.poll_seconds * self.rng.uniform(0.9, 1.1))
+        conn.close()
+
+    async def ws_viewer(self, index: int):
+        await self.pause(self.rng.uniform(0, args.ws_seconds))
+        try:
+            reader, writer = await ws_connect(self.host, self.port, "/ws/radar")
+        except Exception as e:
+            print(f"WebSocket {index} could not connect: {e}")
+            self.recorder.record(WEBSOCKET, 0.0, type(e).__name__)
+            return
+        waiting = {}
+
+        async def receive():
+            # /ws/radar broadcasts every message to every connection; only our own echoes resolve a wait
+            while True:
+                message = await ws_receive(reader, writer)
+                if message is None:
+                    return
+                waiter = waiting.pop(message, None)
+                if waiter and not waiter.done():
+                    waiter.set_result(None)
+
+        receiver = asyncio.create_task(receive())
+        sequence = 0
+        try:
+            while not self.stop.is_set():
+                sequence += 1
+                text = f"loadtest {index} {sequence}"
+                echoed = asyncio.get_running_loop().create_future()
+                waiting[f"Client said: {text}"] = echoed
+                started = time.perf_counter()
+                writer.write(ws_frame(0x1, text.encode()))
+                try:
+                    await asyncio.wait_for(echoed, 10)
+                    self.recorder.record(WEBSOCKET, time.perf_counter() - started)
+                except (asyncio.TimeoutError, ConnectionError) as e:
+                    self.recorder.record(WEBSOCKET, time.perf_counter() - started, type(e).__name__)
+                if receiver.done():
+                    self.recorder.record(WEBSOCKET, 0.0, "closed by server")
+                    return
+                await self.pause(args.ws_seconds * self.rng.uniform(0.9, 1.1))
+        finally:
+            receiver.cancel()
+            with suppress(Exception):
+                writer.write(ws_frame(0x8, b""))
+                writer.close()
+
+    async def run(self) -> float:
+        tasks = [asyncio.create_task(self.viewer()) for _ in range(args.users)]
+        tasks += [asyncio.create_task(self.ws_viewer(i)) for i in range(args.ws)]
+        await asyncio.sleep(args.warmup)
+        self.recorder.recording = True
+        started = time.perf_counter()
+        await asyncio.sleep(args.duration)
+        self.recorder.recording = False
+        elapsed = time.perf_counter() - started
+        self.stop.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return elapsed
+
+
+def percentile(ordered: list, p: float) -> float:
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000 if ordered else 0.0
+
+
+def summarize(recorder: Recorder, elapsed: float) -> dict:
+    results = {}
+    for route in ROUTES:
+        ordered = sorted(recorder.latencies.get(route, []))
+        if not ordered:
+            continue
+        results[route] = {
+            "count": len(ordered),
+            "rps": round(len(ordered) / elapsed, 2),
+            "p50": round(percentile(ordered, 50), 2),
+            "p95": round(percentile(ordered, 95), 2),
+            "p99": round(percentile(ordered, 99), 2),
+            "max": round(ordered[-1] * 1000, 2),
+            "errors": recorder.errors[route],
+            "error_rate": round(recorder.errors[route] / len(ordered), 5),
+        }
+    return results
+
+
+def check(results: dict, thresholds: dict, baseline: dict = None, max_regression: float = 0.25) -> list:
+    failures = []
+    for route, limits in thresholds.items():
+        row = results.get(route)
+        if row is None:
+            failures.append(f"{route}: no requests completed")
+            continue
+        for metric, limit in limits.items():
+            if row[metric] > limit:
+                failures.append(f"{route}: {metric} {row[metric]:g} over the limit of {limit:g}")
+    for route, before in (baseline or {}).get("routes", {}).items():
+        row = results.get(route)
+        if row is None:
+            continue
+        for metric in ("p95", "p99"):
+            # A few ms of noise on fast routes isn't a regression
+            allowed = max(before[metric] * (1 + max_regression), before[metric] + 5)
+            if row[metric] > allowed:
+                failures.append(f"{route}: {metric} {row[metric]:g} ms vs {before[metric]:g} ms in the baseline")
+    return failures
+
+
+def expected_routes() -> set:
+    """ Routes this run's options send traffic to; only those are held to THRESHOLDS """
+    routes = {SEARCH}
+    if args.snapshots == "api":
+        routes |= {SNAPSHOT_POINTER, SNAPSHOT_FILE}
+    if args.api_share > 0:
+        routes |= {NATIONAL, REGION}
+    if args.recent:
+        routes.add(RECENT)
+    if args.ws:
+        routes.add(WEBSOCKET)
+    return routes
+
+
+def print_table(results: dict):
+    print(f"{'route':32} {'count':>7} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'errors':>7}")
+    for route, row in results.items():
+        print(f"{route:32} {row['count']:7} {row['rps']:7.1f} {row['p50']:8.1f} {row['p95']:8.1f} "
+              f"{row['p99']:8.1f} {row['max']:8.1f} {row['errors']:7}")
+
+
+if __name__ == "__main__":
+    rng = random.Random(args.seed)
+    server = None
+    if args.url:
+        base_url = args.url
+    else:
+        ensure_schema()
+        started = time.perf_counter()
+        reviews = seed_database(rng, args.reviews)
+        print(f"Seeded {len(load_seed_targets())} restaurants and {reviews} reviews in {time.perf_counter() - started:.1f}s")
+        db = SessionLocal()
+        try:
+            publish.publish_snapshots(db)
+        finally:
+            db.close()
+        server, base_url = serve(args.server_workers)
+    viewers = round(args.users * 60 / args.poll_seconds)
+    print(f"{args.users} dashboard users polling every {args.poll_seconds:g}s (~{viewers} browser viewers), "
+          f"{args.ws} WebSockets, {args.warmup:g}s warm-up + {args.duration:g}s measured against {base_url}")
+    try:
+        test = LoadTest(base_url, rng)
+        elapsed = asyncio.run(test.run())
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    results = summarize(test.recorder, elapsed)
+    print_table(results)
+    for (route, cause), count in test.recorder.causes.most_common(10):
+        print(f"  {route}: {count} x {cause}")
+    thresholds = dict(THRESHOLDS)
+    if args.thresholds:
+        with open(args.thresholds, encoding="utf-8") as f:
+            thresholds.update(json.load(f))
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        offered = {key: baseline.get(key) for key in LOAD_KEYS}
+        if offered != {key: getattr(args, key) for key in LOAD_KEYS}:
+            print(f"Warning: the baseline ran a different load ({offered}); latencies may not be comparable")
+    expected = expected_routes()
+    failures = check(results, {route: t for route, t in thresholds.items() if route in expected},
+                     baseline, args.max_regression)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({**{key: getattr(args, key) for key in LOAD_KEYS},
+                       "duration": args.duration, "routes": results}, f, ensure_ascii=False, indent=2)
+        print(f"Saved results to {args.save}")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print("PASS" if not failures else f"{len(failures)} checks failed")
+    raise SystemExit(1 if failures else 0)
@@ -1,58 +1,48 @@
-from fastapi import FastAPI, Depends, HTTPException, WebSocket, WebSocketDisconnect, BackgroundTasks
+from fastapi import FastAPI, Depends, HTTPException, WebSocket, WebSocketDisconnect, Request, Response, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from typing import List
-import uvicorn
 import asyncio
+import hmac
+import inspect
+import os
+import time
 from contextlib import asynccontextmanager
+from datetime import datetime
+from urllib.parse import quote
 
-import models, schemas
-from database import engine, get_db
-from worker import run_cron_cycle, run_single_scrape_sync
+import models, schemas, metrics, profiling, jobs, checkpoints, geo, serialization, publish, retention, trending
+from database import get_db, get_async_db, ensure_schema, dispose_async_engine, ASYNC_READS
 
-# Create db tables
-models.Base.metadata.create_all(bind=engine)
-
-def cleanup_legacy_data():
-    """ Delete old mock restaurants like Bambino and Said that were scarped previously """
-    from database import SessionLocal
-    db = SessionLocal()
-    try:
-        targets = ["%במבינו%", "%סעיד%", "%בורגר%", "%סטיישן%"]
-        for target in targets:
-            rests = db.query(models.Restaurant).filter(models.Restaurant.name.like(target)).all()
-            for r in rests:
-                db.query(models.Review).filter(models.Review.restaurant_id == r.id).delete()
-                db.delete(r)
-        db.commit()
-        print("Legacy data cleaned up from Database.")
-    except Exception as e:
-        print(f"Error cleaning DB: {e}")
-    finally:
-        db.close()
-
-async def background_worker():
-    while True:
-        try:
-            print("Background: Starting worker cycle...")
-            await run_cron_cycle()
-        except Exception as e:
-            print(f"Background worker error: {e}")
-        # Wait 30 minutes before running again (simulating hourly/daily cron in an active web service)
-        await asyncio.sleep(1800)
+# The crawler normally runs as its own process (crawler.py) so API workers stay pure readers.
+# EMBEDDED_WORKER=1 keeps the old single-service setup; the crawler lease still guarantees that
+# only one of several uvicorn workers actually crawls.
+EMBEDDED_WORKER = os.getenv("EMBEDDED_WORKER", "0") == "1"
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Clean up any lingering data
-    cleanup_legacy_data()
-    
-    # Start the background task when the app starts
-    task = asyncio.create_task(background_worker())
+    # Schema creation and the legacy cleanup run once per database, not once per boot
+    ensure_schema()
+
+    task = None
+    runner = None
+    if EMBEDDED_WORKER:
+        from crawler import crawl_forever
+        from leader import make_holder_id
+        task = asyncio.create_task(crawl_forever())
+        runner = jobs.JobRunner(make_holder_id())
+        runner.start()
     yield
     # Cancel the task when the app stops
-    task.cancel()
+    if task:
+        task.cancel()
+    if runner:
+        runner.stop()
+    await dispose_async_engine()
 
-app = FastAPI(title="ShawarmaRadar API", lifespan=lifespan)
+# orjson for every dynamic response; the hot ranking routes bypass encoding entirely via PayloadCache
+app = FastAPI(title="ShawarmaRadar API", lifespan=lifespan, default_response_class=serialization.FastJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -62,10 +52,67 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template (/api/regions/{region_name}) rather than raw path to keep cardinality bounded
+    route = request.scope.get("route")
+    metrics.HTTP_REQUEST_SECONDS.labels(
+        method=request.method,
+        route=route.path if route else "unmatched",
+        status=str(response.status_code)
+    ).observe(time.perf_counter() - started)
+    return response
+
 @app.get("/api/health")
-def health_check():
+async def health_check():
     return {"status": "ok"}
 
+@app.get("/metrics")
+def prometheus_metrics():
+    payload, content_type = metrics.render_latest()
+    return Response(content=payload, media_type=content_type)
+
+def require_admin(x_admin_token: str = Header(None)):
+    """ Admin endpoints are disabled unless ADMIN_TOKEN is configured """
+    expected = os.getenv("ADMIN_TOKEN")
+    if not expected or not x_admin_token or not hmac.compare_digest(x_admin_token, expected):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@app.post("/api/admin/profile", dependencies=[Depends(require_admin)])
+def arm_profile(request: schemas.ProfileRequest):
+    """ Arms CPU + allocation profiling for the next worker cycle or restaurant """
+    try:
+        armed = profiling.request_profile(request.target, request.query)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"armed": armed}
+
+@app.get("/api/admin/profiles", dependencies=[Depends(require_admin)])
+def list_profiles():
+    return {"pending": profiling.pending_request(), "files": profiling.list_profiles()}
+
+@app.get("/api/admin/profiles/{name}", dependencies=[Depends(require_admin)])
+def download_profile(name: str):
+    content = profiling.profile_content(name)
+    if content is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    # Labels carry Hebrew restaurant names, which only the RFC 5987 form of the header can hold
+    return Response(content=content, media_type="text/plain",
+                    headers={"Content-Disposition": f"attachment; filename*=utf-8''{quote(name)}"})
+
+@app.get("/api/admin/cycles", dependencies=[Depends(require_admin)])
+def list_cycles(limit: int = 10, db: Session = Depends(get_db)):
+    """ Per-cycle reports: duration, outcomes, failures and the slowest seeds """
+    return checkpoints.recent_cycles(db, min(limit, 100))
+
+@app.get("/api/admin/archive/reviews", dependencies=[Depends(require_admin)])
+def query_review_archive(restaurant_id: int = None, source: str = None, since: datetime = None, until: datetime = None,
+                         contains: str = None, limit: int = 100):
+    """ Reviews moved out of the live database by the retention sweep, read back from the cold archive """
+    return retention.query_archive(restaurant_id, source, since, until, contains, limit)
+
 # WebSocket Connection Manager
 class ConnectionManager:
     def __init__(self):
@@ -96,31 +143,90 @@ async def websocket_radar(websocket: WebSocket):
     except WebSocketDisconnect:
         manager.disconnect(websocket)
 
+payload_cache = serialization.PayloadCache()
+
+@app.get("/snapshots/{path:path}")
+def get_snapshot(path: str, request: Request):
+    """ Published leaderboard snapshots straight from storage (no database), precompressed when gzip is accepted """
+    # Versioned files never change; only the latest pointer must be revalidated
+    cache = "no-cache" if path == publish.LATEST_FILE else publish.IMMUTABLE
+    headers = {"Cache-Control": cache, "Vary": "Accept-Encoding"}
+    gzip_ok = "gzip" in request.headers.get("accept-encoding", "") and not path.endswith(".gz")
+    full_path = publish.snapshot_file(path)
+    if full_path:
+        if gzip_ok and os.path.isfile(full_path + ".gz"):
+            headers["Content-Encoding"] = "gzip"
+            return FileResponse(full_path + ".gz", media_type="application/json", headers=headers)
+        return FileResponse(full_path, headers=headers)
+    # Bucket storage: relayed for clients without VITE_SNAPSHOT_URL; normally the bucket serves them directly
+    data = publish.snapshot_bytes(path + ".gz") if gzip_ok else None
+    if data is not None:
+        headers["Content-Encoding"] = "gzip"
+    else:
+        data = publish.snapshot_bytes(path)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    return Response(content=data, media_type="application/json", headers=headers)
+
+def json_bytes(payload: bytes) -> Response:
+    return Response(content=payload, media_type="application/json")
+
+def read_endpoint(view):
+    """
+    Read endpoints are written once against a sync Session. With ASYNC_READS (Postgres) they run on the asyncpg
+    engine through run_sync, so a slow query doesn't hold one of the threadpool's few slots while every other
+    request queues behind it; on SQLite they stay threadpool handlers, which keep the far lower tail there.
+    """
+    if not ASYNC_READS:
+        return view
+    async def endpoint(*args, db, **kwargs):
+        return await db.run_sync(lambda session: view(*args, db=session, **kwargs))
+    signature = inspect.signature(view)
+    endpoint.__signature__ = signature.replace(parameters=[
+        p.replace(default=Depends(get_async_db)) if p.name == "db" else p for p in signature.parameters.values()
+    ])
+    endpoint.__name__, endpoint.__doc__ = view.__name__, view.__doc__
+    return endpoint
+
 @app.get("/api/rankings/national")
+@read_endpoint
 def get_national_king(db: Session = Depends(get_db)):
     """ Returns the top 1 'King' and the next top runners up nationally """
-    # Sort by bayesian_average descending
-    top_restaurants = db.query(models.Restaurant).order_by(models.Restaurant.bayesian_average.desc()).limit(10).all()
-    
-    if not top_restaurants:
-        return {"king": None, "runnersUp": []}
-        
-    return {
-        "king": top_restaurants[0],
-        "runnersUp": top_restaurants[1:]
-    }
+    return json_bytes(payload_cache.get(db, ("national",), serialization.national_payload))
 
 @app.get("/api/rankings/region/{region_id}")
+@read_endpoint
 def get_regional_rankings(region_id: str, db: Session = Depends(get_db)):
     """ Returns the top restaurants for a specific region ID (north, center, south, etc) """
-    regional_restaurants = db.query(models.Restaurant)\
-        .filter(models.Restaurant.region == region_id)\
-        .order_by(models.Restaurant.bayesian_average.desc())\
-        .limit(10).all()
-        
-    return regional_restaurants
+    return json_bytes(payload_cache.get(db, ("region_top", region_id), lambda s: serialization.regional_top_payload(s, region_id)))
+
+nearby_index = geo.CycleBoundIndex()
+
+@app.get("/api/rankings/near")
+@read_endpoint
+def get_nearby_rankings(lat: float, lng: float, k: int = 10, radius_km: float = 10.0, db: Session = Depends(get_db)):
+    """ Returns the top-k ranked places within radius_km of a point, from an index rebuilt once per cycle """
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise HTTPException(status_code=400, detail="Invalid coordinates")
+    k = max(1, min(k, 50))
+    radius_km = max(0.1, min(radius_km, 100.0))
+    return nearby_index.get(db).nearest_top(lat, lng, radius_km, k)
+
+trending_board = trending.TrendingBoard()
+
+@app.get("/api/rankings/trending")
+@read_endpoint
+def get_trending_rankings(k: int = 10, db: Session = Depends(get_db)):
+    """ Places with the most recent review and social activity, from a top-k heap kept current incrementally """
+    return trending_board.top(db, k)
+
+def load_seeds() -> list:
+    import json
+    with open("auto_seeds.json", "r", encoding="utf-8") as f:
+        return json.load(f)
 
 @app.get("/api/restaurants/search")
+@read_endpoint
 def search_restaurant(q: str = "", db: Session = Depends(get_db)):
     """ Returns whether a restaurant exists in the DB based on search term """
     if not q or len(q.strip()) < 2:
@@ -135,12 +241,10 @@ def search_restaurant(q: str = "", db: Session = Depends(get_db)):
         
     # Check if it's in the queue (auto_seeds.json)
     try:
-        import json
-        with open("auto_seeds.json", "r", encoding="utf-8") as f:
-            seeds = json.load(f)
-            for s in seeds:
-                if query_str in s.get("query", ""):
-                    return {"exists": True, "message": f"מעולה! העסק נמצא בתור לסריקה על ידי המכ\"ם בסבב הקרוב."}
+        seeds = load_seeds()
+        for s in seeds:
+            if query_str in s.get("query", ""):
+                return {"exists": True, "message": f"מעולה! העסק נמצא בתור לסריקה על ידי המכ\"ם בסבב הקרוב."}
     except Exception as e:
         print("Error checking seeds:", e)
     
@@ -151,29 +255,49 @@ def search_restaurant(q: str = "", db: Session = Depends(get_db)):
         "whatsapp_link": whatsapp_url
     }
 
+def client_address(request: Request):
+    # Behind Render's proxy the peer is the proxy; it appends the real client as the last X-Forwarded-For entry,
+    # and anything before that came from the client and can't be trusted.
+    # None when the caller can't be identified: such requests skip the per-client limit (the queue cap still
+    # applies) instead of all sharing one bucket that a single anonymous caller could use up
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded and forwarded.split(",")[-1].strip():
+        return forwarded.split(",")[-1].strip()
+    return request.client.host if request.client else None
+
+@app.post("/api/scrape", status_code=202, response_model=schemas.ScrapeJobAccepted)
+def request_scrape(request: schemas.ScrapeRequest, http_request: Request, db: Session = Depends(get_db)):
+    """ Queues an on-demand scrape. Repeated requests for the same place join the existing job. """
+    if len(request.query.strip()) < 2:
+        raise HTTPException(status_code=400, detail="Query too short")
+    try:
+        job, created = jobs.enqueue(db, request.query, request.city, client=client_address(http_request))
+    except jobs.JobRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    return {"job": job, "coalesced": not created}
+
+@app.get("/api/scrape/{job_id}", response_model=schemas.ScrapeJobSchema)
+@read_endpoint
+def get_scrape_job(job_id: int, db: Session = Depends(get_db)):
+    job = db.get(models.ScrapeJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 @app.get("/api/regions/{region_name}", response_model=List[schemas.RestaurantSchema])
+@read_endpoint
 def get_restaurants_by_region(region_name: str, db: Session = Depends(get_db)):
-    restaurants = db.query(models.Restaurant).filter(models.Restaurant.region == region_name).order_by(models.Restaurant.bayesian_average.desc()).all()
-    return restaurants
+    # Rendered in RestaurantSchema's shape by serialization.region_full_payload; response_model stays for the docs
+    return json_bytes(payload_cache.get(db, ("region_full", region_name), lambda s: serialization.region_full_payload(s, region_name)))
 
 @app.get("/api/reviews/recent")
+@read_endpoint
 def get_recent_reviews(limit: int = 20, db: Session = Depends(get_db)):
     """ Returns the most recent reviews combined with restaurant data for the Live Feed """
-    recent_reviews = db.query(models.Review)\
-        .order_by(models.Review.published_at.desc())\
-        .limit(limit).all()
-        
-    results = []
-    for rev in recent_reviews:
-        results.append({
-            "id": rev.id,
-            "restaurant_name": rev.restaurant.name if rev.restaurant else "Unknown Target",
-            "city": rev.restaurant.city if rev.restaurant else "",
-            "content": rev.content,
-            "sentiment": rev.sentiment_score,
-            "published_at": rev.published_at.isoformat() if rev.published_at else None
-        })
-    return results
+    if limit == serialization.RECENT_FEED_LIMIT:
+        return json_bytes(payload_cache.get(db, ("recent",), serialization.recent_reviews_payload))
+    return serialization.recent_reviews_payload(db, limit)
 
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
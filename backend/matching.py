@@ -0,0 +1,261 @@
+# Entity resolution between our seeds and the records returned by Google, Wolt and social sources.
+# Names are normalized into tokens (Hebrew and English), candidates are blocked by city + token,
+# and a similarity score decides whether two records are the same place. Confirmed matches are
+# persisted in entity_matches so later cycles re-validate them cheaply instead of searching again.
+import re
+import unicodedata
+from collections import defaultdict
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models
+
+MATCH_THRESHOLD = 0.5
+# Reusing an already-tracked restaurant without any API call needs much stronger evidence
+STRONG_MATCH_THRESHOLD = 0.85
+# Share of a name's distinctive tokens a caption has to contain to count as a mention
+MENTION_TOKEN_SHARE = 0.6
+
+GENERIC_TOKENS = {
+    "שווארמה", "shawarma", "shwarma", "israel", "ישראל", "מסעדה", "מסעדת", "restaurant",
+    "grill", "גריל", "ב", "של", "the", "and", "bar", "בר", "סניף", "branch",
+}
+FINAL_LETTERS = str.maketrans("ךםןףץ", "כמנפצ")
+NIQQUD = re.compile(r"[֑-ׇ]")
+NON_WORD = re.compile(r"[^\w\s]|_")
+SPELLING_VARIANTS = {"שוארמה": "שווארמה", "shawerma": "shawarma", "schawarma": "shawarma"}
+
+# Rough consonant skeletons let "Hazan" and "חזן" meet: both become "hzn"
+HEBREW_SKELETON = {
+    "ב": "b", "ג": "g", "ד": "d", "ה": "h", "ז": "z", "ח": "h", "ט": "t", "כ": "k", "ל": "l",
+    "מ": "m", "נ": "n", "ס": "s", "פ": "p", "צ": "ts", "ק": "k", "ר": "r", "ש": "sh", "ת": "t",
+}
+LATIN_DIGRAPHS = (("sh", "sh"), ("ch", "h"), ("kh", "h"), ("tz", "ts"), ("ts", "ts"), ("ph", "p"))
+LATIN_SKELETON = {
+    "b": "b", "v": "b", "g": "g", "j": "g", "d": "d", "h": "h", "z": "z", "t": "t", "k": "k",
+    "c": "k", "q": "k", "l": "l", "m": "m", "n": "n", "s": "s", "p": "p", "f": "p", "r": "r", "x": "ks",
+}
+
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    text = NIQQUD.sub("", text).translate(FINAL_LETTERS)
+    text = text.replace("'", "").replace("׳", "").replace("״", "").replace('"', "")
+    text = NON_WORD.sub(" ", text)
+    return " ".join(SPELLING_VARIANTS.get(w, w) for w in text.split())
+
+
+def _is_generic(token: str) -> bool:
+    if token in GENERIC_TOKENS:
+        return True
+    # Hebrew prefix letters: "השווארמה", "בשווארמה"
+    return len(token) > 2 and token[0] in "הבוש" and token[1:] in GENERIC_TOKENS
+
+
+def name_tokens(name: str, city: str = None) -> set:
+    """ Distinctive tokens of a place name, without generic words and (when possible) the city """
+    tokens = {t for t in normalize_text(name).split() if not _is_generic(t)}
+    if city:
+        city_tokens = set(normalize_text(city).split())
+        without_city = tokens - city_tokens
+        # "שווארמה אשקלון אשקלון" has nothing but the city; keep it rather than matching on nothing
+        if without_city:
+            tokens = without_city
+    return tokens
+
+
+def skeleton(token: str) -> str:
+    if any("א" <= c <= "ת" for c in token):
+        return "".join(HEBREW_SKELETON.get(c, "") for c in token)
+    for digraph, sound in LATIN_DIGRAPHS:
+        token = token.replace(digraph, sound.upper())
+    out = []
+    for c in token:
+        if c.isupper():
+            out.append(c.lower())
+        else:
+            out.append(LATIN_SKELETON.get(c, ""))
+    return "".join(out)
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(name_a: str, name_b: str, city: str = None) -> float:
+    """
+    0..1 similarity of two place names. Combines exact token overlap, cross-script
+    consonant-skeleton overlap and character trigrams (robust to small spelling differences).
+    """
+    tokens_a = name_tokens(name_a, city)
+    tokens_b = name_tokens(name_b, city)
+    if not tokens_a or not tokens_b:
+        return 0.0
+
+    token_score = _jaccard(tokens_a, tokens_b)
+    skel_score = _jaccard({skeleton(t) for t in tokens_a} - {""}, {skeleton(t) for t in tokens_b} - {""})
+    # Containment catches "חזן" vs "שווארמה חזן הותיקה": every token of the shorter name is present
+    smaller, larger = sorted((tokens_a, tokens_b), key=len)
+    containment = len(smaller & larger) / len(smaller)
+
+    tri_a = _trigrams(" ".join(sorted(tokens_a)))
+    tri_b = _trigrams(" ".join(sorted(tokens_b)))
+    trigram_score = 2 * len(tri_a & tri_b) / (len(tri_a) + len(tri_b))
+
+    lexical = max(token_score, skel_score, 0.8 * containment)
+    return round(0.6 * lexical + 0.4 * trigram_score, 3)
+
+
+def _sound_keys(token: str) -> set:
+    """ Consonant skeletons a token can show up as in either script, also without a Hebrew prefix letter """
+    keys = {skeleton(token)}
+    if len(token) > 2 and "א" <= token[0] <= "ת" and token[0] in "הבוש":
+        keys.add(skeleton(token[1:]))
+    return {k for k in keys if len(k) >= 2}
+
+
+def mentions(text: str, name: str, city: str = None) -> bool:
+    """
+    Whether free text (a caption) refers to the place: at least MENTION_TOKEN_SHARE of its distinctive tokens
+    appear, as written or transliterated ("#hakosem" for "הקוסם"), the way similarity() compares skeletons
+    """
+    tokens = name_tokens(name, city)
+    if not tokens:
+        return False
+    normalized = normalize_text(text)
+    words = normalized.split()
+    word_set = set(words)
+    compact = normalized.replace(" ", "")
+    word_sounds = set().union(*(_sound_keys(w) for w in words)) if words else set()
+    compact_sound = "".join(skeleton(w) for w in words)
+
+    def found(token: str) -> bool:
+        # Hashtags glue words together, so fall back to substring checks on the compact form
+        if token in word_set or token in compact:
+            return True
+        for key in _sound_keys(token):
+            # Inside glued hashtags only longer skeletons are specific enough to count
+            if key in word_sounds or (len(key) >= 4 and key in compact_sound):
+                return True
+        return False
+
+    matched = sum(1 for t in tokens if found(t))
+    return matched >= MENTION_TOKEN_SHARE * len(tokens)
+
+
+def blocking_keys(name: str, city: str) -> set:
+    norm_city = normalize_text(city)
+    keys = set()
+    for token in name_tokens(name, city):
+        keys.add(f"{norm_city}|{token}")
+        skel = skeleton(token)
+        if len(skel) >= 2:
+            keys.add(f"{norm_city}|~{skel}")
+    return keys
+
+
+def best_match(query_name: str, candidates: list, name_of, city: str = None, threshold: float = MATCH_THRESHOLD):
+    """ Returns (candidate, score) for the most similar candidate above threshold, or (None, best_score) """
+    best, best_score = None, 0.0
+    for candidate in candidates:
+        score = similarity(query_name, name_of(candidate) or "", city)
+        if score > best_score:
+            best, best_score = candidate, score
+    if best_score < threshold:
+        return None, best_score
+    return best, best_score
+
+
+# What the worker needs of a tracked restaurant to adopt it; copied so the index outlives session commits
+INDEXED_FIELDS = ("id", "name", "city", "platform_id", "address", "lat", "lng")
+
+
+class BlockingIndex:
+    """ city|token -> restaurant ids, so a name is only compared against plausible candidates """
+    def __init__(self, restaurants: list):
+        self.restaurants = {}
+        self.blocks = defaultdict(set)
+        for r in restaurants:
+            self.add(r)
+
+    def add(self, restaurant):
+        """ Indexes a restaurant, e.g. one created after the index was built """
+        r = SimpleNamespace(**{field: getattr(restaurant, field) for field in INDEXED_FIELDS})
+        self.restaurants[r.id] = r
+        for key in blocking_keys(r.name, r.city):
+            self.blocks[key].add(r.id)
+
+    def candidates(self, name: str, city: str) -> list:
+        ids = set()
+        for key in blocking_keys(name, city):
+            ids |= self.blocks.get(key, set())
+        return [self.restaurants[i] for i in ids]
+
+    def find(self, name: str, city: str, threshold: float = STRONG_MATCH_THRESHOLD):
+        return best_match(name, self.candidates(name, city), lambda r: r.name, city, threshold)
+
+
+def load_blocking_index(db: Session) -> BlockingIndex:
+    return BlockingIndex(db.query(*(getattr(models.Restaurant, field) for field in INDEXED_FIELDS)).all())
+
+
+class EntityResolver:
+    """
+    Persistent index of confirmed seed -> external record matches, one per source. `blocking` is a BlockingIndex
+    shared by every resolver of a cycle; without one, the first blocking() call loads its own.
+    """
+    def __init__(self, db: Session, blocking: BlockingIndex = None):
+        self.db = db
+        self._blocking = blocking
+
+    def lookup(self, seed_key: str, source: str):
+        return self.db.query(models.EntityMatch)\
+            .filter(models.EntityMatch.seed_key == seed_key, models.EntityMatch.source == source)\
+            .first()
+
+    def confirm(self, seed_key: str, source: str, external_id: str, external_name: str = None, score: float = None, **extra):
+        match = self.lookup(seed_key, source)
+        now = datetime.now(timezone.utc)
+        if match is None:
+            match = models.EntityMatch(seed_key=seed_key, source=source, confirmed_at=now)
+            self.db.add(match)
+        match.external_id = external_id
+        match.external_name = external_name
+        match.score = score
+        match.last_validated_at = now
+        for field, value in extra.items():
+            setattr(match, field, value)
+        try:
+            self.db.commit()
+        except IntegrityError:
+            self.db.rollback()
+        return match
+
+    def touch(self, match: models.EntityMatch):
+        match.last_validated_at = datetime.now(timezone.utc)
+        self.db.commit()
+
+    def invalidate(self, match: models.EntityMatch, reason: str):
+        print(f"Entity match {match.source}:{match.external_id} for '{match.seed_key}' invalidated: {reason}")
+        self.db.delete(match)
+        self.db.commit()
+
+    def remember(self, restaurant: models.Restaurant):
+        """ Adds a newly created restaurant to the blocking index, if one is loaded """
+        if self._blocking is not None:
+            self._blocking.add(restaurant)
+
+    def blocking(self) -> BlockingIndex:
+        if self._blocking is None:
+            self._blocking = load_blocking_index(self.db)
+        return self._blocking
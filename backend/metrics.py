@@ -0,0 +1,121 @@
+# Prometheus metrics shared by the API process and the background worker.
+# All collectors live in the default registry so a single /metrics scrape
+# exposes both the HTTP side and whatever the worker pipeline recorded.
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+# Buckets tuned for network calls: fast cache-like hits up to slow Apify actor runs
+SLOW_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+HTTP_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# --- Worker pipeline ---
+STAGE_SECONDS = Histogram(
+    "radar_pipeline_stage_seconds",
+    "Time spent in each worker pipeline stage",
+    ["stage"],
+    buckets=SLOW_BUCKETS,
+)
+SOURCE_SECONDS = Histogram(
+    "radar_source_request_seconds",
+    "Latency of calls to external data sources",
+    ["source"],
+    buckets=SLOW_BUCKETS,
+)
+SOURCE_CALLS = Counter(
+    "radar_source_calls_total",
+    "Calls made to external data sources",
+    ["source", "outcome"],
+)
+LLM_TOKENS = Counter(
+    "radar_llm_tokens_total",
+    "OpenAI tokens consumed by sentiment analysis",
+    ["kind"],
+)
+LLM_REQUESTS = Counter(
+    "radar_llm_requests_total",
+    "Sentiment requests by result: ok, rate_limited, requeued, failed, skipped (circuit open), deadline",
+    ["result"],
+)
+REVIEWS_INGESTED = Counter(
+    "radar_reviews_total",
+    "Reviews seen by the worker, split into new inserts and duplicate skips",
+    ["source", "result"],
+)
+CACHE_HITS = Counter(
+    "radar_cache_hits_total",
+    "Lookups answered from a local cache instead of an external call",
+    ["cache"],
+)
+CACHE_MISSES = Counter(
+    "radar_cache_misses_total",
+    "Lookups that missed a local cache",
+    ["cache"],
+)
+CIRCUIT_OPEN = Gauge(
+    "radar_source_circuit_open",
+    "1 while a source's circuit breaker refuses calls (open or probing)",
+    ["source"],
+)
+RESTAURANTS_PROCESSED = Counter(
+    "radar_restaurants_processed_total",
+    "Restaurants handled by process_restaurant, by outcome",
+    ["outcome"],
+)
+CYCLE_LAST_DURATION = Gauge(
+    "radar_cycle_last_duration_seconds",
+    "Wall-clock duration of the most recent cron cycle",
+)
+CYCLE_LAST_SEEDS = Gauge(
+    "radar_cycle_last_seeds",
+    "Number of seeds processed by the most recent cron cycle",
+)
+CYCLE_LAST_FINISHED = Gauge(
+    "radar_cycle_last_finished_timestamp",
+    "Unix time at which the most recent cron cycle finished",
+)
+CYCLE_IN_PROGRESS = Gauge(
+    "radar_cycle_in_progress",
+    "1 while a cron cycle is running",
+)
+
+PIPELINE_QUEUE_DEPTH = Gauge(
+    "radar_pipeline_queue_depth",
+    "Items waiting in front of each streaming ingestion stage",
+    ["stage"],
+)
+PIPELINE_BUSY_WORKERS = Gauge(
+    "radar_pipeline_busy_workers",
+    "Workers of each streaming ingestion stage currently handling an item",
+    ["stage"],
+)
+PIPELINE_ITEMS = Counter(
+    "radar_pipeline_items_total",
+    "Items handled by each streaming ingestion stage: passed on, dropped, or failed",
+    ["stage", "result"],
+)
+
+# --- HTTP API ---
+HTTP_REQUEST_SECONDS = Histogram(
+    "radar_http_request_seconds",
+    "API request latency by route template",
+    ["method", "route", "status"],
+    buckets=HTTP_BUCKETS,
+)
+
+
+def stage(name: str):
+    """ Returns a context manager timing one pipeline stage (e.g. `with stage("search_place"):`) """
+    return STAGE_SECONDS.labels(stage=name).time()
+
+
+def source(name: str):
+    """ Returns a context manager timing one call to an external source """
+    return SOURCE_SECONDS.labels(source=name).time()
+
+
+def record_source_call(name: str, ok: bool):
+    SOURCE_CALLS.labels(source=name, outcome="ok" if ok else "error").inc()
+
+
+def render_latest():
+    """ Serializes the default registry in the Prometheus text format """
+    return generate_latest(), CONTENT_TYPE_LATEST
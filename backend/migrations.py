@@ -0,0 +1,103 @@
+# One-time schema and data migrations.
+# Each applied migration leaves a row in schema_migrations, so a warm boot costs one table check and one
+# SELECT instead of create_all's per-table reflection, column inspection and the legacy cleanup scans.
+# New tables or columns get a new entry at the end of MIGRATIONS; entries are never edited or reordered.
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+import models
+from database import Base, SessionLocal, engine, add_missing_columns
+
+
+def create_tables(*tables):
+    """ create_all is checkfirst, so this is safe on databases that predate the migration table """
+    Base.metadata.create_all(bind=engine, tables=[m.__table__ for m in tables] or None)
+
+
+def cleanup_legacy_data():
+    """ Delete old mock restaurants like Bambino and Said that were scarped previously """
+    db = SessionLocal()
+    try:
+        targets = ["%במבינו%", "%סעיד%", "%בורגר%", "%סטיישן%"]
+        for target in targets:
+            rests = db.query(models.Restaurant).filter(models.Restaurant.name.like(target)).all()
+            for r in rests:
+                db.query(models.Review).filter(models.Review.restaurant_id == r.id).delete()
+                db.delete(r)
+        db.commit()
+        print("Legacy data cleaned up from Database.")
+    finally:
+        db.close()
+
+
+def create_review_retention():
+    create_tables(models.ReviewAggregate, models.ArchivedReviewFingerprint)
+    # The retention sweep selects reviews by age; older databases have no index on published_at
+    with engine.begin() as conn:
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_reviews_published_at ON reviews (published_at)"))
+
+
+def add_scrape_job_tracking():
+    add_missing_columns("scrape_jobs", {"client": "VARCHAR", "heartbeat_at": "FLOAT"})
+    with engine.begin() as conn:
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_scrape_jobs_client ON scrape_jobs (client)"))
+
+
+def create_data_version(name: str):
+    create_tables(models.DataVersion)
+    with engine.begin() as conn:
+        if conn.execute(text("SELECT 1 FROM data_versions WHERE name = :name"), {"name": name}).first() is None:
+            conn.execute(text("INSERT INTO data_versions (name, version) VALUES (:name, 0)"), {"name": name})
+
+
+def add_trending_change_seq():
+    # TrendingBoard reads bumped counters by commit sequence; rows bumped before this stay NULL until bumped again,
+    # which is fine since a board's first build reads every row
+    add_missing_columns("trending_counters", {"change_seq": "INTEGER"})
+    with engine.begin() as conn:
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_trending_counters_change_seq ON trending_counters (change_seq)"))
+    create_data_version("trending")
+
+
+MIGRATIONS = [
+    ("0001_initial_tables", create_tables),
+    ("0002_restaurant_coordinates", lambda: add_missing_columns("restaurants", {"lat": "FLOAT", "lng": "FLOAT"})),
+    ("0003_legacy_cleanup", cleanup_legacy_data),
+    ("0004_source_fallback_values", lambda: add_missing_columns("restaurants", {"wolt_rating": "FLOAT", "social_volume": "INTEGER"})),
+    ("0005_source_watermarks", lambda: create_tables(models.SourceWatermark)),
+    ("0006_review_retention", create_review_retention),
+    ("0007_trending_counters", lambda: create_tables(models.TrendingCounter)),
+    ("0008_seed_leases", lambda: create_tables(models.SeedLease)),
+    ("0009_profiles", lambda: create_tables(models.ProfileRequest, models.ProfileResult)),
+    ("0010_scrape_job_tracking", add_scrape_job_tracking),
+    ("0011_data_version", lambda: create_data_version("rankings")),
+    ("0012_trending_change_seq", add_trending_change_seq),
+]
+
+
+def applied_versions() -> set:
+    models.SchemaMigration.__table__.create(bind=engine, checkfirst=True)
+    db = SessionLocal()
+    try:
+        return {row.version for row in db.query(models.SchemaMigration.version)}
+    finally:
+        db.close()
+
+
+def migrate():
+    """ Applies pending migrations in order. Steps are idempotent, so two processes racing here is harmless """
+    done = applied_versions()
+    for version, step in MIGRATIONS:
+        if version in done:
+            continue
+        print(f"Applying migration {version}...")
+        step()
+        db = SessionLocal()
+        try:
+            db.add(models.SchemaMigration(version=version))
+            db.commit()
+        except IntegrityError:
+            # Another process recorded it first
+            db.rollback()
+        finally:
+            db.close()
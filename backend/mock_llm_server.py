@@ -0,0 +1,116 @@
+# Local stand-in for OpenAI's chat completions endpoint with account-style rate limits, for exercising
+# nlp.SentimentDispatcher without a key or a bill:
+#   python mock_llm_server.py --port 8100 --rpm 600 --tpm 60000 [--latency-ms 200] [--error-rate 0.02]
+# Point the SDK at it with OPENAI_BASE_URL=http://127.0.0.1:8100/v1 and any OPENAI_API_KEY.
+# Like the real API, requests and tokens refill continuously up to one minute's worth; a request that doesn't fit
+# gets a 429 with Retry-After, successes carry x-ratelimit-remaining-* headers, and --error-rate answers 503.
+# The "sentiment" is a hash of the review text (expected_score), so callers can check every answer.
+import argparse
+import asyncio
+import hashlib
+import math
+import random
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+app = FastAPI()
+config = {"rpm": 600.0, "tpm": 60000.0, "latency_ms": 200.0, "error_rate": 0.0}
+stats = {"ok": 0, "rate_limited": 0, "errors": 0, "tokens": 0}
+buckets = {}
+
+
+def expected_score(text: str) -> float:
+    return int(hashlib.sha1(text.encode("utf-8")).hexdigest(), 16) % 201 / 100 - 1.0
+
+
+def count_tokens(messages: list, max_tokens: int) -> tuple:
+    # Roughly the real ratio for English; the client's own estimate is deliberately different
+    prompt = sum(math.ceil(len(m.get("content") or "") / 4) for m in messages)
+    return prompt, max_tokens
+
+
+class Bucket:
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.available = per_minute
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_for(self, amount: float) -> float:
+        self.refill()
+        return max(0.0, (amount - self.available) / self.rate)
+
+
+def rate_headers() -> dict:
+    return {
+        "x-ratelimit-limit-requests": str(int(config["rpm"])),
+        "x-ratelimit-limit-tokens": str(int(config["tpm"])),
+        "x-ratelimit-remaining-requests": str(max(0, int(buckets["requests"].available))),
+        "x-ratelimit-remaining-tokens": str(max(0, int(buckets["tokens"].available))),
+    }
+
+
+@app.get("/stats")
+def get_stats():
+    return stats
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    if not buckets:
+        buckets.update(requests=Bucket(config["rpm"]), tokens=Bucket(config["tpm"]))
+    body = await request.json()
+    messages = body.get("messages", [])
+    prompt_tokens, completion_tokens = count_tokens(messages, body.get("max_tokens") or 16)
+    total = prompt_tokens + completion_tokens
+
+    wait = max(buckets["requests"].wait_for(1), buckets["tokens"].wait_for(total))
+    if wait > 0:
+        stats["rate_limited"] += 1
+        headers = rate_headers()
+        headers.update({"retry-after": str(math.ceil(wait)), "retry-after-ms": str(int(wait * 1000) + 1)})
+        return JSONResponse(status_code=429, headers=headers, content={"error": {
+            "message": f"Rate limit reached for {body.get('model')}. Please try again in {wait:.3f}s.",
+            "type": "requests", "code": "rate_limit_exceeded",
+        }})
+    buckets["requests"].available -= 1
+    buckets["tokens"].available -= total
+
+    await asyncio.sleep(config["latency_ms"] / 1000 * random.uniform(0.5, 1.5))
+    if random.random() < config["error_rate"]:
+        stats["errors"] += 1
+        return JSONResponse(status_code=503, content={"error": {"message": "The server is overloaded.", "type": "server_error"}})
+
+    stats["ok"] += 1
+    stats["tokens"] += total
+    review = (messages[-1].get("content") or "") if messages else ""
+    return JSONResponse(headers=rate_headers(), content={
+        "id": f"chatcmpl-mock-{stats['ok']}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model"),
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": f"{expected_score(review):.2f}"}}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": total},
+    })
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Rate-limited mock of the OpenAI chat completions API")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--rpm", type=float, default=config["rpm"])
+    parser.add_argument("--tpm", type=float, default=config["tpm"])
+    parser.add_argument("--latency-ms", type=float, default=config["latency_ms"])
+    parser.add_argument("--error-rate", type=float, default=config["error_rate"], help="Share of requests answered 503")
+    args = parser.parse_args()
+    config.update(rpm=args.rpm, tpm=args.tpm, latency_ms=args.latency_ms, error_rate=args.error_rate)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Index, Text, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -12,6 +12,8 @@ class Restaurant(Base):
     region = Column(String, index=True) # north, center, south, sharon, shfela
     platform_id = Column(String, unique=True, index=True) # e.g. google place id
     address = Column(String, nullable=True)
+    lat = Column(Float, nullable=True)
+    lng = Column(Float, nullable=True)
     
     # Calculated scores
     last_score = Column(Float, default=0.0)
@@ -19,6 +21,9 @@ class Restaurant(Base):
     total_reviews = Column(Integer, default=0)
     google_rating = Column(Float, nullable=True)
     google_ratings_total = Column(Integer, default=0)
+    # Last values a source actually returned, used in the score while that source is unavailable
+    wolt_rating = Column(Float, nullable=True)
+    social_volume = Column(Integer, nullable=True)
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -39,7 +44,213 @@ class Review(Base):
     sentiment_score = Column(Float) # Between -1.0 and 1.0
     weight = Column(Float, default=1.0) # Recency decay weight
     
-    published_at = Column(DateTime(timezone=True))
+    published_at = Column(DateTime(timezone=True), index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     restaurant = relationship("Restaurant", back_populates="reviews")
+
+
+class SchemaMigration(Base):
+    """ Marker row per applied migration (see migrations.py) """
+    __tablename__ = "schema_migrations"
+
+    version = Column(String, primary_key=True)
+    applied_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class WorkerLease(Base):
+    """ A named, time-limited lock used to elect a single crawler across processes """
+    __tablename__ = "worker_leases"
+
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=True)
+    expires_at = Column(Float, default=0.0) # Unix timestamp
+    acquired_at = Column(Float, nullable=True)
+
+
+class ScrapeJob(Base):
+    """ Durable on-demand scrape request, claimed by the crawler's job pool """
+    __tablename__ = "scrape_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    query = Column(String)
+    city = Column(String)
+    dedup_key = Column(String, index=True) # normalized query + city, used to coalesce duplicates
+    status = Column(String, default="queued", index=True) # queued, running, done, failed
+    attempts = Column(Integer, default=0)
+    worker = Column(String, nullable=True)
+    client = Column(String, nullable=True, index=True) # address of whoever asked, for the per-client rate limit
+    heartbeat_at = Column(Float, nullable=True) # Unix timestamp, renewed while a runner works on the job
+    outcome = Column(String, nullable=True) # updated, unchanged, not_found, no_data
+    error = Column(String, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # At most one active job per query, enforced by the database so concurrent POSTs can't both insert
+        Index(
+            "uq_scrape_jobs_active_key", "dedup_key", unique=True,
+            sqlite_where=text("status IN ('queued', 'running')"),
+            postgresql_where=text("status IN ('queued', 'running')"),
+        ),
+    )
+
+
+class CrawlCycle(Base):
+    """ One pass of the cron worker over the seed list; survives restarts so the pass can resume """
+    __tablename__ = "crawl_cycles"
+
+    id = Column(Integer, primary_key=True, index=True)
+    status = Column(String, default="running", index=True) # running, completed, abandoned
+    total_seeds = Column(Integer, default=0)
+    summary = Column(String, nullable=True) # JSON report written when the cycle completes
+
+    started_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    seeds = relationship("CrawlCycleSeed", back_populates="cycle")
+
+
+class CrawlCycleSeed(Base):
+    """ Checkpoint for a single seed within a cycle """
+    __tablename__ = "crawl_cycle_seeds"
+
+    id = Column(Integer, primary_key=True, index=True)
+    cycle_id = Column(Integer, ForeignKey("crawl_cycles.id"), index=True)
+    seed_key = Column(String)
+    outcome = Column(String) # updated, unchanged, not_found, no_data, failed
+    error = Column(String, nullable=True)
+    duration_seconds = Column(Float, default=0.0)
+    finished_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    cycle = relationship("CrawlCycle", back_populates="seeds")
+
+    __table_args__ = (Index("uq_crawl_cycle_seed", "cycle_id", "seed_key", unique=True),)
+
+
+class SeedLease(Base):
+    """ A seed of a running cycle, claimed by one crawler at a time through a time-limited lease """
+    __tablename__ = "seed_leases"
+
+    id = Column(Integer, primary_key=True, index=True)
+    cycle_id = Column(Integer, ForeignKey("crawl_cycles.id"), index=True)
+    seed_key = Column(String)
+    query = Column(String)
+    city = Column(String)
+    status = Column(String, default="pending", index=True) # pending, leased, done
+    holder = Column(String, nullable=True)
+    expires_at = Column(Float, default=0.0) # Unix timestamp
+    attempts = Column(Integer, default=0)
+
+    __table_args__ = (Index("uq_seed_lease", "cycle_id", "seed_key", unique=True),)
+
+
+class EntityMatch(Base):
+    """ A confirmed link between a seed and a record in an external source (Google place, Wolt venue, hashtag) """
+    __tablename__ = "entity_matches"
+
+    id = Column(Integer, primary_key=True, index=True)
+    seed_key = Column(String, index=True) # query|city, same key as the cycle checkpoints
+    source = Column(String) # google, wolt, social
+    external_id = Column(String)
+    external_name = Column(String, nullable=True)
+    score = Column(Float, nullable=True)
+    address = Column(String, nullable=True)
+    lat = Column(Float, nullable=True)
+    lng = Column(Float, nullable=True)
+
+    confirmed_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_validated_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (Index("uq_entity_match_seed_source", "seed_key", "source", unique=True),)
+
+
+class SourceWatermark(Base):
+    """ What a source last reported for a restaurant, so the worker only pays for full fetches when it changed """
+    __tablename__ = "source_watermarks"
+
+    id = Column(Integer, primary_key=True, index=True)
+    restaurant_id = Column(Integer, ForeignKey("restaurants.id"))
+    source = Column(String) # google, wolt, tiktok, instagram, facebook
+    ratings_total = Column(Integer, nullable=True) # google user_ratings_total at the last full fetch
+    newest_review_time = Column(Integer, nullable=True) # Unix timestamp of the newest review ingested
+    seen_urls = Column(String, nullable=True) # JSON list of recently ingested post URLs
+    last_full_fetch_at = Column(Float, nullable=True) # Unix timestamp
+    last_checked_at = Column(Float, nullable=True) # Unix timestamp
+
+    __table_args__ = (Index("uq_source_watermark", "restaurant_id", "source", unique=True),)
+
+
+class ReviewAggregate(Base):
+    """ Running totals of a restaurant's reviews that were moved to the cold archive (see retention.py) """
+    __tablename__ = "review_aggregates"
+
+    id = Column(Integer, primary_key=True, index=True)
+    restaurant_id = Column(Integer, ForeignKey("restaurants.id"))
+    source = Column(String)
+    review_count = Column(Integer, default=0)
+    weight_sum = Column(Float, default=0.0)
+    weighted_sentiment_sum = Column(Float, default=0.0) # sum of weight * sentiment_score
+    oldest_published_at = Column(DateTime(timezone=True), nullable=True)
+    newest_published_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (Index("uq_review_aggregate", "restaurant_id", "source", unique=True),)
+
+
+class ArchivedReviewFingerprint(Base):
+    """ Hash of an archived review's text, so a source re-serving an old review doesn't re-ingest it """
+    __tablename__ = "archived_review_fingerprints"
+
+    restaurant_id = Column(Integer, ForeignKey("restaurants.id"), primary_key=True)
+    content_hash = Column(String, primary_key=True)
+
+
+class TrendingCounter(Base):
+    """ Forward-decayed activity sums for a restaurant (see trending.py); each is relative to `epoch` """
+    __tablename__ = "trending_counters"
+
+    restaurant_id = Column(Integer, ForeignKey("restaurants.id"), primary_key=True)
+    epoch = Column(Float) # Unix timestamp the sums are expressed against
+    heat = Column(Float, default=0.0)
+    reviews = Column(Float, default=0.0)
+    mentions = Column(Float, default=0.0)
+    sentiment_sum = Column(Float, default=0.0)
+    updated_at = Column(Float, index=True) # Unix timestamp of the last bump
+    change_seq = Column(Integer, index=True) # Commit sequence of the last bump (see trending.py)
+
+
+class ProfileRequest(Base):
+    """ An admin's request to profile the next cycle or restaurant, claimed by whichever crawler gets there first """
+    __tablename__ = "profile_requests"
+
+    id = Column(Integer, primary_key=True, index=True)
+    target = Column(String) # cycle, restaurant
+    query = Column(String, nullable=True) # only restaurants whose query contains this
+    status = Column(String, default="armed", index=True) # armed, claimed, replaced
+    holder = Column(String, nullable=True)
+    requested_at = Column(Float) # Unix timestamp
+    claimed_at = Column(Float, nullable=True)
+
+
+class ProfileResult(Base):
+    """ One output file of a profiled run (collapsed stacks or the allocation report), kept for download """
+    __tablename__ = "profile_results"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True, index=True)
+    content = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class DataVersion(Base):
+    """
+    Named counters: 'rankings' is bumped after every commit that touched restaurants or reviews (see database.py),
+    'trending' numbers the commits that bumped trending counters (see trending.py)
+    """
+    __tablename__ = "data_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, default=0)
@@ -1,24 +1,20 @@
+import asyncio
+from dataclasses import dataclass
 from datetime import datetime, timezone
 import math
 import os
-from openai import OpenAI
+import threading
+import time
 from dotenv import load_dotenv
 
+import metrics
+import resilience
+
 load_dotenv()
 
-class RankingEngine:
-    def __init__(self):
-        self.openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        
-    def analyze_sentiment(self, text: str) -> float:
-        """
-        Uses OpenAI GPT-4o-mini to analyze Hebrew text and return
-        a sentiment score between -1.0 (very negative) and 1.0 (very positive).
-        """
-        if not text or not self.openai_client.api_key:
-            return 0.0
-            
-        system_prompt = '''
+SENTIMENT_MODEL = "gpt-4o-mini"
+SENTIMENT_MAX_TOKENS = 10
+SENTIMENT_SYSTEM_PROMPT = '''
         You are a sentiment analysis engine for Hebrew restaurant reviews (specifically Shawarma).
         Analyze the following review and return ONLY a float number between -1.0 and 1.0.
         -1.0 = Extremely negative, terrible experience, food poisoning, etc.
@@ -27,22 +23,318 @@ class RankingEngine:
         Take Israeli slang ("אש", "פצצה", "על הפנים", "פח", "נדיר") into heavy consideration.
         Calculate the sentiment carefully. Respond ONLY with the number, no text, no explanation.
         '''
+# Client-side budgets for the OpenAI account, per process; keep them a little under the account's limits
+OPENAI_RPM_LIMIT = float(os.getenv("OPENAI_RPM_LIMIT", "450"))
+OPENAI_TPM_LIMIT = float(os.getenv("OPENAI_TPM_LIMIT", "180000"))
+SENTIMENT_MAX_IN_FLIGHT = int(os.getenv("SENTIMENT_MAX_IN_FLIGHT", "16"))
+SENTIMENT_MAX_ATTEMPTS = int(os.getenv("SENTIMENT_MAX_ATTEMPTS", "5"))
+SENTIMENT_TIMEOUT_SECONDS = 30.0
+# Rough for mixed Hebrew/English text; every response's usage corrects the estimate
+CHARS_PER_TOKEN = 3.0
+
+
+def estimate_tokens(text: str) -> int:
+    """ Prompt plus completion tokens a sentiment request is expected to cost """
+    return int((len(SENTIMENT_SYSTEM_PROMPT) + len(text)) / CHARS_PER_TOKEN) + SENTIMENT_MAX_TOKENS
+
+
+def parse_sentiment(content: str) -> float:
+    return max(-1.0, min(1.0, float(content.strip())))
+
+
+class RateBudget:
+    """
+    Token bucket refilling `per_minute` units per minute, up to one minute's worth. Shared by every dispatcher
+    (and event loop) in the process, hence the lock.
+    """
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.available = per_minute
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay_for(self, amount: float) -> float:
+        """ Seconds until `amount` can be taken; 0 when it can be taken now """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            missing = min(amount, self.capacity) - self.available
+            return max(self.paused_until - now, missing / self.rate if missing > 0 else 0.0, 0.0)
+
+    def take(self, amount: float):
+        """ May go below zero (e.g. when a response used more than estimated); later callers wait it off """
+        with self._lock:
+            self._refill(time.monotonic())
+            self.available -= amount
+
+    def give_back(self, amount: float):
+        self.take(-amount)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def sync(self, remaining: float):
+        """ Lowers the budget to what the server says is left, e.g. when other processes share the API key """
+        with self._lock:
+            self._refill(time.monotonic())
+            self.available = min(self.available, remaining)
+
+
+REQUEST_BUDGET = RateBudget(OPENAI_RPM_LIMIT)
+TOKEN_BUDGET = RateBudget(OPENAI_TPM_LIMIT)
+
+
+class SentimentDispatcher:
+    """
+    Scores reviews concurrently on the running event loop, up to `concurrency` requests in flight. Every request
+    first waits for room in the requests-per-minute and tokens-per-minute budgets. A 429 pauses both budgets for
+    the server's Retry-After and puts the review back in the queue; timeouts and 5xx answers are re-queued with
+    backoff. A review that still can't be scored after max_attempts comes back as None, never as a made-up 0.0.
+    Workers exist only while there is work, so a dispatcher outlives the per-seed event loops the worker uses; the
+    HTTP client lives as long as its loop, until aclose().
+    """
+    def __init__(self, concurrency: int = SENTIMENT_MAX_IN_FLIGHT, max_attempts: int = SENTIMENT_MAX_ATTEMPTS,
+                 requests: RateBudget = None, tokens: RateBudget = None, base_url: str = None):
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.requests = requests or REQUEST_BUDGET
+        self.tokens = tokens or TOKEN_BUDGET
+        self.base_url = base_url
+        self._loop = None
+        self._queue = None
+        self._client = None
+        self._workers = set()
+
+    def _bind(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # A new event loop (the worker runs one per seed): the old queue and HTTP client belong to the old one
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._client = None
+            self._workers = set()
+        return loop
+
+    def _client_for_loop(self):
+        if self._client is None:
+            from openai import AsyncOpenAI
+            # Retries are ours: the SDK's own would bypass the budgets and the queue
+            self._client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=self.base_url,
+                                       max_retries=0, timeout=SENTIMENT_TIMEOUT_SECONDS)
+        return self._client
+
+    def _spawn_workers(self):
+        while len(self._workers) < min(self.concurrency, self._queue.qsize()):
+            task = self._loop.create_task(self._worker())
+            self._workers.add(task)
+            task.add_done_callback(self._workers.discard)
+
+    def _requeue(self, item: list, delay: float):
+        def put():
+            self._queue.put_nowait(item)
+            self._spawn_workers()
+        self._loop.call_later(delay, put)
+
+    async def score(self, text: str):
+        """ Sentiment between -1.0 and 1.0, or None when the review couldn't be scored """
+        if not text:
+            return 0.0
+        if not os.getenv("OPENAI_API_KEY"):
+            # Left NULL so score_unscored_reviews picks it up once a key is configured
+            return None
+        loop = self._bind()
+        future = loop.create_future()
+        self._queue.put_nowait([text, future, 0])
+        self._spawn_workers()
+        return await future
+
+    async def score_many(self, texts: list) -> list:
+        return await asyncio.gather(*(self.score(text) for text in texts))
+
+    async def aclose(self):
+        """
+        Closes the running loop's HTTP client. Call it once, when the loop's scoring is over: the client is kept
+        between bursts so its connections to the API stay alive across a seed.
+        """
+        if self._loop is asyncio.get_running_loop() and self._client is not None:
+            client, self._client = self._client, None
+            await client.close()
+
+    async def _acquire(self, estimate: int) -> bool:
+        """ Waits for room in both budgets and takes it. False when that would outlast the current deadline. """
+        while True:
+            wait = max(self.requests.delay_for(1), self.tokens.delay_for(estimate))
+            if wait <= 0:
+                self.requests.take(1)
+                self.tokens.take(estimate)
+                return True
+            left = resilience.time_left()
+            if left is not None and wait >= left:
+                return False
+            await asyncio.sleep(wait)
+
+    async def _worker(self):
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            text, future, attempts = item
+            if future.done():
+                continue
+            try:
+                result, retry_in = await self._attempt(text, attempts)
+            except Exception as e:
+                print(f"Error analyzing sentiment with OpenAI: {e}")
+                metrics.LLM_REQUESTS.labels(result="failed").inc()
+                result, retry_in = None, None
+            item[2] = attempts + 1
+            # A retry that can't happen before the current restaurant's deadline would only hold up the seed
+            left = resilience.time_left()
+            if retry_in is not None and item[2] < self.max_attempts and (left is None or retry_in < left):
+                metrics.LLM_REQUESTS.labels(result="requeued").inc()
+                self._requeue(item, retry_in)
+            elif not future.done():
+                if retry_in is not None:
+                    metrics.LLM_REQUESTS.labels(result="failed").inc()
+                future.set_result(result)
+
+    async def _attempt(self, text: str, attempts: int):
+        """ One request. Returns (score, None) when done, or (None, seconds to wait) when it should be retried """
+        from openai import APIConnectionError, APIStatusError, RateLimitError
+
+        breaker = resilience.breaker("openai")
+        if not breaker.allow():
+            metrics.LLM_REQUESTS.labels(result="skipped").inc()
+            return None, None
+        estimate = estimate_tokens(text)
+        if not await self._acquire(estimate):
+            breaker.release()
+            metrics.LLM_REQUESTS.labels(result="deadline").inc()
+            return None, None
+        try:
+            with metrics.source("openai"):
+                raw = await self._client_for_loop().chat.completions.with_raw_response.create(
+                    model=SENTIMENT_MODEL,
+                    messages=[
+                        {"role": "system", "content": SENTIMENT_SYSTEM_PROMPT},
+                        {"role": "user", "content": text}
+                    ],
+                    temperature=0.0,
+                    max_tokens=SENTIMENT_MAX_TOKENS,
+                    timeout=resilience.call_timeout(SENTIMENT_TIMEOUT_SECONDS)
+                )
+            response = raw.parse()
+        except RateLimitError as e:
+            # Not a fault of the source: wait out what the server asks for, everyone in the process included
+            breaker.release()
+            self.tokens.give_back(estimate)
+            headers = e.response.headers
+            retry_after = resilience.retry_after_seconds(headers.get("retry-after"))
+            if headers.get("retry-after-ms"):
+                retry_after = float(headers["retry-after-ms"]) / 1000
+            delay = resilience.backoff_delay(attempts, retry_after)
+            self.requests.pause(delay)
+            self.tokens.pause(delay)
+            metrics.LLM_REQUESTS.labels(result="rate_limited").inc()
+            return None, delay
+        except (APIConnectionError, APIStatusError) as e:
+            breaker.record_failure()
+            metrics.record_source_call("openai", False)
+            self.tokens.give_back(estimate)
+            if isinstance(e, APIStatusError) and e.status_code not in resilience.RETRYABLE_STATUSES:
+                print(f"Error analyzing sentiment with OpenAI: {e}")
+                metrics.LLM_REQUESTS.labels(result="failed").inc()
+                return None, None
+            return None, resilience.backoff_delay(attempts)
+
+        breaker.record_success()
+        metrics.record_source_call("openai", True)
+        remaining = raw.headers.get("x-ratelimit-remaining-tokens")
+        if remaining is not None:
+            self.tokens.sync(float(remaining))
+        if raw.headers.get("x-ratelimit-remaining-requests") is not None:
+            self.requests.sync(float(raw.headers["x-ratelimit-remaining-requests"]))
+        if response.usage:
+            self.tokens.take(response.usage.total_tokens - estimate)
+            metrics.LLM_TOKENS.labels(kind="prompt").inc(response.usage.prompt_tokens)
+            metrics.LLM_TOKENS.labels(kind="completion").inc(response.usage.completion_tokens)
+        try:
+            score = parse_sentiment(response.choices[0].message.content)
+        except (TypeError, ValueError):
+            # Deterministic at temperature 0, so asking again wouldn't help
+            print(f"Unexpected sentiment answer from OpenAI: {response.choices[0].message.content!r}")
+            metrics.LLM_REQUESTS.labels(result="failed").inc()
+            return None, None
+        metrics.LLM_REQUESTS.labels(result="ok").inc()
+        return score, None
+
+
+@dataclass(frozen=True)
+class ScoringParams:
+    """ Tunable parts of calculate_final_radar_score; the defaults are the production formula """
+    google_points: float = 40.0
+    buzz_points: float = 30.0
+    nlp_points: float = 15.0
+    wolt_points: float = 15.0
+    confidence_threshold: float = 50.0 # Google ratings needed before a place's own rating outweighs the prior
+    global_avg_rating: float = 3.5
+    buzz_cap: float = 20.0 # social signals that earn the full buzz points
+    wolt_baseline: float = 10.0 # points for places that aren't on Wolt
+
+
+DEFAULT_PARAMS = ScoringParams()
+
+
+class RankingEngine:
+    def __init__(self):
+        self._openai_client = None
+        self.sentiment = SentimentDispatcher()
+
+    @property
+    def openai_client(self):
+        # The openai SDK is heavy to import; only pay for it once a review actually needs scoring
+        if self._openai_client is None:
+            from openai import OpenAI
+            self._openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return self._openai_client
+
+    def analyze_sentiment(self, text: str):
+        """
+        Uses OpenAI GPT-4o-mini to analyze Hebrew text and return a sentiment score between -1.0 (very negative)
+        and 1.0 (very positive), or None when the call failed. One blocking call; the worker goes through
+        `self.sentiment` (SentimentDispatcher) instead.
+        """
+        if not text:
+            return 0.0
+        if not os.getenv("OPENAI_API_KEY"):
+            # Left NULL so score_unscored_reviews picks it up once a key is configured
+            return None
         
         try:
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": text}
-                ],
-                temperature=0.0,
-                max_tokens=10
-            )
-            score_str = response.choices[0].message.content.strip()
-            return float(score_str)
+            with metrics.source("openai"):
+                response = self.openai_client.chat.completions.create(
+                    model=SENTIMENT_MODEL,
+                    messages=[
+                        {"role": "system", "content": SENTIMENT_SYSTEM_PROMPT},
+                        {"role": "user", "content": text}
+                    ],
+                    temperature=0.0,
+                    max_tokens=SENTIMENT_MAX_TOKENS
+                )
+            metrics.record_source_call("openai", True)
+            if response.usage:
+                metrics.LLM_TOKENS.labels(kind="prompt").inc(response.usage.prompt_tokens)
+                metrics.LLM_TOKENS.labels(kind="completion").inc(response.usage.completion_tokens)
+            return parse_sentiment(response.choices[0].message.content)
         except Exception as e:
+            metrics.record_source_call("openai", False)
             print(f"Error analyzing sentiment with OpenAI: {e}")
-            return 0.0
+            return None
 
     def calculate_recency_weight(self, published_at: datetime) -> float:
         """
@@ -65,32 +357,34 @@ class RankingEngine:
         decay_factor = math.exp(-(age_hours - 24) / 4320)
         return max(0.1, decay_factor)
 
-    def calculate_final_radar_score(self, google_rating: float, google_ratings_total: int, recent_reviews: list, wolt_rating: float = 0.0, social_volume: int = 0) -> float:
+    def calculate_final_radar_score(self, google_rating: float, google_ratings_total: int, recent_reviews: list, wolt_rating: float = 0.0, social_volume: int = 0, params: "ScoringParams" = None) -> float:
         """
         Calculates the final Radar score (0-100) using 40/30/15/15 architecture.
         40% = Google Places rating (Bayesian anchored)
         30% = Social Volume (amount of recent chatter)
         15% = NLP Sentiment (positive/negative analysis of recent chatter)
         15% = Wolt operational rating
+        The split and the constants come from `params` (DEFAULT_PARAMS unless backtest.py is trying others).
         """
+        p = params or DEFAULT_PARAMS
         # 1. Google Basis (40 Points Maximum)
         if not google_rating: google_rating = 0.0
         if not google_ratings_total: google_ratings_total = 0
             
-        confidence_threshold = 50
-        global_avg_rating = 3.5 
+        confidence_threshold = p.confidence_threshold
+        global_avg_rating = p.global_avg_rating
         
         bayesian_rating = ( (google_ratings_total / (google_ratings_total + confidence_threshold)) * google_rating ) + \
                           ( (confidence_threshold / (google_ratings_total + confidence_threshold)) * global_avg_rating )
                           
-        google_score = (bayesian_rating / 5.0) * 40.0
+        google_score = (bayesian_rating / 5.0) * p.google_points
         
         # 2. Social Media Volume (Buzz) (30 Points Maximum)
         # Cap at 20 recent social signals to achieve full 30 points of buzz.
-        volume_points = min(30.0, (social_volume / 20.0) * 30.0)
+        volume_points = min(p.buzz_points, (social_volume / p.buzz_cap) * p.buzz_points)
         
         # 3. NLP Sentiment Score (15 Points Maximum)
-        nlp_points = 7.5 # Default neutral (half of 15) if no reviews
+        nlp_points = p.nlp_points / 2.0 # Default neutral (half of 15) if no reviews
         if recent_reviews:
             total_weight = 0.0
             weighted_sentiment = 0.0
@@ -102,15 +396,15 @@ class RankingEngine:
             if total_weight > 0:
                 avg_sentiment = weighted_sentiment / total_weight # Ranges -1 to 1
                 # Convert -1 to 1 into 0 to 15 points
-                nlp_points = ((avg_sentiment + 1.0) / 2.0) * 15.0
+                nlp_points = ((avg_sentiment + 1.0) / 2.0) * p.nlp_points
                 
         # 4. Wolt Delivery Rating (15 Points Maximum)
         # Wolt Ratings are out of 10.0
         if wolt_rating > 0:
-            wolt_points = (wolt_rating / 10.0) * 15.0
+            wolt_points = (wolt_rating / 10.0) * p.wolt_points
         else:
             # If venue is not on Wolt, we award a baseline 10 points so they aren't fully crippled against Wolt places.
-            wolt_points = 10.0
+            wolt_points = p.wolt_baseline
             
         final_score = google_score + volume_points + nlp_points + wolt_points
         return min(100.0, max(0.0, final_score))
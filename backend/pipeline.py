@@ -0,0 +1,104 @@
+# Streaming ingestion pipeline.
+# Stages are chained by bounded asyncio queues. Each stage runs its own number of workers and hands an item on
+# as soon as it is done with it, so fetching, scoring and storing overlap. A full queue makes whoever feeds it
+# wait (ultimately the fetchers), which keeps memory capped however much a source returns. Queue depth and busy
+# workers per stage are exported as gauges; the stage whose queue stays full is the bottleneck.
+import asyncio
+import os
+
+import metrics
+
+QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "32"))
+
+_DONE = object()
+
+
+class Stage:
+    def __init__(self, name: str, handler, concurrency: int = 1, maxsize: int = QUEUE_SIZE):
+        self.name = name
+        self.handler = handler
+        self.concurrency = concurrency
+        self.maxsize = maxsize
+
+
+class Pipeline:
+    """
+    A linear chain of stages. A handler is `async def handler(item)` returning the item for the next stage,
+    or None to drop it; the last stage's return value is ignored. Producers feed the first stage with `put`.
+    """
+    def __init__(self):
+        self.stages = []
+        self.queues = []
+
+    def add_stage(self, name: str, handler, concurrency: int = 1, maxsize: int = QUEUE_SIZE):
+        self.stages.append(Stage(name, handler, concurrency, maxsize))
+        return self
+
+    async def _put(self, index: int, item):
+        queue = self.queues[index]
+        await queue.put(item)
+        metrics.PIPELINE_QUEUE_DEPTH.labels(stage=self.stages[index].name).set(queue.qsize())
+
+    async def put(self, item):
+        await self._put(0, item)
+
+    async def produce_in_thread(self, fn, *args):
+        """
+        Runs fn(emit, *args) in a worker thread, for blocking SDKs. emit(item) feeds the first stage and blocks
+        the thread while that queue is full.
+        """
+        loop = asyncio.get_running_loop()
+        def emit(item):
+            asyncio.run_coroutine_threadsafe(self.put(item), loop).result()
+        await asyncio.to_thread(fn, emit, *args)
+
+    async def _worker(self, index: int):
+        stage = self.stages[index]
+        queue = self.queues[index]
+        depth = metrics.PIPELINE_QUEUE_DEPTH.labels(stage=stage.name)
+        busy = metrics.PIPELINE_BUSY_WORKERS.labels(stage=stage.name)
+        last = index == len(self.stages) - 1
+        while True:
+            item = await queue.get()
+            depth.set(queue.qsize())
+            if item is _DONE:
+                return
+            busy.inc()
+            try:
+                result = await stage.handler(item)
+            except Exception as e:
+                # One bad item shouldn't stall the rest of the stream
+                print(f"Pipeline stage {stage.name} failed on an item: {e}")
+                metrics.PIPELINE_ITEMS.labels(stage=stage.name, result="error").inc()
+                continue
+            finally:
+                busy.dec()
+            if last:
+                metrics.PIPELINE_ITEMS.labels(stage=stage.name, result="done").inc()
+            elif result is None:
+                metrics.PIPELINE_ITEMS.labels(stage=stage.name, result="dropped").inc()
+            else:
+                metrics.PIPELINE_ITEMS.labels(stage=stage.name, result="passed").inc()
+                await self._put(index + 1, result)
+
+    async def _guard(self, producer):
+        try:
+            await producer
+        except Exception as e:
+            # A failing producer ends its own stream; the others and the items already queued carry on
+            print(f"Pipeline producer failed: {e}")
+
+    async def run(self, *producers):
+        """ Runs the producer coroutines to completion, then drains the stages front to back """
+        self.queues = [asyncio.Queue(maxsize=stage.maxsize) for stage in self.stages]
+        workers = [[asyncio.create_task(self._worker(i)) for _ in range(stage.concurrency)]
+                   for i, stage in enumerate(self.stages)]
+        try:
+            await asyncio.gather(*(self._guard(p) for p in producers))
+            for i, stage in enumerate(self.stages):
+                for _ in range(stage.concurrency):
+                    await self.queues[i].put(_DONE)
+                await asyncio.gather(*workers[i])
+        finally:
+            for task in (t for stage_workers in workers for t in stage_workers):
+                task.cancel()
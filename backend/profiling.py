@@ -0,0 +1,209 @@
+# On-demand profiling of worker cycles.
+# An admin arms a profile request through the API; the crawler picks it up at the start of the
+# next cycle (or the next matching restaurant), samples CPU stacks and tracemalloc snapshots
+# for that unit of work only, and stores the results for download.
+# Requests and results live in the shared database, since the API and the crawler run as separate
+# services with separate disks.
+import io
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+from sqlalchemy import update
+
+import models
+from database import SessionLocal
+
+SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+# How often the crawler looks for an armed request; between checks a cycle or restaurant pays nothing
+PROFILE_CHECK_SECONDS = float(os.getenv("PROFILE_CHECK_SECONDS", "10"))
+TOP_ALLOCATORS = 50
+
+VALID_TARGETS = ("cycle", "restaurant")
+
+_last_look = {} # target -> (monotonic time of the last look, the armed request it found or None)
+
+
+def _request_dict(request: models.ProfileRequest) -> dict:
+    return {"id": request.id, "target": request.target, "query": request.query, "requested_at": request.requested_at}
+
+
+def request_profile(target: str, query: str = None) -> dict:
+    """ Arms profiling for the next cycle, or the next restaurant (optionally only one whose query contains `query`) """
+    if target not in VALID_TARGETS:
+        raise ValueError(f"Unknown profile target: {target}")
+    db = SessionLocal()
+    try:
+        # One request at a time, like before: arming again replaces one nobody has claimed yet
+        db.execute(update(models.ProfileRequest).where(models.ProfileRequest.status == "armed").values(status="replaced"))
+        request = models.ProfileRequest(target=target, query=query, status="armed", requested_at=time.time())
+        db.add(request)
+        db.commit()
+        return _request_dict(request)
+    finally:
+        db.close()
+
+
+def pending_request():
+    db = SessionLocal()
+    try:
+        request = db.query(models.ProfileRequest)\
+            .filter(models.ProfileRequest.status == "armed")\
+            .order_by(models.ProfileRequest.id.desc())\
+            .first()
+        return _request_dict(request) if request else None
+    finally:
+        db.close()
+
+
+def _claim(target: str, query: str = None) -> bool:
+    # Throttled: the armed request is looked up at most once per PROFILE_CHECK_SECONDS and matched in memory,
+    # so restaurants that don't match (or cycles with nothing armed) don't touch the database at all
+    now = time.monotonic()
+    checked_at, request = _last_look.get(target, (0.0, None))
+    if now - checked_at >= PROFILE_CHECK_SECONDS:
+        request = pending_request()
+        if request and request["target"] != target:
+            request = None
+        _last_look[target] = (now, request)
+    if not request:
+        return False
+    wanted = request["query"]
+    if wanted and (not query or wanted not in query):
+        return False
+    # Claimed or lost to another crawler, either way it is no longer armed
+    _last_look[target] = (now, None)
+    db = SessionLocal()
+    try:
+        # Only one crawler (or thread) wins the request
+        result = db.execute(
+            update(models.ProfileRequest)
+            .where(models.ProfileRequest.id == request["id"], models.ProfileRequest.status == "armed")
+            .values(status="claimed", holder=f"{os.getpid()}:{threading.get_ident()}", claimed_at=time.time())
+        )
+        db.commit()
+        return result.rowcount == 1
+    finally:
+        db.close()
+
+
+def maybe_profile(target: str, query: str = None):
+    """ Returns a profiling context if an armed request matches, otherwise a no-op context """
+    if _claim(target, query):
+        label = target if not query else f"{target}-{_slug(query)}"
+        return profile_session(label)
+    return nullcontext()
+
+
+def list_profiles() -> list:
+    db = SessionLocal()
+    try:
+        return [name for (name,) in db.query(models.ProfileResult.name).order_by(models.ProfileResult.name.desc())]
+    finally:
+        db.close()
+
+
+def profile_content(name: str):
+    """ The stored text of a profile file, or None """
+    db = SessionLocal()
+    try:
+        row = db.query(models.ProfileResult.content).filter(models.ProfileResult.name == name).first()
+        return row.content if row else None
+    finally:
+        db.close()
+
+
+def _save(files: dict):
+    db = SessionLocal()
+    try:
+        db.add_all(models.ProfileResult(name=name, content=content) for name, content in files.items())
+        db.commit()
+    finally:
+        db.close()
+
+
+def _slug(text: str) -> str:
+    keep = [c if c.isalnum() else "_" for c in text.strip()]
+    return "".join(keep)[:40]
+
+
+class StackSampler(threading.Thread):
+    """
+    Polls the stacks of every thread but its own at a fixed interval and aggregates identical stacks, each prefixed
+    with its thread's name, producing the collapsed format consumed by flamegraph.pl / speedscope. All threads,
+    because a seed's slow parts (social scans, the pipeline's blocking stages) run in executor threads while the
+    cycle thread only awaits them.
+    """
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        own_id = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                parts = []
+                while frame is not None:
+                    code = frame.f_code
+                    parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                parts.append(names.get(thread_id, f"thread-{thread_id}"))
+                self.stacks[";".join(reversed(parts))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+@contextmanager
+def profile_session(label: str):
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    base = f"{stamp}-{label}"
+
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    sampler = StackSampler()
+    sampler.start()
+    started = time.perf_counter()
+    print(f"Profiling started: {label}")
+    try:
+        yield base
+    finally:
+        elapsed = time.perf_counter() - started
+        sampler.stop()
+        after = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if started_tracing:
+            tracemalloc.stop()
+
+        collapsed = io.StringIO()
+        for stack, count in sampler.stacks.most_common():
+            collapsed.write(f"{stack} {count}\n")
+
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        growth = after.filter_traces(filters).compare_to(before.filter_traces(filters), "lineno")
+        alloc = io.StringIO()
+        alloc.write(f"# {label}: {elapsed:.2f}s wall, {sampler.samples} stack samples, "
+                    f"traced current={current / 1024:.1f} KiB peak={peak / 1024:.1f} KiB\n")
+        alloc.write(f"# Top {TOP_ALLOCATORS} allocation sites by growth during the profiled run\n")
+        for stat in growth[:TOP_ALLOCATORS]:
+            alloc.write(f"{stat}\n")
+        try:
+            _save({f"{base}.collapsed": collapsed.getvalue(), f"{base}-alloc.txt": alloc.getvalue()})
+            print(f"Profiling finished: {label} ({elapsed:.2f}s) -> {base}.collapsed, {base}-alloc.txt")
+        except Exception as e:
+            # Losing the profile must not fail the cycle it measured
+            print(f"Could not store profile {base}: {e}")
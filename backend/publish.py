@@ -0,0 +1,87 @@
+# Static leaderboard snapshots, published once per completed cycle.
+# Every view is written as JSON plus a precompressed .json.gz under its own version prefix (stored in a bucket as
+# application/json with Content-Encoding: gzip, so browsers reading the bucket directly inflate it), and
+# latest.json, the only mutable file, is replaced only after the whole version is stored, so readers never see a
+# half-written snapshot. Versioned files never change and can be cached forever; only latest.json needs revalidation.
+# SNAPSHOT_DIR is a storage location (see storage.py): the crawler publishes there and the API serves /snapshots
+# from the same place, so a deploy with a separate crawler needs a bucket both of them can reach.
+import gzip
+import os
+from datetime import datetime, timezone
+
+from sqlalchemy.orm import Session
+
+import models
+import regions
+import serialization
+import storage
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join(os.path.dirname(__file__), "snapshots"))
+SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", "5"))
+LATEST_FILE = "latest.json"
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def snapshot_views(db: Session) -> dict:
+    """ file name -> payload, in the same shapes as the matching API endpoints """
+    region_ids = set(regions.REGIONS.values())
+    region_ids |= {r for (r,) in db.query(models.Restaurant.region).distinct() if r}
+    views = {
+        "national.json": serialization.national_payload(db),
+        "recent.json": serialization.recent_reviews_payload(db),
+    }
+    for region_id in sorted(region_ids):
+        views[f"region-{region_id}.json"] = serialization.regional_top_payload(db, region_id)
+    return views
+
+
+def publish_snapshots(db: Session, cycle_id: int = None, location: str = SNAPSHOT_DIR) -> dict:
+    """ Stores a complete snapshot version and then points latest.json at it. Returns the pointer. """
+    store = storage.open_store(location)
+    version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S") + (f"-c{cycle_id}" if cycle_id else "")
+
+    files = {}
+    for name, payload in snapshot_views(db).items():
+        raw = serialization.dumps(payload)
+        key = f"v/{version}/{name}"
+        store.put(key, raw, content_type="application/json", cache_control=IMMUTABLE)
+        # mtime=0 keeps the archive bytes deterministic for identical payloads
+        store.put(key + ".gz", gzip.compress(raw, compresslevel=9, mtime=0),
+                  content_type="application/json", content_encoding="gzip", cache_control=IMMUTABLE)
+        files[name.rsplit(".", 1)[0]] = key
+
+    pointer = {
+        "version": version,
+        "cycle_id": cycle_id,
+        "published_at": datetime.now(timezone.utc).isoformat(),
+        "files": files,
+    }
+    store.put(LATEST_FILE, serialization.dumps(pointer), content_type="application/json", cache_control="no-cache")
+    prune_versions(location, keep=SNAPSHOT_KEEP)
+    print(f"Published snapshot {version} ({len(files)} views) to {store}")
+    return pointer
+
+
+def prune_versions(location: str = SNAPSHOT_DIR, keep: int = SNAPSHOT_KEEP):
+    """
+    Keeps the newest `keep` versions (names start with their UTC timestamp, so they sort by age); older ones stay
+    around briefly for clients still holding an old pointer. Leftovers of a crash mid-publish age out the same way.
+    """
+    if keep <= 0:
+        return
+    store = storage.open_store(location)
+    by_version = {}
+    for key in store.list("v/"):
+        by_version.setdefault(key.split("/")[1], []).append(key)
+    for version in sorted(by_version)[:-keep]:
+        store.delete(by_version[version])
+
+
+def snapshot_file(path: str):
+    """ Local path of a snapshot file when SNAPSHOT_DIR is a directory on this machine, refusing anything outside it """
+    return storage.open_store(SNAPSHOT_DIR).local_path(path)
+
+
+def snapshot_bytes(path: str):
+    """ A snapshot file's contents from wherever SNAPSHOT_DIR points, or None """
+    return storage.open_store(SNAPSHOT_DIR).get(path)
@@ -1,6 +1,8 @@
 # Comprehensive region mapping for Israel
 # Note: This list maps variations of city names in Hebrew and English to the 5 designated regions
 
+import math
+
 REGIONS = {
     # הצפון (North)
     "חיפה": "north", "haifa": "north",
@@ -80,3 +82,70 @@ def get_region_by_city(city_name: str) -> str:
         
     normalized_city = city_name.strip().lower()
     return REGIONS.get(normalized_city)
+
+# Reference points for coordinate-based region assignment: (lat, lng, region).
+# A place is filed under the region of its nearest anchor, so towns missing from REGIONS
+# (and Jerusalem, which has no region of its own) land in the geographically closest one.
+REGION_ANCHORS = [
+    # North
+    (32.7940, 34.9896, "north"), # Haifa
+    (32.8380, 35.0870, "north"), # Krayot
+    (32.7019, 35.2971, "north"), # Nazareth
+    (32.6070, 35.2890, "north"), # Afula
+    (32.7922, 35.5312, "north"), # Tiberias
+    (32.9646, 35.4960, "north"), # Safed
+    (33.0058, 35.0950, "north"), # Nahariya
+    (32.9196, 35.0821, "north"), # Akko
+    (32.9190, 35.2950, "north"), # Karmiel
+    (33.2073, 35.5695, "north"), # Kiryat Shmona
+    (32.4971, 35.4980, "north"), # Beit She'an
+    (32.6929, 35.0481, "north"), # Daliyat al-Karmel
+    (32.8650, 35.3310, "north"), # Sakhnin
+    (32.5170, 35.1530, "north"), # Umm al-Fahm
+    # Center
+    (32.0853, 34.7818, "center"), # Tel Aviv
+    (32.0684, 34.8248, "center"), # Ramat Gan
+    (32.0167, 34.7795, "center"), # Holon
+    (32.0840, 34.8878, "center"), # Petah Tikva
+    (32.0807, 34.8338, "center"), # Bnei Brak
+    (32.0956, 34.9566, "center"), # Rosh HaAyin
+    # Sharon
+    (32.3215, 34.8532, "sharon"), # Netanya
+    (32.1663, 34.8433, "sharon"), # Herzliya
+    (32.1782, 34.9076, "sharon"), # Kfar Saba
+    (32.1848, 34.8713, "sharon"), # Ra'anana
+    (32.2663, 34.9908, "sharon"), # Tayibe
+    (32.4340, 34.9196, "sharon"), # Hadera
+    (32.2857, 34.9734, "sharon"), # Qalansawe
+    # Shfela
+    (31.9730, 34.7925, "shfela"), # Rishon LeZion
+    (31.8928, 34.8113, "shfela"), # Rehovot
+    (31.9510, 34.8881, "shfela"), # Lod
+    (31.9293, 34.8667, "shfela"), # Ramla
+    (31.8903, 35.0104, "shfela"), # Modi'in
+    (31.7683, 35.2137, "shfela"), # Jerusalem
+    (31.8050, 35.1090, "shfela"), # Abu Ghosh
+    (31.7470, 34.9881, "shfela"), # Beit Shemesh
+    # South
+    (31.8044, 34.6553, "south"), # Ashdod
+    (31.6688, 34.5743, "south"), # Ashkelon
+    (31.2520, 34.7915, "south"), # Be'er Sheva
+    (29.5577, 34.9519, "south"), # Eilat
+    (31.3930, 34.7570, "south"), # Rahat
+    (31.4214, 34.5888, "south"), # Netivot
+    (31.6100, 34.7642, "south"), # Kiryat Gat
+    (31.0700, 35.0330, "south"), # Dimona
+]
+
+def get_region_by_coords(lat: float, lng: float) -> str:
+    """
+    Returns the region of the nearest anchor point.
+    Returns None when coordinates are missing.
+    """
+    if lat is None or lng is None:
+        return None
+
+    # Equirectangular distance is plenty accurate at Israel's scale
+    scale = math.cos(math.radians(lat))
+    nearest = min(REGION_ANCHORS, key=lambda a: (a[0] - lat) ** 2 + ((a[1] - lng) * scale) ** 2)
+    return nearest[2]
@@ -0,0 +1,151 @@
+# Failure isolation for the external sources (Google, Wolt, Apify).
+# A circuit breaker per source stops calling a source that keeps failing and probes it again after a
+# cool-down; transient 429/5xx answers are retried with jittered exponential backoff (honoring Retry-After);
+# and a deadline scoped to the current restaurant caps how long any single call may block.
+import contextvars
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+
+import metrics
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "300"))
+RETRY_ATTEMPTS = int(os.getenv("SOURCE_RETRY_ATTEMPTS", "3"))
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 30.0
+RESTAURANT_DEADLINE_SECONDS = float(os.getenv("RESTAURANT_DEADLINE_SECONDS", "180"))
+# 0 disables the budget; otherwise a cycle stops after this long and the next run resumes from its checkpoint
+CYCLE_BUDGET_SECONDS = float(os.getenv("CYCLE_BUDGET_SECONDS", "10800"))
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+def is_failure_status(status: int) -> bool:
+    """ Answers that count against a source's breaker: it is rate-limiting us (429) or failing (5xx) """
+    return status == 429 or status >= 500
+
+
+class CircuitBreaker:
+    """
+    closed: calls flow, consecutive failures are counted.
+    open: calls are refused until reset_seconds have passed since the circuit opened.
+    half_open: a single probe call is let through; success closes the circuit, failure re-opens it.
+    """
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self._set_state("half_open")
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def is_open(self) -> bool:
+        """ True while calls would be refused, without claiming the half-open probe """
+        with self._lock:
+            return self.state == "open" and time.monotonic() - self.opened_at < self.reset_seconds
+
+    def release(self):
+        """ Hands back a half-open probe that was claimed but never used (e.g. the deadline ran out first) """
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probe_in_flight = False
+            if self.state != "closed":
+                print(f"Circuit {self.name} closed: source recovered.")
+                self._set_state("closed")
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                print(f"Circuit {self.name} opened after {self.failures} failures; skipping it for {self.reset_seconds:.0f}s.")
+                self.opened_at = time.monotonic()
+                self._set_state("open")
+
+    def _set_state(self, state: str):
+        self.state = state
+        metrics.CIRCUIT_OPEN.labels(source=self.name).set(0 if state == "closed" else 1)
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(source: str) -> CircuitBreaker:
+    """ Process-wide breaker per source, shared by every scraper instance and job thread """
+    with _breakers_lock:
+        if source not in _breakers:
+            _breakers[source] = CircuitBreaker(source)
+        return _breakers[source]
+
+
+def retry_after_seconds(value: str):
+    """ Parses a Retry-After header (delta-seconds or an HTTP date) """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, retry_after: float = None) -> float:
+    """ Full-jitter exponential backoff; a server-provided Retry-After wins when it is longer """
+    delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+_deadline = contextvars.ContextVar("source_deadline", default=None)
+
+
+@contextmanager
+def deadline(seconds: float):
+    """ Caps every source call made inside the block to finish within `seconds` from now """
+    expires = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(min(expires, outer) if outer is not None else expires)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def time_left(default: float = None):
+    """ Seconds left before the current deadline (never negative), or `default` outside any deadline """
+    expires = _deadline.get()
+    if expires is None:
+        return default
+    return max(0.0, expires - time.monotonic())
+
+
+def call_timeout(limit: float) -> float:
+    """ A per-call timeout that never outlives the current deadline """
+    left = time_left()
+    return limit if left is None else min(limit, left)
@@ -0,0 +1,92 @@
+# Check of the circuit-breaker accounting in PoliteScraper.get (scrapers/base.py) against canned upstream answers:
+#   python resilience_test.py
+# 1. 429s and 5xx count as failures and open the source's circuit, so a source that keeps rate-limiting us is
+#    skipped instead of being called on every restaurant.
+# 2. Google's HTTP 200 with status OVER_QUERY_LIMIT counts the same.
+# 3. 200s close the circuit again, and other 4xx (our request's fault) leave the count alone.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+
+import resilience
+import scrapers.base
+from scrapers.base import PoliteScraper
+from scrapers.google import GoogleBusinessScraper
+
+# No waiting between attempts or requests; two attempts per get() so thresholds are reached quickly
+resilience.backoff_delay = lambda attempt, retry_after=None: 0.0
+resilience.RETRY_ATTEMPTS = 2
+THRESHOLD = 4
+
+
+class CannedSource:
+    """ Stands in for httpx.get, answering every call with the same response """
+    def __init__(self, status: int, body: dict = None):
+        self.status, self.body, self.calls = status, body, 0
+
+    def __call__(self, url, **kwargs):
+        self.calls += 1
+        return httpx.Response(self.status, json=self.body, request=httpx.Request("GET", url))
+
+
+def scraper_for(source: str, scraper_class=PoliteScraper) -> PoliteScraper:
+    resilience._breakers[source] = resilience.CircuitBreaker(source, failure_threshold=THRESHOLD, reset_seconds=3600)
+    if scraper_class is PoliteScraper:
+        scraper = PoliteScraper("https://example.invalid", delay_seconds=0, source_name=source)
+    else:
+        scraper = scraper_class()
+        scraper.delay_seconds = 0
+    return scraper
+
+
+def opens_on(source: str, status: int, body: dict = None, scraper_class=PoliteScraper) -> list:
+    problems = []
+    scraper = scraper_for(source, scraper_class)
+    scrapers.base.httpx.get = upstream = CannedSource(status, body)
+    for _ in range(THRESHOLD):
+        scraper.get("/x")
+    state = resilience.breaker(source).state
+    if state != "open":
+        problems.append(f"{source}: {status} {body or ''} left the circuit {state} after {upstream.calls} calls")
+    calls = upstream.calls
+    if scraper.get("/x") is not None or upstream.calls != calls:
+        problems.append(f"{source}: an open circuit still called the source")
+    return problems
+
+
+def stays_closed() -> list:
+    problems = []
+    scraper = scraper_for("steady")
+    breaker = resilience.breaker("steady")
+    scrapers.base.httpx.get = CannedSource(503)
+    scraper.get("/x")
+    failures = breaker.failures
+    scrapers.base.httpx.get = CannedSource(404)
+    for _ in range(THRESHOLD * 2):
+        scraper.get("/x")
+    if breaker.state != "closed" or breaker.failures != failures:
+        problems.append(f"404s changed the breaker: {breaker.state}, {breaker.failures} failures (was {failures})")
+    scrapers.base.httpx.get = CannedSource(200, {"ok": True})
+    scraper.get("/x")
+    if breaker.failures != 0:
+        problems.append(f"a 200 left {breaker.failures} failures counted")
+    return problems
+
+
+if __name__ == "__main__":
+    real_get = scrapers.base.httpx.get
+    try:
+        print("Rate-limited and failing sources open the circuit")
+        problems = opens_on("throttled", 429) + opens_on("broken", 503) + opens_on("odd", 501)
+        problems += opens_on("google", 200, {"status": "OVER_QUERY_LIMIT", "results": []}, GoogleBusinessScraper)
+        print("\n".join(f"  FAIL {p}" for p in problems) or "  OK: 429, 5xx and OVER_QUERY_LIMIT count as failures")
+
+        print("Successes and client errors")
+        closed_problems = stays_closed()
+        print("\n".join(f"  FAIL {p}" for p in closed_problems) or "  OK: 200 resets the count, 404 leaves it alone")
+    finally:
+        scrapers.base.httpx.get = real_get
+    raise SystemExit(1 if problems + closed_problems else 0)
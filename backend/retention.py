@@ -0,0 +1,249 @@
+# Review retention tiers.
+# Reviews published in the last RETENTION_HOT_DAYS stay in the live database. Older ones are appended to a
+# compressed JSONL cold archive (one immutable file per sweep batch, partitioned by publication month), folded
+# into per-restaurant/source running totals so scores keep counting them, and then deleted from the live table.
+# A content fingerprint is kept per archived review so the worker never re-ingests one a source serves again.
+# ARCHIVE_DIR is a storage location (see storage.py) that both the crawler, which sweeps, and the API, which
+# queries, can reach; with a separate crawler service that means a bucket. Nothing is deleted until it is set.
+import gzip
+import hashlib
+import io
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import orjson
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+import models
+import serialization
+import storage
+from database import IS_SQLITE, engine
+
+try:
+    import zstandard
+except ImportError: # optional; the archive falls back to gzip
+    zstandard = None
+
+# No default: an unset location would archive to whatever disk the sweeping process happens to have
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "")
+RETENTION_HOT_DAYS = float(os.getenv("RETENTION_HOT_DAYS", "180"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+# SQLite only gives deleted pages back to the filesystem on VACUUM, which rewrites the whole file
+VACUUM_MIN_ROWS = int(os.getenv("RETENTION_VACUUM_MIN_ROWS", "5000"))
+ARCHIVE_QUERY_MAX = 1000
+
+ARCHIVE_FIELDS = ["id", "restaurant_id", "source", "content", "url", "sentiment_score", "weight",
+                  "published_at", "created_at"]
+
+
+def fingerprint(content: str) -> str:
+    return hashlib.sha1((content or "").encode("utf-8")).hexdigest()
+
+
+def is_archived(db: Session, restaurant_id: int, content: str) -> bool:
+    return db.query(models.ArchivedReviewFingerprint)\
+        .filter(models.ArchivedReviewFingerprint.restaurant_id == restaurant_id,
+                models.ArchivedReviewFingerprint.content_hash == fingerprint(content))\
+        .first() is not None
+
+
+def archived_summaries(db: Session, restaurant_id: int) -> list:
+    """
+    One stand-in review per archived (restaurant, source) aggregate, carrying the summed weight and the weighted
+    mean sentiment, so the weighted averages in RankingEngine come out exactly as if the reviews were still here.
+    """
+    aggregates = db.query(models.ReviewAggregate)\
+        .filter(models.ReviewAggregate.restaurant_id == restaurant_id, models.ReviewAggregate.review_count > 0)\
+        .all()
+    return [SimpleNamespace(
+        source=a.source,
+        weight=a.weight_sum,
+        sentiment_score=a.weighted_sentiment_sum / a.weight_sum if a.weight_sum else 0.0,
+        review_count=a.review_count,
+    ) for a in aggregates]
+
+
+def _compress(raw: bytes) -> tuple:
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=10).compress(raw), ".jsonl.zst"
+    return gzip.compress(raw, compresslevel=9), ".jsonl.gz"
+
+
+def _decompress_lines(key: str, data: bytes):
+    if key.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"{key} needs the zstandard package to read")
+        data = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data)).read()
+    else:
+        data = gzip.decompress(data)
+    return data.splitlines()
+
+
+def write_archive_file(store, month: str, name: str, reviews: list) -> str:
+    """ Stores reviews as one compressed JSONL file under reviews/<month>/, durably, before anything is deleted """
+    raw = b"".join(serialization.dumps({field: getattr(r, field) for field in ARCHIVE_FIELDS}) + b"\n" for r in reviews)
+    data, suffix = _compress(raw)
+    key = f"reviews/{month}/{name}{suffix}"
+    store.put(key, data)
+    return key
+
+
+def _fold_into_aggregates(db: Session, reviews: list):
+    groups = defaultdict(list)
+    for r in reviews:
+        groups[(r.restaurant_id, r.source)].append(r)
+    for (restaurant_id, source), group in groups.items():
+        aggregate = db.query(models.ReviewAggregate)\
+            .filter(models.ReviewAggregate.restaurant_id == restaurant_id, models.ReviewAggregate.source == source)\
+            .first()
+        if aggregate is None:
+            aggregate = models.ReviewAggregate(restaurant_id=restaurant_id, source=source,
+                                               review_count=0, weight_sum=0.0, weighted_sentiment_sum=0.0)
+            db.add(aggregate)
+        aggregate.review_count += len(group)
+        for r in group:
+            if r.sentiment_score is None:
+                # Never scored: counted, but kept out of the sentiment average like in the live rescore
+                continue
+            weight = r.weight if r.weight is not None else 1.0
+            aggregate.weight_sum += weight
+            aggregate.weighted_sentiment_sum += (r.sentiment_score or 0.0) * weight
+        dates = [r.published_at for r in group if r.published_at]
+        if dates:
+            aggregate.oldest_published_at = min([aggregate.oldest_published_at or min(dates)] + dates)
+            aggregate.newest_published_at = max([aggregate.newest_published_at or max(dates)] + dates)
+
+
+def _record_fingerprints(db: Session, reviews: list):
+    wanted = {(r.restaurant_id, fingerprint(r.content)) for r in reviews}
+    restaurant_ids = {restaurant_id for restaurant_id, _ in wanted}
+    known = set(db.query(models.ArchivedReviewFingerprint.restaurant_id, models.ArchivedReviewFingerprint.content_hash)
+                .filter(models.ArchivedReviewFingerprint.restaurant_id.in_(restaurant_ids))
+                .filter(models.ArchivedReviewFingerprint.content_hash.in_({h for _, h in wanted})))
+    db.add_all(models.ArchivedReviewFingerprint(restaurant_id=restaurant_id, content_hash=content_hash)
+               for restaurant_id, content_hash in wanted - known)
+
+
+def archive_old_reviews(db: Session, hot_days: float = RETENTION_HOT_DAYS, location: str = ARCHIVE_DIR) -> dict:
+    """
+    Moves reviews published more than hot_days ago to the cold archive, one batch per transaction.
+    The archive file is stored before its batch is deleted; a crash in between only means the batch is archived
+    twice, which query_archive collapses by review id. Without an archive location nothing is moved.
+    """
+    if not location:
+        print("Retention sweep skipped: ARCHIVE_DIR is not set, so old reviews stay in the live database")
+        return {"archived": 0, "files": 0, "skipped": "ARCHIVE_DIR not set"}
+    store = storage.open_store(location)
+    cutoff = datetime.now(timezone.utc) - timedelta(days=hot_days)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    moved, files = 0, []
+    while True:
+        batch = db.query(models.Review)\
+            .filter(models.Review.published_at < cutoff)\
+            .order_by(models.Review.id)\
+            .limit(ARCHIVE_BATCH_SIZE).all()
+        if not batch:
+            break
+        by_month = defaultdict(list)
+        for r in batch:
+            by_month[r.published_at.strftime("%Y-%m")].append(r)
+        for month, reviews in by_month.items():
+            files.append(write_archive_file(store, month, f"{stamp}-{reviews[0].id}", reviews))
+
+        _fold_into_aggregates(db, batch)
+        _record_fingerprints(db, batch)
+        db.query(models.Review)\
+            .filter(models.Review.id.in_([r.id for r in batch]))\
+            .delete(synchronize_session=False)
+        db.commit()
+        db.expire_all()
+        moved += len(batch)
+
+    if IS_SQLITE and moved >= VACUUM_MIN_ROWS:
+        with engine.connect() as conn:
+            conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("VACUUM"))
+    if moved:
+        print(f"Archived {moved} reviews older than {hot_days:g} days into {len(files)} files under {store}")
+    return {"archived": moved, "files": len(files), "cutoff": cutoff.isoformat()}
+
+
+def _month_range(since: datetime, until: datetime, month: str) -> bool:
+    if since and month < since.strftime("%Y-%m"):
+        return False
+    if until and month > until.strftime("%Y-%m"):
+        return False
+    return True
+
+
+def query_archive(restaurant_id: int = None, source: str = None, since: datetime = None, until: datetime = None,
+                  contains: str = None, limit: int = 100, location: str = ARCHIVE_DIR) -> list:
+    """
+    Scans the archive partitions overlapping [since, until], newest month first, and returns up to `limit`
+    matching reviews as dicts (published_at as ISO strings, as written).
+    """
+    if not location:
+        return []
+    store = storage.open_store(location)
+    by_month = defaultdict(list)
+    for key in store.list("reviews/"):
+        parts = key.split("/")
+        if len(parts) == 3:
+            by_month[parts[1]].append(key)
+    limit = max(0, min(limit, ARCHIVE_QUERY_MAX))
+    since_iso = since.isoformat() if since else None
+    until_iso = until.isoformat() if until else None
+    results, seen_ids = [], set()
+    for month in sorted(by_month, reverse=True):
+        if not _month_range(since, until, month):
+            continue
+        for key in sorted(by_month[month], reverse=True):
+            data = store.get(key)
+            if data is None:
+                continue
+            for line in _decompress_lines(key, data):
+                row = orjson.loads(line)
+                if row["id"] in seen_ids:
+                    continue
+                if restaurant_id is not None and row["restaurant_id"] != restaurant_id:
+                    continue
+                if source and row["source"] != source:
+                    continue
+                published = row.get("published_at") or ""
+                if (since_iso and published < since_iso) or (until_iso and published > until_iso):
+                    continue
+                if contains and contains not in (row.get("content") or ""):
+                    continue
+                seen_ids.add(row["id"])
+                results.append(row)
+                if len(results) >= limit:
+                    return results
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    from database import SessionLocal, ensure_schema
+
+    parser = argparse.ArgumentParser(description="Archive old reviews or query the cold archive")
+    parser.add_argument("--archive", action="store_true", help="move reviews older than --hot-days to the archive")
+    parser.add_argument("--hot-days", type=float, default=RETENTION_HOT_DAYS)
+    parser.add_argument("--restaurant-id", type=int)
+    parser.add_argument("--source")
+    parser.add_argument("--contains")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.archive:
+        ensure_schema()
+        session = SessionLocal()
+        try:
+            print(archive_old_reviews(session, args.hot_days))
+        finally:
+            session.close()
+    else:
+        for row in query_archive(args.restaurant_id, args.source, contains=args.contains, limit=args.limit):
+            print(json.dumps(row, ensure_ascii=False))
@@ -6,7 +6,7 @@ class ReviewBase(BaseModel):
     source: str
     content: str
     url: Optional[str] = None
-    sentiment_score: float
+    sentiment_score: Optional[float] = None # None until the sentiment API has scored it
     weight: float = 1.0
     published_at: datetime
 
@@ -42,3 +42,30 @@ class RestaurantSchema(RestaurantBase):
 
     class Config:
         from_attributes = True
+
+class ProfileRequest(BaseModel):
+    target: str = "cycle" # cycle | restaurant
+    query: Optional[str] = None
+
+class ScrapeRequest(BaseModel):
+    query: str
+    city: str = "ישראל"
+
+class ScrapeJobSchema(BaseModel):
+    id: int
+    query: str
+    city: str
+    status: str
+    attempts: int
+    outcome: Optional[str] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class ScrapeJobAccepted(BaseModel):
+    job: ScrapeJobSchema
+    coalesced: bool
@@ -0,0 +1,85 @@
+# Check of the /api/scrape per-client limit (jobs.check_limits via main.client_address) against a throwaway
+# SQLite database:
+#   python scrape_limit_test.py
+# 1. Callers that can't be identified (no X-Forwarded-For, no peer address) get no client key, so they don't
+#    share one bucket that a single anonymous caller could use up.
+# 2. Identified callers are still cut off after JOB_CLIENT_LIMIT new jobs per window.
+import os
+import sys
+import tempfile
+
+if __name__ == "__main__":
+    db_dir = tempfile.mkdtemp(prefix="scrape_limit_test_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(db_dir, 'scrape.db')}"
+    os.environ["EMBEDDED_WORKER"] = "0"
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from starlette.requests import Request
+
+import jobs
+from database import SessionLocal, ensure_schema
+from main import client_address
+
+
+def make_request(headers: dict = None, client: tuple = None) -> Request:
+    scope = {"type": "http", "method": "POST", "path": "/api/scrape",
+             "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]}
+    if client:
+        scope["client"] = client
+    return Request(scope)
+
+
+def addresses() -> list:
+    problems = []
+    cases = [
+        ({}, None, None),
+        ({}, ("10.0.0.7", 5000), "10.0.0.7"),
+        ({"X-Forwarded-For": "1.1.1.1, 203.0.113.9"}, ("10.0.0.1", 5000), "203.0.113.9"),
+        ({"X-Forwarded-For": ""}, None, None),
+    ]
+    for headers, client, expected in cases:
+        got = client_address(make_request(headers, client))
+        if got != expected:
+            problems.append(f"headers={headers} client={client}: {got!r}, expected {expected!r}")
+    return problems
+
+
+def enqueue_many(client, count: int, prefix: str) -> int:
+    """ New jobs accepted out of `count` distinct requests from `client` """
+    db = SessionLocal()
+    accepted = 0
+    try:
+        for i in range(count):
+            try:
+                jobs.enqueue(db, f"{prefix} {i}", "תל אביב", client=client)
+                accepted += 1
+            except jobs.JobRejected:
+                pass
+    finally:
+        db.close()
+    return accepted
+
+
+def limits() -> list:
+    problems = []
+    count = jobs.JOB_CLIENT_LIMIT + 2
+    anonymous = enqueue_many(client_address(make_request()), count, "שווארמה אנונימית")
+    if anonymous != count:
+        problems.append(f"unidentified callers: {anonymous} of {count} accepted, expected all")
+    identified = enqueue_many("203.0.113.9", count, "שווארמה מזוהה")
+    if identified != jobs.JOB_CLIENT_LIMIT:
+        problems.append(f"identified caller: {identified} of {count} accepted, expected {jobs.JOB_CLIENT_LIMIT}")
+    return problems
+
+
+if __name__ == "__main__":
+    ensure_schema()
+
+    print("Client addresses: forwarded, peer, and neither")
+    address_problems = addresses()
+    print("\n".join(f"  FAIL {p}" for p in address_problems) or "  OK: None when the caller can't be identified")
+
+    print(f"Per-client limit of {jobs.JOB_CLIENT_LIMIT} new jobs per window")
+    limit_problems = limits()
+    print("\n".join(f"  FAIL {p}" for p in limit_problems) or "  OK: no shared bucket for unidentified callers")
+    raise SystemExit(1 if address_problems + limit_problems else 0)
@@ -2,10 +2,14 @@ import time
 import httpx
 from typing import Optional, Dict
 
+import metrics
+import resilience
+
 class PoliteScraper:
-    def __init__(self, base_url: str, delay_seconds: float = 2.0):
+    def __init__(self, base_url: str, delay_seconds: float = 2.0, source_name: str = "http"):
         self.base_url = base_url
         self.delay_seconds = delay_seconds
+        self.source_name = source_name
         self.last_request_time = 0.0
         
         # Setup headers to look like a normal user agent
@@ -21,17 +25,64 @@ class PoliteScraper:
         if elapsed < self.delay_seconds:
             time.sleep(self.delay_seconds - elapsed)
             
+    def is_source_failure(self, response) -> bool:
+        """ Whether an answer means the source is failing or throttling us; overridden by sources that say so in a 200 """
+        return resilience.is_failure_status(response.status_code)
+
     def get(self, endpoint: str, params: Optional[Dict] = None):
-        self._wait_for_rate_limit()
+        """
+        Returns the response (possibly a non-200 one after retries ran out), or None when the request
+        failed outright, the source's circuit is open or the current deadline left no time for it.
+        """
+        breaker = resilience.breaker(self.source_name)
+        if not breaker.allow():
+            metrics.SOURCE_CALLS.labels(source=self.source_name, outcome="circuit_open").inc()
+            return None
         
         url = f"{self.base_url}{endpoint}"
         
         # In the future: Add proxy rotation logic here (e.g. Apify or proxy pools) #
         
-        try:
-            response = httpx.get(url, headers=self.headers, params=params, timeout=10.0)
-            self.last_request_time = time.time()
-            return response
-        except httpx.RequestError as exc:
-            print(f"An error occurred while requesting {exc.request.url!r}.")
-            return None
+        response = None
+        for attempt in range(resilience.RETRY_ATTEMPTS):
+            self._wait_for_rate_limit()
+            timeout = resilience.call_timeout(10.0)
+            if timeout < 1.0:
+                # Out of time for this restaurant; not the source's fault, so the breaker isn't told
+                metrics.SOURCE_CALLS.labels(source=self.source_name, outcome="deadline").inc()
+                breaker.release()
+                return response
+            
+            retry_after = None
+            try:
+                with metrics.source(self.source_name):
+                    response = httpx.get(url, headers=self.headers, params=params, timeout=timeout)
+                self.last_request_time = time.time()
+                failed = self.is_source_failure(response)
+                metrics.record_source_call(self.source_name, not failed and response.status_code < 400)
+                if not failed:
+                    if response.status_code < 400:
+                        breaker.record_success()
+                    else:
+                        # Other 4xx are about our request; they neither prove the source healthy nor count against it
+                        breaker.release()
+                    return response
+                retry_after = resilience.retry_after_seconds(response.headers.get("Retry-After"))
+                print(f"{self.source_name} answered {response.status_code} for {endpoint} (attempt {attempt + 1})")
+            except httpx.RequestError as exc:
+                self.last_request_time = time.time()
+                metrics.record_source_call(self.source_name, False)
+                print(f"An error occurred while requesting {exc.request.url!r}: {exc!r}")
+                if isinstance(exc, httpx.TimeoutException) and timeout < 10.0:
+                    # Cut short by our own deadline rather than a slow source; don't count it against the breaker
+                    breaker.release()
+                    return None
+            
+            breaker.record_failure()
+            delay = resilience.backoff_delay(attempt, retry_after)
+            left = resilience.time_left()
+            if attempt == resilience.RETRY_ATTEMPTS - 1 or breaker.is_open() or (left is not None and delay >= left):
+                break
+            metrics.SOURCE_CALLS.labels(source=self.source_name, outcome="retry").inc()
+            time.sleep(delay)
+        return response
@@ -1,4 +1,5 @@
 from .base import PoliteScraper
+from matching import best_match
 from dotenv import load_dotenv
 import os
 import json
@@ -7,12 +8,24 @@ load_dotenv()
 
 class GoogleBusinessScraper(PoliteScraper):
     def __init__(self):
-        super().__init__(base_url="https://maps.googleapis.com/maps/api/place", delay_seconds=1.5)
+        super().__init__(base_url="https://maps.googleapis.com/maps/api/place", delay_seconds=1.5, source_name="google")
         self.api_key = os.getenv("GOOGLE_PLACES_API_KEY")
         
-    def search_place(self, query: str):
+    def is_source_failure(self, response) -> bool:
+        # Places reports quota exhaustion and its own errors with HTTP 200 and a status in the body
+        if super().is_source_failure(response):
+            return True
+        try:
+            return response.json().get("status") in ("OVER_QUERY_LIMIT", "UNKNOWN_ERROR")
+        except (ValueError, AttributeError):
+            return False
+
+    def resolve_place(self, query: str, city: str = None):
         """
         Uses Text Search API to find a fresh Place ID for a given restaurant name.
+        Every returned result is scored against the query and the best one above the match threshold wins,
+        so Google's fuzzy fallback ("Shawarma Shabi" when looking for "Shawarma Omri") is rejected.
+        Returns {"place_id", "name", "address", "location", "score"} or None.
         """
         if not self.api_key:
             return None
@@ -25,49 +38,48 @@ class GoogleBusinessScraper(PoliteScraper):
         
         response = self.get("/textsearch/json", params=params)
         if response and response.status_code == 200:
-            data = response.json()
-            results = data.get("results", [])
+            results = response.json().get("results", [])
             if results:
-                place = results[0]
-                result_name = place.get("name", "")
-                
-                # Safety Check: Does the returned name match our query in any meaningful way?
-                # This prevents Google's fuzzy fallback from returning "Shawarma Shabi" when looking for "Shawarma Omri"
-                generic_words = {"שווארמה", "shawarma", "israel", "ישראל", "-", "מסעדה", "ב", "של"}
-                query_words = set(query.split())
-                meaningful_query_words = {w for w in query_words if w.lower() not in generic_words}
-                
-                match_found = False
-                result_name_lower = result_name.lower()
-                for w in meaningful_query_words:
-                    if w in result_name_lower:
-                        match_found = True
-                        break
-                        
-                if not match_found and meaningful_query_words:
-                    print(f"Safety Trigger: Rejecting '{result_name}' as it doesn't contain core keywords from '{query}'")
-                    return None, None
+                place, score = best_match(query, results, lambda p: p.get("name"), city)
+                if not place:
+                    print(f"Safety Trigger: No result for '{query}' is similar enough (best {score:.2f}, top was '{results[0].get('name', '')}')")
+                    return None
                     
-                place_id = place["place_id"]
-                address = place.get("formatted_address", "")
-                print(f"Found lively Place ID for {query}: {place_id} ({result_name}) at {address}")
-                return place_id, address
-        return None, None
+                candidate = {
+                    "place_id": place["place_id"],
+                    "name": place.get("name", ""),
+                    "address": place.get("formatted_address", ""),
+                    "location": place.get("geometry", {}).get("location"),
+                    "score": score
+                }
+                print(f"Found lively Place ID for {query}: {candidate['place_id']} ({candidate['name']}, match {score:.2f}) at {candidate['address']}")
+                return candidate
+        return None
         
-    def fetch_recent_reviews(self, place_id: str):
+    def search_place(self, query: str, city: str = None):
         """
-        Fetches the most recent reviews and the overall rating for a given Google Place ID 
-        using the real Google Places API.
+        Returns (place_id, address, location) for the best matching place, location being {"lat", "lng"} or None.
+        """
+        candidate = self.resolve_place(query, city)
+        if not candidate:
+            return None, None, None
+        return candidate["place_id"], candidate["address"], candidate["location"]
+        
+    def _details(self, place_id: str, fields: str, **extra):
+        """
+        Place Details restricted to `fields`, with `extra` as further query parameters.
+        Returns the result dict, or None on failure.
         """
         if not self.api_key:
             print("Error: GOOGLE_PLACES_API_KEY is not set.")
-            return {"reviews": [], "rating": None, "user_ratings_total": 0}
+            return None
             
         params = {
             "place_id": place_id,
             "key": self.api_key,
-            "fields": "reviews,user_ratings_total,rating,name",
-            "language": "iw" # Hebrew
+            "fields": fields,
+            "language": "iw", # Hebrew
+            **extra
         }
         
         response = self.get("/details/json", params=params)
@@ -75,15 +87,34 @@ class GoogleBusinessScraper(PoliteScraper):
         if response and response.status_code == 200:
             data = response.json()
             if data.get("status") == "OK":
-                result = data.get("result", {})
-                reviews = result.get("reviews", [])
-                rating = result.get("rating")
-                user_ratings_total = result.get("user_ratings_total", 0)
-                print(f"Successfully fetched {len(reviews)} reviews for Place ID {place_id}. Rating: {rating} ({user_ratings_total})")
-                return {"reviews": reviews, "rating": rating, "user_ratings_total": user_ratings_total}
-            else:
-                print(f"Google API Error: {data.get('status')} - {data.get('error_message', 'Unknown Error')}")
+                return data.get("result", {})
+            print(f"Google API Error: {data.get('status')} - {data.get('error_message', 'Unknown Error')}")
         else:
-            print(f"Failed to fetch Google Reviews. Status Code: {response.status_code if response else 'No Response'}")
-            
-        return {"reviews": [], "rating": None, "user_ratings_total": 0}
+            print(f"Failed to fetch Google Place Details. Status Code: {response.status_code if response else 'No Response'}")
+        return None
+
+    def fetch_rating_summary(self, place_id: str):
+        """
+        Cheap change check: rating, user_ratings_total and name only, without the review payload.
+        """
+        result = self._details(place_id, "user_ratings_total,rating,name")
+        if result is None:
+            return {"rating": None, "user_ratings_total": 0, "failed": True}
+        return {"rating": result.get("rating"), "user_ratings_total": result.get("user_ratings_total", 0), "name": result.get("name")}
+        
+    def fetch_recent_reviews(self, place_id: str):
+        """
+        Fetches the most recent reviews and the overall rating for a given Google Place ID 
+        using the real Google Places API.
+        """
+        # Newest first: Google's default "most relevant" order can leave a newer review out of the five it returns
+        # while an older one advances the watermark past it
+        result = self._details(place_id, "reviews,user_ratings_total,rating,name", reviews_sort="newest")
+        if result is None:
+            # "failed" tells the worker to keep the last known rating instead of overwriting it with nothing
+            return {"reviews": [], "rating": None, "user_ratings_total": 0, "failed": True}
+        reviews = result.get("reviews", [])
+        rating = result.get("rating")
+        user_ratings_total = result.get("user_ratings_total", 0)
+        print(f"Successfully fetched {len(reviews)} reviews for Place ID {place_id}. Rating: {rating} ({user_ratings_total})")
+        return {"reviews": reviews, "rating": rating, "user_ratings_total": user_ratings_total, "name": result.get("name")}
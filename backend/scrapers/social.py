@@ -1,20 +1,76 @@
 import os
-from apify_client import ApifyClient
+from datetime import timedelta
 from dotenv import load_dotenv
 
+import metrics
+import resilience
+
 load_dotenv()
 
+# An actor run is stopped (and treated as a failure) after this long, or sooner if the restaurant's deadline is closer
+APIFY_RUN_TIMEOUT_SECONDS = float(os.getenv("APIFY_RUN_TIMEOUT_SECONDS", "120"))
+# Not worth starting a run with less time than this left
+APIFY_MIN_RUN_SECONDS = 15.0
+
 class SocialMediaScanner:
     def __init__(self):
         # We use Apify Client instead of our PoliteScraper here
         # since Apify handles proxies and headless browser execution
         token = os.getenv("APIFY_API_TOKEN")
         if token:
+            # Imported here so modules that only reference the scanner don't load the Apify SDK
+            from apify_client import ApifyClient
             self.client = ApifyClient(token)
         else:
             self.client = None
             print("Warning: APIFY_API_TOKEN not found.")
         
+    def _run_actor(self, source: str, actor_id: str, run_input: dict, to_result):
+        """
+        Runs one Apify actor and returns an iterator mapping each dataset item through `to_result`; items are
+        paged in from the dataset as the caller consumes them, and a paging error is raised from the iterator.
+        Returns None (not an empty iterator) when the run was skipped or failed, so callers can tell
+        "nothing found" apart from "source unavailable" and fall back to the last known values.
+        """
+        breaker = resilience.breaker(source)
+        if not breaker.allow():
+            metrics.SOURCE_CALLS.labels(source=source, outcome="circuit_open").inc()
+            return None
+        budget = resilience.call_timeout(APIFY_RUN_TIMEOUT_SECONDS)
+        if budget < APIFY_MIN_RUN_SECONDS:
+            metrics.SOURCE_CALLS.labels(source=source, outcome="deadline").inc()
+            breaker.release()
+            return None
+
+        try:
+            with metrics.source(source):
+                run = self.client.actor(actor_id).call(
+                    run_input=run_input,
+                    run_timeout=timedelta(seconds=budget),
+                    wait_duration=timedelta(seconds=budget)
+                )
+            if not run:
+                raise TimeoutError(f"actor run did not finish within {budget:.0f}s")
+            dataset_id = run["defaultDatasetId"] if isinstance(run, dict) else run.default_dataset_id
+        except Exception as e:
+            breaker.record_failure()
+            metrics.record_source_call(source, False)
+            print(f"Apify {source} Error: {e}")
+            return None
+        breaker.record_success()
+        metrics.record_source_call(source, True)
+        return self._iterate_dataset(source, dataset_id, to_result)
+
+    def _iterate_dataset(self, source: str, dataset_id: str, to_result):
+        try:
+            for item in self.client.dataset(dataset_id).iterate_items():
+                yield to_result(item)
+        except Exception as e:
+            resilience.breaker(source).record_failure()
+            metrics.record_source_call(source, False)
+            print(f"Apify {source} dataset Error: {e}")
+            raise
+
     def scan_tiktok_hashtags(self, hashtags: list):
         """
         Scans TikTok for viral videos containing specific hashtags
@@ -25,30 +81,20 @@ class SocialMediaScanner:
             
         print(f"Starting Apify TikTok scrape for: {hashtags}")
         
-        # We start the actor and wait for it to finish.
-        # This can be time consuming, so in production this should be a background Celery/RQ job.
+        # We start the actor and wait for it to finish (bounded by the run timeout and the current deadline).
         run_input = {
             "hashtags": hashtags,
             "resultsPerPage": 10,
             "shouldDownloadVideos": False
         }
         
-        try:
-            # Note: The exact actor ID depends on user's Apify setup.
-            # Fixed: exact actor ID from user's Apify store screenshot
-            run = self.client.actor("clockworks/tiktok-scraper").call(run_input=run_input)
-            
-            results = []
-            for item in self.client.dataset(run["defaultDatasetId"]).iterate_items():
-                results.append({
-                    "text": item.get("text"),
-                    "views": item.get("playCount"),
-                    "url": item.get("webVideoUrl")
-                })
-            return results
-        except Exception as e:
-            print(f"Apify TikTok Error: {e}")
-            return []
+        # Note: The exact actor ID depends on user's Apify setup.
+        # Fixed: exact actor ID from user's Apify store screenshot
+        return self._run_actor("apify_tiktok", "clockworks/tiktok-scraper", run_input, lambda item: {
+            "text": item.get("text"),
+            "views": item.get("playCount"),
+            "url": item.get("webVideoUrl")
+        })
 
     def scan_instagram_tags(self, tags: list):
         """
@@ -64,21 +110,12 @@ class SocialMediaScanner:
             "resultsLimit": 10
         }
         
-        try:
-            # Using standard apify/instagram-scraper
-            run = self.client.actor("apify/instagram-hashtag-scraper").call(run_input=run_input)
-            
-            results = []
-            for item in self.client.dataset(run["defaultDatasetId"]).iterate_items():
-                results.append({
-                    "text": item.get("caption"),
-                    "likes": item.get("likesCount"),
-                    "url": item.get("url")
-                })
-            return results
-        except Exception as e:
-            print(f"Apify Instagram Error: {e}")
-            return []
+        # Using standard apify/instagram-scraper
+        return self._run_actor("apify_instagram", "apify/instagram-hashtag-scraper", run_input, lambda item: {
+            "text": item.get("caption"),
+            "likes": item.get("likesCount"),
+            "url": item.get("url")
+        })
 
     def scan_facebook_posts(self, query: str):
         """
@@ -94,17 +131,8 @@ class SocialMediaScanner:
             "resultsLimit": 5
         }
         
-        try:
-            run = self.client.actor("apify/facebook-posts-scraper").call(run_input=run_input)
-            
-            results = []
-            for item in self.client.dataset(run["defaultDatasetId"]).iterate_items():
-                results.append({
-                    "text": item.get("text", ""),
-                    "likes": item.get("likes", 0),
-                    "url": item.get("url")
-                })
-            return results
-        except Exception as e:
-            print(f"Apify Facebook Error: {e}")
-            return []
+        return self._run_actor("apify_facebook", "apify/facebook-posts-scraper", run_input, lambda item: {
+            "text": item.get("text", ""),
+            "likes": item.get("likes", 0),
+            "url": item.get("url")
+        })
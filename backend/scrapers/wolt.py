@@ -1,14 +1,22 @@
 from .base import PoliteScraper
+from matching import best_match
 import urllib.parse
 
+def venue_name(item: dict) -> str:
+    """ Wolt names are either plain strings or a list of per-language translations """
+    name = item.get("title") or item.get("name") or item.get("venue", {}).get("name")
+    if isinstance(name, list):
+        return " ".join(n.get("value", "") for n in name if isinstance(n, dict))
+    return name or ""
+
 class WoltTracker(PoliteScraper):
     def __init__(self):
-        super().__init__(base_url="https://restaurant-api.wolt.com", delay_seconds=3.0)
+        super().__init__(base_url="https://restaurant-api.wolt.com", delay_seconds=3.0, source_name="wolt")
         
-    def search_venue(self, query: str, lat: float = 32.0853, lon: float = 34.7818):
+    def resolve_venue(self, query: str, city: str = None, lat: float = 32.0853, lon: float = 34.7818):
         """
-        Searches for a venue on Wolt (by default around Tel Aviv coordinates).
-        Returns the venue slug if found.
+        Searches for a venue on Wolt (by default around Tel Aviv coordinates) and scores every result
+        against the query. Returns {"slug", "name", "score"} for the best match, or None.
         """
         encoded_query = urllib.parse.quote(query)
         params = {
@@ -21,11 +29,25 @@ class WoltTracker(PoliteScraper):
         response = self.get("/v3/venues/search", params=params)
         if response and response.status_code == 200:
             data = response.json()
-            results = data.get('results', [])
+            results = [r for r in data.get('results', []) if self._slug(r)]
             if results:
-                return results[0].get('slug')
+                venue, score = best_match(query, results, venue_name, city)
+                if venue:
+                    return {"slug": self._slug(venue), "name": venue_name(venue), "score": score}
+                print(f"Wolt: no venue similar enough to '{query}' (best {score:.2f})")
         return None
 
+    def search_venue(self, query: str, lat: float = 32.0853, lon: float = 34.7818, city: str = None):
+        """
+        Returns the slug of the best matching venue, or None.
+        """
+        venue = self.resolve_venue(query, city, lat, lon)
+        return venue["slug"] if venue else None
+
+    @staticmethod
+    def _slug(item: dict):
+        return item.get("slug") or item.get("venue", {}).get("slug")
+
     def check_delivery_load(self, venue_slug: str):
         """
         Checks real-time delivery estimates and availability 
@@ -42,7 +64,7 @@ class WoltTracker(PoliteScraper):
                 rating = venue.get('rating', {}).get('score')
                 
                 print(f"Wolt Load for {venue_slug}: Estimate {estimate} mins, Rating: {rating}")
-                return {"estimate_mins": estimate, "rating": rating}
+                return {"estimate_mins": estimate, "rating": rating, "name": venue_name(venue)}
                 
         print(f"Failed to fetch Wolt delivery load for venue: {venue_slug}")
         return None
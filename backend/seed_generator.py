@@ -1,93 +1,246 @@
 import os
 import requests
 import json
+import math
 import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 load_dotenv()
 API_KEY = os.getenv('GOOGLE_PLACES_API_KEY')
 
+PLACES_URL = "https://maps.googleapis.com/maps/api/place/textsearch/json"
+GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+SEEDS_PATH = os.path.join(os.path.dirname(__file__), "auto_seeds.json")
+
+# Cities are independent, so they are searched in parallel; each city still paginates sequentially
+SEED_CONCURRENCY = int(os.getenv("SEED_CONCURRENCY", "6"))
+
 CITIES = [
     # Major Cities
-    "תל אביב", "חיפה", "ירושלים", "באר שבע", "ראשון לציון", "פתח תקווה", 
-    "אשדוד", "נתניה", "חולון", "בני ברק", "רמת גן", "בת ים", "אשקלון", 
+    "תל אביב", "חיפה", "ירושלים", "באר שבע", "ראשון לציון", "פתח תקווה",
+    "אשדוד", "נתניה", "חולון", "בני ברק", "רמת גן", "בת ים", "אשקלון",
     "הרצליה", "כפר סבא", "חדרה",
     # Arab Towns and Villages
-    "נצרת", "דאלית אל-כרמל", "כפר קאסם", "אום אל-פחם", "רהט", "טייבה", 
+    "נצרת", "דאלית אל-כרמל", "כפר קאסם", "אום אל-פחם", "רהט", "טייבה",
     "טירה", "סח'נין", "שפרעם", "עוספיא", "טמרה", "קלנסווה", "כפר כנא",
     "יפיע", "מע'אר", "עראבה", "כפר מנדא", "מג'ד אל-כרום", "אבו גוש"
 ]
 
-def generate_seeds():
+# Negative Title Filter to catch false-positives (Burgers, Sushi, etc)
+NEGATIVE_WORDS = ["בורגר", "burger", "פיצה", "pizza", "סושי", "sushi", "סטיישן", "station", "קפה", "cafe", "גלידה"]
+CLOSED_STATUSES = ("CLOSED_TEMPORARILY", "CLOSED_PERMANENTLY")
+
+
+def is_quality_place(place: dict) -> bool:
+    # Basic quality filtering
+    rating = place.get("rating", 0.0)
+    reviews = place.get("user_ratings_total", 0)
+    if rating < 3.5 or reviews < 50:
+        return False
+
+    name = place.get("name", "")
+    if any(nw in name.lower() for nw in NEGATIVE_WORDS):
+        # Make sure it's not a legitimate mixed place, but usually "Burger" means it's a burger joint.
+        if "שווארמה" not in name and "שוארמה" not in name:
+            return False
+    return True
+
+
+def wait_for_page(next_page_token: str):
+    """ Google issues next_page_token before it is usable; poll this token instead of sleeping globally """
+    params = {"pagetoken": next_page_token, "key": API_KEY}
+    for attempt in range(5):
+        time.sleep(1.0 + attempt)
+        data = requests.get(PLACES_URL, params=params, timeout=15).json()
+        if data.get("status") != "INVALID_REQUEST":
+            return data
+    print("Page token never became valid, stopping pagination.")
+    return None
+
+
+def fetch_text_search(params: dict) -> list:
+    """ Runs one Text Search query through all of its result pages (max 60 results) """
+    data = requests.get(PLACES_URL, params=dict(params, key=API_KEY), timeout=15).json()
+    results = data.get("results", [])
+    next_page_token = data.get("next_page_token")
+    while next_page_token:
+        data = wait_for_page(next_page_token)
+        if not data:
+            break
+        results.extend(data.get("results", []))
+        next_page_token = data.get("next_page_token")
+    return results
+
+
+def city_tiles(city: str, tiles: int) -> list:
+    """
+    Splits a city's geocoded viewport into tiles x tiles cells and returns (lat, lng, radius_m) per cell.
+    Biasing each search to a cell gets past Text Search's 60-results-per-query cap in dense cities.
+    """
+    data = requests.get(GEOCODE_URL, params={"address": f"{city}, ישראל", "language": "iw", "key": API_KEY}, timeout=15).json()
+    results = data.get("results", [])
+    if not results:
+        return []
+    viewport = results[0]["geometry"]["viewport"]
+    south, west = viewport["southwest"]["lat"], viewport["southwest"]["lng"]
+    north, east = viewport["northeast"]["lat"], viewport["northeast"]["lng"]
+    lat_step = (north - south) / tiles
+    lng_step = (east - west) / tiles
+
+    cells = []
+    for i in range(tiles):
+        for j in range(tiles):
+            lat = south + lat_step * (i + 0.5)
+            lng = west + lng_step * (j + 0.5)
+            # Half the cell diagonal, in meters, so neighbouring circles overlap slightly
+            dy = lat_step * 111_320
+            dx = lng_step * 111_320 * math.cos(math.radians(lat))
+            cells.append((lat, lng, int(math.hypot(dx, dy) / 2) + 1))
+    return cells
+
+
+def search_city(city: str, tiles: int = 1) -> dict:
+    """ Returns {"city", "places": {place_id: place}, "ok"} for one city """
+    print(f"Searching for shawarma in {city}...")
+    query = {"query": f"שווארמה ב{city}", "language": "iw"}
+    places = {}
+    try:
+        if tiles > 1:
+            cells = city_tiles(city, tiles)
+            if not cells:
+                print(f"Could not geocode {city}, falling back to a single search")
+            searches = [dict(query, location=f"{lat},{lng}", radius=radius) for lat, lng, radius in cells] or [query]
+        else:
+            searches = [query]
+
+        for params in searches:
+            for place in fetch_text_search(params):
+                if place.get("place_id"):
+                    places[place["place_id"]] = place
+    except Exception as e:
+        print(f"Error fetching for {city}: {e}")
+        return {"city": city, "places": places, "ok": False}
+
+    print(f"{city}: {len(places)} candidate places")
+    return {"city": city, "places": places, "ok": True}
+
+
+def load_existing_seeds(path: str = SEEDS_PATH) -> list:
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def merge_seeds(existing: list, city_results: list) -> tuple:
+    """
+    Merges a fresh scan into the current seed list without rewriting untouched entries.
+    Returns (merged_seeds, diff) where diff lists the added, removed and closed seeds.
+    Seeds of cities that were not scanned (or whose scan failed) are kept as they are.
+    """
+    scanned_cities = {r["city"] for r in city_results if r["ok"]}
+
+    qualifying = {}
+    closed_ids = set()
+    for result in city_results:
+        city = result["city"]
+        for place_id, place in result["places"].items():
+            if place.get("business_status") in CLOSED_STATUSES:
+                closed_ids.add(place_id)
+                continue
+            if place.get("business_status") != "OPERATIONAL" or not is_quality_place(place):
+                continue
+            # First city to report a place keeps it
+            location = place.get("geometry", {}).get("location", {})
+            qualifying.setdefault(place_id, {
+                "query": f"{place.get('name', '')} {city}",
+                "city": city,
+                "place_id": place_id,
+                "lat": location.get("lat"),
+                "lng": location.get("lng")
+            })
+
+    diff = {"added": [], "removed": [], "closed": []}
+    merged = []
+    seen_ids = set()
+    for seed in existing:
+        place_id = seed.get("place_id")
+        if not place_id:
+            # Legacy seed without an id: adopt the id of a fresh result with the same query
+            match = next((s for s in qualifying.values() if s["query"] == seed["query"]), None)
+            if match:
+                seed = dict(seed, place_id=match["place_id"])
+                place_id = match["place_id"]
+            elif seed["city"] in scanned_cities:
+                diff["removed"].append(seed)
+                continue
+        if place_id in closed_ids:
+            diff["closed"].append(seed)
+            continue
+        if place_id and seed["city"] in scanned_cities and place_id not in qualifying:
+            diff["removed"].append(seed)
+            continue
+        if place_id:
+            if place_id in seen_ids:
+                continue
+            seen_ids.add(place_id)
+        merged.append(seed)
+
+    for place_id, seed in qualifying.items():
+        if place_id not in seen_ids:
+            merged.append(seed)
+            seen_ids.add(place_id)
+            diff["added"].append(seed)
+
+    return merged, diff
+
+
+def write_seeds(seeds: list, path: str = SEEDS_PATH):
+    # Write to a temp file first so a crash never leaves the worker a half-written seed file
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(seeds, f, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, path)
+
+
+def generate_seeds(cities: list = None, tiles: int = 1, dry_run: bool = False):
     if not API_KEY:
         print("Missing API Key")
         return
 
-    seeds = []
-    seen_places = set()
-
-    for city in CITIES:
-        print(f"Searching for shawarma in {city}...")
-        url = f"https://maps.googleapis.com/maps/api/place/textsearch/json?query=שווארמה ב{city}&language=iw&key={API_KEY}"
-        
-        while url:
-            try:
-                res = requests.get(url)
-                data = res.json()
-                results = data.get("results", [])
-                
-                for place in results:
-                    # Basic quality filtering
-                    status = place.get("business_status", "")
-                    if status != "OPERATIONAL":
-                        continue
-                        
-                    rating = place.get("rating", 0.0)
-                    reviews = place.get("user_ratings_total", 0)
-                    if rating < 3.5 or reviews < 50:
-                        continue
-                    
-                    name = place.get("name", "")
-                    place_id = place.get("place_id")
-                    
-                    # Negative Title Filter to catch false-positives (Burgers, Sushi, etc)
-                    negative_words = ["בורגר", "burger", "פיצה", "pizza", "סושי", "sushi", "סטיישן", "station", "קפה", "cafe", "גלידה"]
-                    if any(nw in name.lower() for nw in negative_words):
-                        # Make sure it's not a legitimate mixed place, but usually "Burger" means it's a burger joint.
-                        if "שווארמה" not in name and "שוארמה" not in name:
-                            continue
-                    
-                    # Deduplicate
-                    if place_id in seen_places:
-                        continue
-                    seen_places.add(place_id)
-                    
-                    seeds.append({
-                        "query": f"{name} {city}",
-                        "city": city
-                    })
-                    
-                # Pagination
-                next_page_token = data.get("next_page_token")
-                if next_page_token:
-                    url = f"https://maps.googleapis.com/maps/api/place/textsearch/json?pagetoken={next_page_token}&key={API_KEY}"
-                    time.sleep(2.0) # Google requires short delay between pagination loops
-                else:
-                    url = None
-                    
-            except Exception as e:
-                print(f"Error fetching for {city}: {e}")
-                url = None
-                
-        # Delay between cities
-        time.sleep(1.5)
-
-    # Save to JSON
-    output_path = os.path.join(os.path.dirname(__file__), "auto_seeds.json")
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(seeds, f, ensure_ascii=False, indent=4)
-        
-    print(f"Successfully generated {len(seeds)} authentic shawarma seeds to {output_path}")
+    cities = cities or CITIES
+    with ThreadPoolExecutor(max_workers=SEED_CONCURRENCY) as pool:
+        city_results = list(pool.map(lambda c: search_city(c, tiles), cities))
+
+    existing = load_existing_seeds()
+    merged, diff = merge_seeds(existing, city_results)
+
+    for label in ("added", "removed", "closed"):
+        for seed in diff[label]:
+            print(f"  {label}: {seed['query']}")
+    print(f"Seed diff: +{len(diff['added'])} added, -{len(diff['removed'])} removed, x{len(diff['closed'])} closed "
+          f"({len(merged)} seeds total)")
+
+    failed = [r["city"] for r in city_results if not r["ok"]]
+    if failed:
+        print(f"Kept existing seeds for cities whose scan failed: {', '.join(failed)}")
+
+    if dry_run:
+        return diff
+    if merged == existing:
+        print("No changes, seed file left untouched.")
+        return diff
+
+    write_seeds(merged)
+    print(f"Successfully wrote {len(merged)} authentic shawarma seeds to {SEEDS_PATH}")
+    return diff
 
 if __name__ == "__main__":
-    generate_seeds()
+    parser = argparse.ArgumentParser(description="Discover shawarma places and merge them into auto_seeds.json")
+    parser.add_argument("--tiles", type=int, default=1, help="Split each city into N x N search cells (1 = whole city)")
+    parser.add_argument("--city", action="append", dest="cities", help="Only refresh these cities (repeatable)")
+    parser.add_argument("--dry-run", action="store_true", help="Print the diff without writing the seed file")
+    args = parser.parse_args()
+    generate_seeds(cities=args.cities, tiles=args.tiles, dry_run=args.dry_run)
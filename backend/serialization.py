@@ -0,0 +1,141 @@
+# Fast-path serialization for the hot ranking endpoints.
+# Rankings only change when the worker commits new scores, so each payload is rendered to JSON bytes
+# once per data version and then served as-is, skipping jsonable_encoder, pydantic validation and
+# json.dumps on every request.
+import os
+import threading
+import time
+
+import orjson
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session, selectinload
+
+import models
+import metrics
+from database import DATA_VERSION_NAME
+
+# How long a request may trust the last version check before asking the database again
+VERSION_CHECK_SECONDS = float(os.getenv("RANKING_CACHE_CHECK_SECONDS", "2"))
+MAX_CACHED_PAYLOADS = 64
+RECENT_FEED_LIMIT = 20
+
+RESTAURANT_FIELDS = [c.name for c in models.Restaurant.__table__.columns]
+# Field order of schemas.RestaurantSchema / ReviewSchema, which /api/regions/{name} used to validate against
+REGION_RESTAURANT_FIELDS = ["name", "city", "platform_id", "address", "id", "region", "last_score",
+                            "bayesian_average", "total_reviews", "created_at", "updated_at"]
+REGION_REVIEW_FIELDS = ["source", "content", "url", "sentiment_score", "weight", "published_at",
+                        "id", "restaurant_id", "created_at"]
+
+
+def dumps(data) -> bytes:
+    return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(JSONResponse):
+    """ Default response class: dynamic responses are encoded with orjson instead of json.dumps """
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def restaurant_dict(r: models.Restaurant) -> dict:
+    return {field: getattr(r, field) for field in RESTAURANT_FIELDS}
+
+
+def region_restaurant_dict(r: models.Restaurant) -> dict:
+    data = {field: getattr(r, field) for field in REGION_RESTAURANT_FIELDS}
+    data["reviews"] = [{field: getattr(rev, field) for field in REGION_REVIEW_FIELDS} for rev in r.reviews]
+    return data
+
+
+def national_payload(db: Session) -> dict:
+    top_restaurants = db.query(models.Restaurant).order_by(models.Restaurant.bayesian_average.desc()).limit(10).all()
+    if not top_restaurants:
+        return {"king": None, "runnersUp": []}
+    rows = [restaurant_dict(r) for r in top_restaurants]
+    return {"king": rows[0], "runnersUp": rows[1:]}
+
+
+def regional_top_payload(db: Session, region_id: str) -> list:
+    rows = db.query(models.Restaurant)\
+        .filter(models.Restaurant.region == region_id)\
+        .order_by(models.Restaurant.bayesian_average.desc())\
+        .limit(10).all()
+    return [restaurant_dict(r) for r in rows]
+
+
+def region_full_payload(db: Session, region_name: str) -> list:
+    rows = db.query(models.Restaurant)\
+        .options(selectinload(models.Restaurant.reviews))\
+        .filter(models.Restaurant.region == region_name)\
+        .order_by(models.Restaurant.bayesian_average.desc()).all()
+    return [region_restaurant_dict(r) for r in rows]
+
+
+def recent_reviews_payload(db: Session, limit: int = RECENT_FEED_LIMIT) -> list:
+    # Plain columns over one outer join: no ORM objects or relationship loads for an uncached feed request
+    recent_reviews = db.query(models.Review.id, models.Restaurant.id, models.Restaurant.name, models.Restaurant.city,
+                              models.Review.content, models.Review.sentiment_score, models.Review.published_at)\
+        .outerjoin(models.Restaurant, models.Review.restaurant_id == models.Restaurant.id)\
+        .order_by(models.Review.published_at.desc())\
+        .limit(limit).all()
+    return [{
+        "id": review_id,
+        "restaurant_name": name if restaurant_id is not None else "Unknown Target",
+        "city": city if restaurant_id is not None else "",
+        "content": content,
+        "sentiment": sentiment,
+        "published_at": published_at.isoformat() if published_at else None
+    } for review_id, restaurant_id, name, city, content, sentiment, published_at in recent_reviews]
+
+
+def data_version(db: Session) -> int:
+    """
+    The counter every commit touching restaurants or reviews bumps (database.bump_data_version): one primary-key
+    read, however large the tables grow
+    """
+    version = db.query(models.DataVersion.version).filter(models.DataVersion.name == DATA_VERSION_NAME).scalar()
+    return version or 0
+
+
+class PayloadCache:
+    """ Rendered JSON bytes keyed by endpoint, dropped as a whole when the data version moves """
+    def __init__(self):
+        self.version = None
+        self.checked_at = 0.0
+        self.payloads = {}
+        self._lock = threading.Lock()
+
+    def _version_due(self) -> bool:
+        return time.monotonic() - self.checked_at >= VERSION_CHECK_SECONDS
+
+    def _set_version(self, version: int, checked_at: float):
+        with self._lock:
+            self.checked_at = checked_at
+            if version != self.version:
+                self.version = version
+                self.payloads = {}
+
+    def _lookup(self, key: tuple):
+        payload = self.payloads.get(key)
+        if payload is not None:
+            metrics.CACHE_HITS.labels(cache="rankings").inc()
+        else:
+            metrics.CACHE_MISSES.labels(cache="rankings").inc()
+        return payload
+
+    def _store(self, version: int, key: tuple, data) -> bytes:
+        payload = dumps(data)
+        with self._lock:
+            # Don't file a payload rendered from older data under a version that moved meanwhile
+            if self.version == version and len(self.payloads) < MAX_CACHED_PAYLOADS:
+                self.payloads[key] = payload
+        return payload
+
+    def get(self, db: Session, key: tuple, render) -> bytes:
+        """ Returns cached bytes for `key`, calling render(db) -> data only after a version change """
+        if self._version_due():
+            now = time.monotonic()
+            self._set_version(data_version(db), now)
+        version = self.version
+        payload = self._lookup(key)
+        return payload if payload is not None else self._store(version, key, render(db))
@@ -0,0 +1,168 @@
+# Multi-process check of seed sharding (sharding.py) against a throwaway SQLite database:
+#   python shard_test.py [--seeds 32] [--work-seconds 0.25] [--ttl 2]
+# 1. Three crawler processes share a cycle while a fourth claims a seed and dies holding its lease. Some seeds
+#    take longer than the TTL, so only heartbeats keep their leases. Checks that every seed is checkpointed once
+#    and that no seed is picked up again while the lease of the process that ran it is still live, so the dead
+#    process's seed only moves once its lease expired.
+# 2. Runs the same cycle on 1, 2 and 4 processes and prints the speedup.
+# Seeds are simulated with a sleep, so the numbers measure coordination overhead rather than scraping.
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seeds", type=int, default=32)
+    parser.add_argument("--work-seconds", type=float, default=0.25)
+    parser.add_argument("--ttl", type=float, default=2.0)
+    args = parser.parse_args()
+    db_dir = tempfile.mkdtemp(prefix="shard_test_")
+    # Spawned processes inherit these before importing anything
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(db_dir, 'shard.db')}"
+    os.environ["SEED_LEASE_TTL"] = str(args.ttl)
+    os.environ["SHARD_POLL_SECONDS"] = "0.1"
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import checkpoints
+import models
+import sharding
+from database import SessionLocal, ensure_schema
+
+
+def crawler_process(cycle_id: int, holder: str, log_path: str, work_seconds: float, go, long_seeds: bool = False,
+                    crash: bool = False):
+    """ One crawler: works the cycle's seeds until every one is done, logging when it ran each and its lease """
+    db = SessionLocal()
+    log = open(log_path, "a", encoding="utf-8")
+
+    def handle(target, _):
+        key = checkpoints.seed_key(target)
+        started = time.time()
+        lease = db.query(models.SeedLease).filter(models.SeedLease.cycle_id == cycle_id,
+                                                  models.SeedLease.seed_key == key).one()
+        log.write(json.dumps({"seed": key, "holder": holder, "start": started, "leased_until": lease.expires_at}) + "\n")
+        log.flush()
+        if crash:
+            time.sleep(0.05)
+            os._exit(1) # dies holding the lease: no release, no more heartbeats
+        # With long_seeds, every seventh seed outlives the TTL on its own
+        long_seed = long_seeds and int(target["query"].split()[-1]) % 7 == 3
+        time.sleep(sharding.SEED_LEASE_TTL * 1.5 if long_seed else work_seconds)
+        log.write(json.dumps({"seed": key, "holder": holder, "start": started, "end": time.time()}) + "\n")
+        log.flush()
+        return "updated", None
+
+    go.wait()
+    try:
+        sharding.work_seeds(db, cycle_id, holder, handle, wait_for_others=True)
+    finally:
+        log.close()
+        db.close()
+
+
+def new_cycle(seeds: int) -> int:
+    db = SessionLocal()
+    try:
+        cycle = models.CrawlCycle(status="running", total_seeds=seeds)
+        db.add(cycle)
+        db.commit()
+        targets = [{"query": f"שווארמה {i}", "city": "תל אביב"} for i in range(seeds)]
+        sharding.enqueue_seeds(db, cycle.id, targets, set())
+        return cycle.id
+    finally:
+        db.close()
+
+
+def run(seeds: int, workers: int, work_seconds: float, crash: bool = False):
+    """ Returns (seconds from start to the last finished seed, log entries, cycle id) """
+    cycle_id = new_cycle(seeds)
+    log_path = os.path.join(db_dir, f"cycle-{cycle_id}.jsonl")
+    ctx = multiprocessing.get_context("spawn")
+    go, crasher_go = ctx.Event(), ctx.Event()
+    processes = [ctx.Process(target=crawler_process, args=(cycle_id, f"crawler-{i}", log_path, work_seconds, go, crash))
+                 for i in range(workers)]
+    if crash:
+        processes.append(ctx.Process(target=crawler_process,
+                                     args=(cycle_id, "crasher", log_path, work_seconds, crasher_go, True, True)))
+    for p in processes:
+        p.start()
+    time.sleep(3.0) # let every process import and connect before the clock starts
+    started = time.time()
+    if crash:
+        # The crasher claims first, so it is guaranteed to die holding a seed
+        crasher_go.set()
+        time.sleep(0.02)
+    go.set()
+    for p in processes:
+        p.join()
+    with open(log_path, encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f]
+    return max(e["end"] for e in entries if "end" in e) - started, entries, cycle_id
+
+
+def check(entries: list, cycle_id: int, seeds: int, ttl: float) -> list:
+    problems = []
+    runs = {}
+    for e in entries:
+        # A finished run is logged twice (start, then start+end); keep the most complete record
+        runs.setdefault(e["seed"], {})[(e["holder"], e["start"])] = e
+    for seed, by_start in runs.items():
+        ordered = sorted(by_start.values(), key=lambda e: e["start"])
+        if sum("end" in e for e in ordered) != 1:
+            problems.append(f"{seed}: finished {sum('end' in e for e in ordered)} times")
+        for before, after in zip(ordered, ordered[1:]):
+            if after["start"] < before.get("end", before["start"]):
+                problems.append(f"{seed}: ran in {before['holder']} and {after['holder']} at the same time")
+            if after["start"] < before["leased_until"]:
+                problems.append(f"{seed}: picked up by {after['holder']} {before['leased_until'] - after['start']:.2f}s "
+                                f"before the lease of {before['holder']} expired")
+    if len(runs) != seeds:
+        problems.append(f"{len(runs)} of {seeds} seeds ran")
+
+    db = SessionLocal()
+    try:
+        checkpointed = db.query(models.CrawlCycleSeed).filter(models.CrawlCycleSeed.cycle_id == cycle_id).count()
+        if checkpointed != seeds:
+            problems.append(f"{checkpointed} checkpoints for {seeds} seeds")
+        if sharding.remaining(db, cycle_id):
+            problems.append(f"{sharding.remaining(db, cycle_id)} leases not done")
+    finally:
+        db.close()
+    return problems
+
+
+if __name__ == "__main__":
+    ensure_schema()
+    ttl = sharding.SEED_LEASE_TTL
+
+    print(f"Crash test: {args.seeds} seeds, 3 crawlers plus one that dies mid-seed, {ttl:g}s leases")
+    elapsed, entries, cycle_id = run(args.seeds, 3, args.work_seconds, crash=True)
+    reclaimed = [e for e in entries if e["holder"] != "crasher" and
+                 any(c["seed"] == e["seed"] for c in entries if c["holder"] == "crasher") and "end" in e]
+    for e in reclaimed:
+        expired_at = min(c["leased_until"] for c in entries if c["holder"] == "crasher")
+        print(f"  seed '{e['seed']}' abandoned by the crasher was taken over by {e['holder']} "
+              f"{e['start'] - expired_at:.2f}s after its lease expired")
+    problems = check(entries, cycle_id, args.seeds, ttl)
+    for problem in problems:
+        print(f"  FAIL {problem}")
+    if not reclaimed:
+        problems.append("the crashed seed was never taken over")
+        print("  FAIL the crashed seed was never taken over")
+    print("  OK: every seed ran once, none twice within a lease window" if not problems else "")
+
+    print(f"\nScaling: {args.seeds} seeds of {args.work_seconds:g}s each")
+    print(f"{'workers':>7} {'seconds':>8} {'seeds/s':>8} {'speedup':>8}")
+    baseline = None
+    for workers in (1, 2, 4):
+        elapsed, entries, cycle_id = run(args.seeds, workers, args.work_seconds)
+        scaling_problems = check(entries, cycle_id, args.seeds, ttl)
+        problems += scaling_problems
+        baseline = baseline or elapsed
+        print(f"{workers:>7} {elapsed:>8.2f} {args.seeds / elapsed:>8.2f} {baseline / elapsed:>7.2f}x"
+              + (f"  FAIL {scaling_problems}" if scaling_problems else ""))
+    raise SystemExit(1 if problems else 0)
@@ -0,0 +1,222 @@
+# Seed sharding across crawler processes.
+# The leader turns every seed of a cycle into a seed_leases row; any number of crawlers (the leader included)
+# then claim seeds one at a time under a time-limited lease, renew what they hold from a heartbeat thread, and
+# mark a seed done once its checkpoint is written. A crawler that dies stops renewing, and its seeds become
+# claimable again once their lease expires, so a seed is never worked on by two crawlers within a lease window.
+import os
+import threading
+import time
+
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import checkpoints
+import models
+from database import IS_SQLITE, SessionLocal
+
+SEED_LEASE_TTL = float(os.getenv("SEED_LEASE_TTL", "90"))
+# Seeds claimed per round trip; one keeps the tail of a cycle evenly spread over the crawlers
+SHARD_CLAIM_BATCH = int(os.getenv("SHARD_CLAIM_BATCH", "1"))
+# How often a crawler with nothing left to claim checks on the seeds others still hold
+SHARD_POLL_SECONDS = float(os.getenv("SHARD_POLL_SECONDS", "5"))
+
+
+def enqueue_seeds(db: Session, cycle_id: int, targets: list, completed_keys: set) -> int:
+    """ Adds a pending lease for every seed of the cycle that has neither a lease nor a checkpoint yet """
+    known = {row.seed_key for row in db.query(models.SeedLease.seed_key).filter(models.SeedLease.cycle_id == cycle_id)}
+    added = {}
+    for target in targets:
+        key = checkpoints.seed_key(target)
+        if key in known or key in completed_keys or key in added:
+            continue
+        added[key] = models.SeedLease(cycle_id=cycle_id, seed_key=key, query=target["query"], city=target["city"],
+                                      status="pending", expires_at=0.0, attempts=0)
+    db.add_all(added.values())
+    try:
+        db.commit()
+    except IntegrityError:
+        # A previous leader of the same cycle enqueued them concurrently
+        db.rollback()
+        return 0
+    return len(added)
+
+
+def _claimable(cycle_id: int, now: float):
+    return (models.SeedLease.cycle_id == cycle_id) & (
+        (models.SeedLease.status == "pending") |
+        ((models.SeedLease.status == "leased") & (models.SeedLease.expires_at < now))
+    )
+
+
+def _report_reclaims(rows):
+    for row in rows:
+        if row.status == "leased":
+            print(f"Reclaiming seed '{row.seed_key}' from {row.holder}: its lease expired.")
+
+
+def claim(db: Session, cycle_id: int, holder: str, limit: int = SHARD_CLAIM_BATCH, ttl: float = SEED_LEASE_TTL) -> list:
+    """ Leases up to `limit` pending or expired seeds of the cycle to `holder`. Returns the claimed rows. """
+    now = time.time()
+    lease = dict(status="leased", holder=holder, expires_at=now + ttl, attempts=models.SeedLease.attempts + 1)
+    columns = (models.SeedLease.id, models.SeedLease.seed_key, models.SeedLease.status, models.SeedLease.holder)
+    if not IS_SQLITE:
+        # Row locks taken by other claimers are skipped rather than waited on, so concurrent claims never collide
+        rows = db.execute(
+            select(*columns).where(_claimable(cycle_id, now))
+            .order_by(models.SeedLease.id).limit(limit)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if rows:
+            db.execute(update(models.SeedLease).where(models.SeedLease.id.in_([r.id for r in rows])).values(**lease))
+        db.commit()
+    else:
+        # SQLite has no row locks: re-check the claim condition in the UPDATE itself, so exactly one claimer
+        # wins each row, and move on to the next candidate when another process got there first
+        candidates = db.execute(
+            select(*columns).where(_claimable(cycle_id, now)).order_by(models.SeedLease.id).limit(limit * 4)
+        ).all()
+        rows = []
+        for row in candidates:
+            result = db.execute(
+                update(models.SeedLease)
+                .where(models.SeedLease.id == row.id, _claimable(cycle_id, now))
+                .values(**lease)
+            )
+            db.commit()
+            if result.rowcount == 1:
+                rows.append(row)
+                if len(rows) >= limit:
+                    break
+    if not rows:
+        return []
+    _report_reclaims(rows)
+    return db.query(models.SeedLease).filter(models.SeedLease.id.in_([r.id for r in rows])).order_by(models.SeedLease.id).all()
+
+
+def mark_done(db: Session, lease: models.SeedLease, holder: str) -> bool:
+    result = db.execute(
+        update(models.SeedLease)
+        .where(models.SeedLease.id == lease.id, models.SeedLease.holder == holder)
+        .values(status="done", expires_at=0.0)
+    )
+    db.commit()
+    if result.rowcount != 1:
+        print(f"Lease on seed '{lease.seed_key}' was taken over before it finished; the checkpoint is kept.")
+    return result.rowcount == 1
+
+
+def renew(holder: str, ttl: float = SEED_LEASE_TTL) -> int:
+    """ Extends every lease `holder` still holds. Returns how many there were. """
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            update(models.SeedLease)
+            .where(models.SeedLease.holder == holder, models.SeedLease.status == "leased")
+            .values(expires_at=time.time() + ttl)
+        )
+        db.commit()
+        return result.rowcount
+    finally:
+        db.close()
+
+
+def release(db: Session, holder: str) -> int:
+    """ Hands unfinished leases back right away, e.g. on shutdown, instead of making others wait out the TTL """
+    result = db.execute(
+        update(models.SeedLease)
+        .where(models.SeedLease.holder == holder, models.SeedLease.status == "leased")
+        .values(status="pending", holder=None, expires_at=0.0)
+    )
+    db.commit()
+    return result.rowcount
+
+
+def remaining(db: Session, cycle_id: int) -> int:
+    return db.query(func.count(models.SeedLease.id))\
+        .filter(models.SeedLease.cycle_id == cycle_id, models.SeedLease.status != "done")\
+        .scalar()
+
+
+def running_cycle_id(db: Session):
+    cycle = db.query(models.CrawlCycle.id)\
+        .filter(models.CrawlCycle.status == "running")\
+        .order_by(models.CrawlCycle.id.desc())\
+        .first()
+    return cycle.id if cycle else None
+
+
+class LeaseHeartbeat:
+    """ Renews a holder's seed leases every ttl/3 from a background thread while seeds are being processed """
+    def __init__(self, holder: str, ttl: float = SEED_LEASE_TTL):
+        self.holder = holder
+        self.ttl = ttl
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _loop(self):
+        while not self._stop.wait(self.ttl / 3):
+            try:
+                renew(self.holder, self.ttl)
+            except Exception as e:
+                # Fine as long as a later renewal lands before the TTL runs out
+                print(f"Seed lease heartbeat failed: {e}")
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name=f"seed-leases-{self.holder}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+
+def work_seeds(db: Session, cycle_id: int, holder: str, handle, stop_event=None, budget_seconds: float = 0.0,
+               wait_for_others: bool = False, ttl: float = SEED_LEASE_TTL):
+    """
+    Claims and processes the cycle's seeds until none are left to claim. `handle(target, seconds_left)` processes
+    one seed and returns (outcome, error); seconds_left is what remains of budget_seconds, or None without a budget.
+    With wait_for_others, keeps polling until every seed is done, picking up the seeds of crawlers that died.
+    Returns (seeds processed, interrupted).
+    """
+    started = time.monotonic()
+    processed = 0
+    heartbeat = LeaseHeartbeat(holder, ttl)
+    heartbeat.start()
+    try:
+        while True:
+            if stop_event is not None and stop_event.is_set():
+                print("Seed work interrupted: stop requested. Progress is checkpointed.")
+                return processed, True
+            seconds_left = budget_seconds - (time.monotonic() - started) if budget_seconds else None
+            if seconds_left is not None and seconds_left <= 0:
+                print(f"Cycle budget of {budget_seconds:.0f}s spent. The next run resumes from the checkpoint.")
+                return processed, True
+
+            leases = claim(db, cycle_id, holder, ttl=ttl)
+            if not leases:
+                if not wait_for_others or remaining(db, cycle_id) == 0:
+                    return processed, False
+                # Other crawlers still hold seeds: wait for them to finish, or for their leases to expire
+                if stop_event is not None:
+                    stop_event.wait(SHARD_POLL_SECONDS)
+                else:
+                    time.sleep(SHARD_POLL_SECONDS)
+                continue
+
+            for lease in leases:
+                seed_started = time.perf_counter()
+                outcome, error = handle({"query": lease.query, "city": lease.city}, seconds_left)
+                checkpoints.record_seed(db, cycle_id, lease.seed_key, outcome, time.perf_counter() - seed_started, error)
+                mark_done(db, lease, holder)
+                processed += 1
+    finally:
+        heartbeat.stop()
+        try:
+            release(db, holder)
+        except Exception as e:
+            # They expire on their own after the TTL
+            print(f"Could not release seed leases: {e}")
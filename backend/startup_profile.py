@@ -0,0 +1,79 @@
+# Startup profile for the API process: what importing `main` costs, module by module, and how long a
+# fresh uvicorn takes to answer /api/health on a new database (migrations run) and on a migrated one.
+#   python startup_profile.py            # import-time breakdown
+#   python startup_profile.py --serve    # plus time-to-first-health-check
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def import_breakdown(env: dict) -> list:
+    """ Returns (module, self_us, cumulative_us) rows from `python -X importtime -c "import main"` """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                          cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        rows.append((module.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_to_health(env: dict, timeout: float = 60.0) -> float:
+    port = free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)],
+                            cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.02)
+        raise TimeoutError(f"/api/health did not answer within {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--top", type=int, default=20, help="Modules to list")
+    parser.add_argument("--serve", action="store_true", help="Also time uvicorn until /api/health answers")
+    args = parser.parse_args()
+
+    # Profile against a throwaway database so the numbers don't depend on (or touch) the real one
+    db_dir = tempfile.mkdtemp(prefix="startup_profile_")
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(db_dir, 'startup.db')}")
+
+    rows = import_breakdown(env)
+    total = next((cumulative for module, _, cumulative in rows if module == "main"), 0)
+    print(f"import main: {total / 1000:.0f} ms")
+    print(f"\n{'cumulative ms':>13} {'self ms':>8}  top-level module")
+    top_level = [r for r in rows if "." not in r[0]]
+    for module, self_us, cumulative_us in sorted(top_level, key=lambda r: r[2], reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:13.1f} {self_us / 1000:8.1f}  {module}")
+
+    worker_only = [m for m in ("openai", "apify_client", "worker", "nlp", "scrapers", "boto3") if any(r[0] == m for r in rows)]
+    if worker_only:
+        print(f"\nWorker-only modules imported by the API: {', '.join(worker_only)}")
+
+    if args.serve:
+        print(f"\nfirst boot (runs migrations): {time_to_health(env):.2f}s to /api/health")
+        print(f"warm boot (migrated):         {time_to_health(env):.2f}s to /api/health")
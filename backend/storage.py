@@ -0,0 +1,137 @@
+# File storage shared between the services: the published leaderboard snapshots and the cold review archive.
+# A location is either a local directory or an s3://bucket/prefix URL (AWS S3 or any S3-compatible store such as
+# Cloudflare R2; point AWS_ENDPOINT_URL_S3 at it, credentials come from the usual AWS_* variables).
+# On Render a disk belongs to a single service, so once the crawler runs as its own worker only a bucket is
+# visible to both it and the API; a local directory only works for a single-service deploy (EMBEDDED_WORKER=1)
+# or local development.
+import os
+from functools import lru_cache
+
+
+class LocalStore:
+    """ Keys are '/'-separated paths under root; writes are atomic (temp file + rename) and fsynced """
+    def __init__(self, root: str):
+        self.root = root
+
+    def __repr__(self):
+        return self.root
+
+    def _path(self, key: str) -> str:
+        root = os.path.realpath(self.root)
+        path = os.path.realpath(os.path.join(root, key))
+        if os.path.commonpath([root, path]) != root:
+            raise ValueError(f"{key} is outside {self.root}")
+        return path
+
+    def put(self, key: str, data: bytes, content_type: str = None, cache_control: str = None,
+            content_encoding: str = None):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def get(self, key: str):
+        """ The stored bytes, or None if there is no such key """
+        try:
+            path = self._path(key)
+        except ValueError:
+            return None
+        if key.endswith(".tmp") or not os.path.isfile(path):
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def local_path(self, key: str):
+        """ Path of a stored key on this machine, so it can be served as a file """
+        try:
+            path = self._path(key)
+        except ValueError:
+            return None
+        return path if not key.endswith(".tmp") and os.path.isfile(path) else None
+
+    def list(self, prefix: str) -> list:
+        """ All keys under prefix (a directory, '/'-terminated or not), unordered """
+        base = self._path(prefix)
+        keys = []
+        for dirpath, _, names in os.walk(base):
+            for name in names:
+                if not name.endswith(".tmp"):
+                    keys.append(os.path.relpath(os.path.join(dirpath, name), os.path.realpath(self.root)).replace(os.sep, "/"))
+        return keys
+
+    def delete(self, keys: list):
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+        # Drop directories the deletes left empty
+        for dirpath in {os.path.dirname(self._path(key)) for key in keys}:
+            try:
+                os.removedirs(dirpath)
+            except OSError:
+                pass
+
+
+class S3Store:
+    """ Keys are object names under the URL's prefix; a PUT is atomic and durable once it returns """
+    def __init__(self, url: str):
+        # Imported here: boto3 costs the API's cold start ~75 ms and only s3:// locations need it
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError(f"{url} needs the boto3 package (pip install boto3)") from None
+        bucket, _, prefix = url[len("s3://"):].partition("/")
+        self.url = url
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.client = boto3.client("s3")
+
+    def __repr__(self):
+        return self.url
+
+    def put(self, key: str, data: bytes, content_type: str = None, cache_control: str = None,
+            content_encoding: str = None):
+        extra = {}
+        if content_type:
+            extra["ContentType"] = content_type
+        if cache_control:
+            extra["CacheControl"] = cache_control
+        if content_encoding:
+            extra["ContentEncoding"] = content_encoding
+        self.client.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=data, **extra)
+
+    def get(self, key: str):
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self.prefix + key)["Body"].read()
+        except self.client.exceptions.NoSuchKey:
+            return None
+
+    def local_path(self, key: str):
+        return None
+
+    def list(self, prefix: str) -> list:
+        prefix = self.prefix + prefix.rstrip("/") + "/"
+        keys = []
+        for page in self.client.get_paginator("list_objects_v2").paginate(Bucket=self.bucket, Prefix=prefix):
+            keys.extend(obj["Key"][len(self.prefix):] for obj in page.get("Contents", []))
+        return keys
+
+    def delete(self, keys: list):
+        keys = list(keys)
+        # DeleteObjects takes at most 1000 keys per call
+        for i in range(0, len(keys), 1000):
+            self.client.delete_objects(Bucket=self.bucket, Delete={
+                "Objects": [{"Key": self.prefix + key} for key in keys[i:i + 1000]], "Quiet": True})
+
+
+@lru_cache(maxsize=None)
+def open_store(location: str):
+    """ The store for a local directory or an s3://bucket/prefix URL, one per location per process """
+    if location.startswith("s3://"):
+        return S3Store(location)
+    return LocalStore(location)
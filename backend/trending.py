@@ -0,0 +1,184 @@
+# "Trending now": exponentially decayed activity counters per restaurant.
+# Counters use forward decay: an event at time t adds x * e^(λ(t - epoch)) to a stored sum, and reading at time
+# `now` multiplies by e^(-λ(now - epoch)). Updates are O(1) with no decay pass over old data, and since every
+# restaurant shares the epoch, the ranking only changes when a counter is bumped, never by time passing. Bumps
+# only ever add, so the API keeps a size-k heap that a bump can update in O(log k) instead of re-ranking.
+# The API finds bumped counters by change_seq, a number taken from the 'trending' data_versions row right before
+# the bumping transaction commits. Incrementing that row locks it until the commit, so numbers are handed out in
+# commit order and a reader that has seen number n has also seen everything numbered below it. A wall-clock
+# updated_at can't do that: a slow transaction commits a bump stamped before rows the reader already passed.
+import heapq
+import math
+import os
+import threading
+import time
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal
+
+TRENDING_HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", "24"))
+TRENDING_TOP_K = 50
+# How often an API process picks up counters the crawler bumped
+TRENDING_CHECK_SECONDS = float(os.getenv("TRENDING_CHECK_SECONDS", "5"))
+# Social posts count more towards heat than a single review; positive ones count more than negative ones
+SOCIAL_WEIGHT = 2.0
+
+DECAY_RATE = math.log(2) / (TRENDING_HALF_LIFE_HOURS * 3600)
+# The epoch moves forward in steps so the stored growth factor stays below e^50
+EPOCH_SECONDS = 50 / DECAY_RATE
+
+COUNTERS = ("heat", "reviews", "mentions", "sentiment_sum")
+
+
+def current_epoch(now: float = None) -> float:
+    now = time.time() if now is None else now
+    return math.floor(now / EPOCH_SECONDS) * EPOCH_SECONDS
+
+
+def _rebase(counter: models.TrendingCounter, epoch: float):
+    """ Re-expresses the stored sums relative to a later epoch """
+    if counter.epoch == epoch:
+        return
+    factor = math.exp(-DECAY_RATE * (epoch - counter.epoch))
+    for field in COUNTERS:
+        setattr(counter, field, (getattr(counter, field) or 0.0) * factor)
+    counter.epoch = epoch
+
+
+def heat_of(sentiment: float, social: bool) -> float:
+    """ A review's contribution to heat: 0..1 by sentiment, doubled for social posts; never negative """
+    return (SOCIAL_WEIGHT if social else 1.0) * (1.0 + max(-1.0, min(1.0, sentiment or 0.0))) / 2.0
+
+
+def record(db: Session, counters: dict, restaurant_id: int, sentiment: float, social: bool, event_time: float = None):
+    """
+    Bumps a restaurant's counters for one newly ingested review; the caller commits. `counters` caches rows per
+    restaurant for the duration of an ingest. event_time (Unix) is when the review was published, so old reviews
+    ingested for the first time barely register.
+    """
+    now = time.time()
+    epoch = current_epoch(now)
+    counter = counters.get(restaurant_id)
+    if counter is None:
+        counter = db.get(models.TrendingCounter, restaurant_id)
+        if counter is None:
+            counter = models.TrendingCounter(restaurant_id=restaurant_id, epoch=epoch,
+                                             heat=0.0, reviews=0.0, mentions=0.0, sentiment_sum=0.0)
+            db.add(counter)
+        counters[restaurant_id] = counter
+    _rebase(counter, epoch)
+    growth = math.exp(DECAY_RATE * (min(event_time or now, now) - epoch))
+    counter.heat += heat_of(sentiment, social) * growth
+    counter.reviews += growth
+    counter.mentions += growth if social else 0.0
+    counter.sentiment_sum += (sentiment or 0.0) * growth
+    counter.updated_at = now
+    db.info.setdefault("trending_bumped", set()).add(counter)
+
+
+@event.listens_for(SessionLocal, "before_commit")
+def _number_bumps(session):
+    # Taken as late as possible, so concurrent crawlers only queue on the row for the commit itself
+    bumped = session.info.pop("trending_bumped", None)
+    if not bumped:
+        return
+    session.execute(text("UPDATE data_versions SET version = version + 1 WHERE name = 'trending'"))
+    seq = session.execute(text("SELECT version FROM data_versions WHERE name = 'trending'")).scalar()
+    for counter in bumped:
+        counter.change_seq = seq
+
+
+@event.listens_for(SessionLocal, "after_soft_rollback")
+def _forget_bumps(session, previous_transaction):
+    session.info.pop("trending_bumped", None)
+
+
+def decayed(counter: models.TrendingCounter, now: float = None) -> dict:
+    """ Counter values as of now """
+    now = time.time() if now is None else now
+    factor = math.exp(-DECAY_RATE * (now - counter.epoch))
+    values = {field: (getattr(counter, field) or 0.0) * factor for field in COUNTERS}
+    values["avg_sentiment"] = values["sentiment_sum"] / values["reviews"] if values["reviews"] > 1e-9 else 0.0
+    return values
+
+
+class TrendingBoard:
+    """
+    The top TRENDING_TOP_K restaurants by heat, as a min-heap of (heat at the board epoch, restaurant_id).
+    Built once from all counters, then kept current from the rows whose change_seq is past the last one seen.
+    """
+    def __init__(self, k: int = TRENDING_TOP_K):
+        self.k = k
+        self.epoch = None
+        self.heap = []
+        self.members = {} # restaurant_id -> heat, for the ones in the heap
+        self.seen_seq = 0
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _normalized(self, counter: models.TrendingCounter) -> float:
+        return (counter.heat or 0.0) * math.exp(-DECAY_RATE * (self.epoch - counter.epoch))
+
+    def offer(self, restaurant_id: int, heat: float):
+        """ Applies a (never decreasing) heat for one restaurant: O(log k), or O(k) when it is already listed """
+        if restaurant_id in self.members:
+            if heat <= self.members[restaurant_id]:
+                return
+            self.members[restaurant_id] = heat
+            self.heap = [(h, r) if r != restaurant_id else (heat, r) for h, r in self.heap]
+            heapq.heapify(self.heap)
+        elif len(self.heap) < self.k:
+            self.members[restaurant_id] = heat
+            heapq.heappush(self.heap, (heat, restaurant_id))
+        elif heat > self.heap[0][0]:
+            _, dropped = heapq.heapreplace(self.heap, (heat, restaurant_id))
+            del self.members[dropped]
+            self.members[restaurant_id] = heat
+
+    def refresh(self, db: Session):
+        now = time.time()
+        if now - self.checked_at < TRENDING_CHECK_SECONDS:
+            return
+        with self._lock:
+            self.checked_at = now
+            epoch = current_epoch(now)
+            query = db.query(models.TrendingCounter)
+            if self.epoch != epoch:
+                # First build, or the epoch moved on: rank everything again
+                self.epoch, self.heap, self.members, self.seen_seq = epoch, [], {}, 0
+            else:
+                query = query.filter(models.TrendingCounter.change_seq > self.seen_seq)
+            for counter in query:
+                self.offer(counter.restaurant_id, self._normalized(counter))
+                self.seen_seq = max(self.seen_seq, counter.change_seq or 0)
+
+    def top(self, db: Session, k: int = 10) -> list:
+        self.refresh(db)
+        ranked = heapq.nlargest(max(0, min(k, self.k)), self.heap)
+        ids = [restaurant_id for _, restaurant_id in ranked]
+        if not ids:
+            return []
+        restaurants = {r.id: r for r in db.query(models.Restaurant).filter(models.Restaurant.id.in_(ids))}
+        counters = {c.restaurant_id: c for c in db.query(models.TrendingCounter).filter(models.TrendingCounter.restaurant_id.in_(ids))}
+        now = time.time()
+        rows = []
+        for restaurant_id in ids:
+            restaurant, counter = restaurants.get(restaurant_id), counters.get(restaurant_id)
+            if restaurant is None or counter is None:
+                continue
+            values = decayed(counter, now)
+            rows.append({
+                "id": restaurant.id,
+                "name": restaurant.name,
+                "city": restaurant.city,
+                "region": restaurant.region,
+                "bayesian_average": restaurant.bayesian_average,
+                "heat": round(values["heat"], 3),
+                "recent_reviews": round(values["reviews"], 2),
+                "recent_mentions": round(values["mentions"], 2),
+                "avg_sentiment": round(values["avg_sentiment"], 3),
+            })
+        return rows
@@ -0,0 +1,130 @@
+# Check of the incremental trending board (trending.py) against a throwaway SQLite database:
+#   python trending_test.py [--writers 3] [--seconds 6] [--restaurants 50]
+# 1. A bump is made in a transaction that commits only after another writer's later bump was committed and read
+#    by the board. Checks that the next refresh still picks it up.
+# 2. Writer processes bump random restaurants and hold each transaction open for a random while before
+#    committing, as the crawler does while it scores reviews, while the board refreshes continuously. Checks that
+#    the board ends up identical to one built from scratch.
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--writers", type=int, default=3)
+    parser.add_argument("--seconds", type=float, default=6.0)
+    parser.add_argument("--restaurants", type=int, default=50)
+    args = parser.parse_args()
+    db_dir = tempfile.mkdtemp(prefix="trending_test_")
+    # Spawned processes inherit these before importing anything
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(db_dir, 'trending.db')}"
+    os.environ["TRENDING_CHECK_SECONDS"] = "0"
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import models
+import trending
+from database import SessionLocal, ensure_schema
+
+
+def seed_restaurants(count: int):
+    """ Restaurants with zeroed counters, so concurrent writers only ever update a counter row """
+    db = SessionLocal()
+    db.add_all(models.Restaurant(id=i, name=f"שווארמה {i}", city="תל אביב", platform_id=f"place-{i}", region="center")
+               for i in range(1, count + 1))
+    db.add_all(models.TrendingCounter(restaurant_id=i, epoch=trending.current_epoch(), heat=0.0, reviews=0.0,
+                                      mentions=0.0, sentiment_sum=0.0, change_seq=0) for i in range(1, count + 1))
+    db.commit()
+    db.close()
+
+
+def board_ids(board: trending.TrendingBoard, db) -> list:
+    return [row["id"] for row in board.top(db, board.k)]
+
+
+def late_commit() -> list:
+    problems = []
+    board = trending.TrendingBoard(k=10)
+    reader, slow, fast = SessionLocal(), SessionLocal(), SessionLocal()
+    try:
+        board.top(reader, 10)
+        trending.record(slow, {}, 1, 1.0, social=True) # stamped now, committed last
+        time.sleep(1.5)
+        trending.record(fast, {}, 2, 0.0, social=False)
+        fast.commit()
+        if board_ids(board, reader)[:1] != [2]:
+            problems.append("the committed bump was not picked up")
+        slow.commit()
+        reader.expire_all()
+        if board_ids(board, reader)[:2] != [1, 2]:
+            problems.append("the bump committed late never reached the board")
+    finally:
+        for db in (reader, slow, fast):
+            db.close()
+    return problems
+
+
+def writer_process(restaurants: int, seconds: float, seed: int, writers: int):
+    """
+    Bumps a few random restaurants per transaction, holding it open for up to 1.5s before committing. Each writer
+    has its own restaurants, as seed leases give each crawler its own: record() is a read-modify-write, so two
+    open transactions bumping one counter would lose an update whatever the board does.
+    """
+    rng = random.Random(seed)
+    mine = [r for r in range(1, restaurants + 1) if r % writers == seed]
+    db = SessionLocal()
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        counters = {}
+        for _ in range(rng.randint(1, 3)):
+            trending.record(db, counters, rng.choice(mine), rng.uniform(-1, 1), social=rng.random() < 0.3)
+        time.sleep(rng.choice([0.0, 0.05, 0.2, 1.5]))
+        db.commit()
+    db.close()
+
+
+def concurrent_writers(writers: int, seconds: float, restaurants: int) -> list:
+    board = trending.TrendingBoard(k=20)
+    reader = SessionLocal()
+    ctx = multiprocessing.get_context("spawn")
+    processes = [ctx.Process(target=writer_process, args=(restaurants, seconds, seed, writers)) for seed in range(writers)]
+    for p in processes:
+        p.start()
+    refreshes = 0
+    while any(p.is_alive() for p in processes):
+        reader.expire_all()
+        board.top(reader, 20)
+        reader.rollback() # a fresh snapshot for the next refresh
+        refreshes += 1
+        time.sleep(0.02)
+    for p in processes:
+        p.join()
+    reader.expire_all()
+    board.top(reader, 20)
+    rebuilt = trending.TrendingBoard(k=20)
+    rebuilt.top(reader, 20)
+    reader.close()
+    print(f"  {refreshes} refreshes while {writers} writers committed for {seconds:g}s")
+    # Heat only grows, so a board that saw every bump holds exactly the rebuilt board's restaurants and heats
+    stale = [restaurant_id for restaurant_id, heat in rebuilt.members.items()
+             if abs(board.members.get(restaurant_id, 0.0) - heat) > 1e-9 * heat]
+    if stale:
+        return [f"{len(stale)} of the top 20 restaurants are missing bumps: {sorted(stale)}"]
+    return []
+
+
+if __name__ == "__main__":
+    ensure_schema()
+    seed_restaurants(args.restaurants)
+
+    print("Late commit: a bump committed after a later one was already read")
+    problems = late_commit()
+    print("\n".join(f"  FAIL {p}" for p in problems) or "  OK: picked up on the next refresh")
+
+    print(f"Concurrent writers: {args.writers} processes, transactions held open up to 1.5s")
+    concurrent_problems = concurrent_writers(args.writers, args.seconds, args.restaurants)
+    print("\n".join(f"  FAIL {p}" for p in concurrent_problems) or "  OK: same top 20 and heats as a board built from scratch")
+    raise SystemExit(1 if problems + concurrent_problems else 0)
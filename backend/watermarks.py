@@ -0,0 +1,91 @@
+# Per-restaurant, per-source change detection.
+# Google: a rating-only Place Details call is compared with the user_ratings_total seen at the last full fetch;
+# the review payload (and sentiment scoring) is only requested when that number moved.
+# Wolt and the social scans: rescanned at most once per interval, and already-ingested post URLs are skipped.
+import json
+import os
+import time
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models
+
+# Even when the count hasn't moved, re-read the reviews once in a while (edits, deletions balanced by new reviews)
+GOOGLE_FULL_REFRESH_HOURS = float(os.getenv("GOOGLE_FULL_REFRESH_HOURS", "168"))
+WOLT_RESCAN_HOURS = float(os.getenv("WOLT_RESCAN_HOURS", "24"))
+SOCIAL_RESCAN_HOURS = float(os.getenv("SOCIAL_RESCAN_HOURS", "24"))
+MAX_SEEN_URLS = 200
+
+
+def get(db: Session, restaurant_id: int, source: str):
+    if restaurant_id is None:
+        return None
+    return db.query(models.SourceWatermark)\
+        .filter(models.SourceWatermark.restaurant_id == restaurant_id, models.SourceWatermark.source == source)\
+        .first()
+
+
+def due(watermark, interval_hours: float, field: str = "last_checked_at") -> bool:
+    """ Whether `field` is unset or older than interval_hours """
+    last = getattr(watermark, field) if watermark else None
+    return last is None or time.time() - last >= interval_hours * 3600
+
+
+def google_check_first(watermark) -> bool:
+    """ Whether a rating-only call may stand in for the full fetch (a baseline exists and isn't too old) """
+    return (
+        watermark is not None
+        and watermark.ratings_total is not None
+        and not due(watermark, GOOGLE_FULL_REFRESH_HOURS, "last_full_fetch_at")
+    )
+
+
+def google_unchanged(watermark, summary: dict) -> bool:
+    return summary.get("user_ratings_total") == watermark.ratings_total
+
+
+def newer_reviews(watermark, reviews: list) -> list:
+    """
+    Google reviews published after the newest one already ingested, checked one by one rather than stopping at
+    the first old one. Sound because fetch_recent_reviews asks for the newest reviews (reviews_sort=newest).
+    """
+    if watermark is None or watermark.newest_review_time is None:
+        return reviews
+    return [r for r in reviews if (r.get("time") or 0) > watermark.newest_review_time]
+
+
+def seen_urls(watermark) -> set:
+    if watermark is None or not watermark.seen_urls:
+        return set()
+    return set(json.loads(watermark.seen_urls))
+
+
+def record(db: Session, restaurant_id: int, source: str, full_fetch: bool = False, reviews: list = None, urls: list = None, **fields):
+    """
+    Upserts the watermark after a successful call. `reviews` advance newest_review_time, `urls` are appended
+    to the seen list (newest last, capped at MAX_SEEN_URLS). Commits.
+    """
+    watermark = get(db, restaurant_id, source)
+    if watermark is None:
+        watermark = models.SourceWatermark(restaurant_id=restaurant_id, source=source)
+        db.add(watermark)
+    now = time.time()
+    watermark.last_checked_at = now
+    if full_fetch:
+        watermark.last_full_fetch_at = now
+    for field, value in fields.items():
+        setattr(watermark, field, value)
+    times = [r.get("time") for r in reviews or [] if r.get("time")]
+    if times:
+        watermark.newest_review_time = max([watermark.newest_review_time or 0] + times)
+    if urls:
+        known = json.loads(watermark.seen_urls) if watermark.seen_urls else []
+        known.extend(u for u in urls if u not in known)
+        watermark.seen_urls = json.dumps(known[-MAX_SEEN_URLS:])
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent on-demand scrape created it first; its values are just as fresh
+        db.rollback()
+    return watermark
@@ -1,4 +1,6 @@
 import asyncio
+import os
+import time
 from sqlalchemy.orm import Session
 from datetime import datetime, timezone
 
@@ -6,157 +8,477 @@ from scrapers.google import GoogleBusinessScraper
 from nlp import RankingEngine
 from database import engine, get_db
 import models
-from regions import get_region_by_city
+from regions import get_region_by_city, get_region_by_coords
 from scrapers.social import SocialMediaScanner
 from scrapers.wolt import WoltTracker
+import metrics
+import profiling
+import checkpoints
+import resilience
+import watermarks
+import dedup
+import publish
+import retention
+import pipeline
+import trending
+import sharding
+from leader import make_holder_id
+from matching import EntityResolver, BlockingIndex, load_blocking_index, similarity, mentions, MATCH_THRESHOLD
 
-async def process_restaurant(scraper: GoogleBusinessScraper, social: SocialMediaScanner, wolt: WoltTracker, ai: RankingEngine, db: Session, search_query: str, default_city: str):
+def resolve_google_place(scraper: GoogleBusinessScraper, resolver: EntityResolver, seed_key: str, search_query: str, default_city: str):
+    """
+    Returns (place_id, address, location, match). A confirmed match from a previous cycle is reused without a
+    Text Search call; otherwise an already-tracked restaurant that clearly matches is adopted, and only then
+    is Google searched.
+    """
+    match = resolver.lookup(seed_key, "google")
+    if match:
+        metrics.CACHE_HITS.labels(cache="entity_google").inc()
+        location = {"lat": match.lat, "lng": match.lng} if match.lat is not None else None
+        return match.external_id, match.address, location, match
+    metrics.CACHE_MISSES.labels(cache="entity_google").inc()
+
+    known, score = resolver.blocking().find(search_query, default_city)
+    if known:
+        print(f"Matched {search_query} to tracked restaurant '{known.name}' ({score:.2f}) without a search")
+        location = {"lat": known.lat, "lng": known.lng} if known.lat is not None else None
+        resolver.confirm(seed_key, "google", known.platform_id, known.name, score, address=known.address, lat=known.lat, lng=known.lng)
+        return known.platform_id, known.address, location, None
+
+    with metrics.stage("search_place"):
+        candidate = scraper.resolve_place(search_query, default_city)
+    if not candidate:
+        return None, None, None, None
+    location = candidate["location"] or {}
+    resolver.confirm(seed_key, "google", candidate["place_id"], candidate["name"], candidate["score"],
+                     address=candidate["address"], lat=location.get("lat"), lng=location.get("lng"))
+    return candidate["place_id"], candidate["address"], candidate["location"], None
+
+def fetch_wolt_rating(wolt: WoltTracker, resolver: EntityResolver, seed_key: str, display_name: str, default_city: str, lat: float, lng: float):
+    """
+    Wolt rating through the confirmed venue slug, searching (near the place itself) only when none is known.
+    Returns None when Wolt could not be asked (open circuit, failed call), 0.0 when there is no rating.
+    """
+    if resilience.breaker("wolt").is_open():
+        return None
+    match = resolver.lookup(seed_key, "wolt")
+    if match:
+        slug = match.external_id
+    else:
+        kwargs = {"lat": lat, "lon": lng} if lat is not None and lng is not None else {}
+        venue = wolt.resolve_venue(display_name, default_city, **kwargs)
+        if not venue:
+            return 0.0
+        slug = venue["slug"]
+        match = resolver.confirm(seed_key, "wolt", slug, venue["name"], venue["score"])
+
+    load = wolt.check_delivery_load(slug)
+    if not load:
+        return None
+    if load.get("name") and similarity(display_name, load["name"], default_city) < MATCH_THRESHOLD:
+        resolver.invalidate(match, f"venue now named '{load['name']}'")
+        return 0.0
+    resolver.touch(match)
+    if load.get("rating"):
+        rating = load.get("rating")
+        return float(rating.get('score', 0.0)) if isinstance(rating, dict) else float(rating)
+    return 0.0
+
+def fetch_google_data(scraper: GoogleBusinessScraper, watermark, place_id: str) -> dict:
+    """
+    Same shape as fetch_recent_reviews, but with a known baseline only a rating-only call is made and the
+    reviews are fetched just when user_ratings_total moved. Returns "unchanged": True when they weren't.
+    Reviews at or before the watermark's newest review are dropped before they reach sentiment scoring.
+    """
+    if watermarks.google_check_first(watermark):
+        with metrics.stage("fetch_rating_summary"):
+            summary = scraper.fetch_rating_summary(place_id)
+        if summary.get("failed"):
+            return dict(summary, reviews=[])
+        if watermarks.google_unchanged(watermark, summary):
+            metrics.CACHE_HITS.labels(cache="google_watermark").inc()
+            return dict(summary, reviews=[], unchanged=True)
+        metrics.CACHE_MISSES.labels(cache="google_watermark").inc()
+
+    with metrics.stage("fetch_recent_reviews"):
+        google_data = scraper.fetch_recent_reviews(place_id)
+    reviews = google_data.get("reviews", [])
+    fresh = watermarks.newer_reviews(watermark, reviews)
+    if len(fresh) < len(reviews):
+        metrics.REVIEWS_INGESTED.labels(source="google", result="duplicate").inc(len(reviews) - len(fresh))
+    google_data["reviews"] = fresh
+    return google_data
+
+# (source, scan) pairs; each scan returns posts, or None when the source was unavailable
+SOCIAL_SCANS = (
+    ("tiktok", lambda social, hashtag, query: social.scan_tiktok_hashtags([hashtag])),
+    ("instagram", lambda social, hashtag, query: social.scan_instagram_tags([hashtag])),
+    ("facebook", lambda social, hashtag, query: social.scan_facebook_posts(query)),
+)
+# How many stored social posts a fresh scan is compared against
+SOCIAL_DEDUP_HISTORY = 200
+# Sentiment calls in flight per restaurant (the dispatcher enforces the API's rate budgets), and how many new
+# reviews are committed together
+SENTIMENT_CONCURRENCY = int(os.getenv("SENTIMENT_CONCURRENCY", "16"))
+PERSIST_BATCH_SIZE = 25
+# Reviews left unscored by earlier visits (rate limits, outages) that one visit tries again
+UNSCORED_RETRY_LIMIT = 100
+
+def load_social_index(db: Session, restaurant_id: int) -> dedup.NearDuplicateIndex:
+    """ Near-duplicate index seeded with the restaurant's recent stored social posts, keyed ("stored", review id) """
+    index = dedup.NearDuplicateIndex()
+    if restaurant_id is None:
+        return index
+    stored = db.query(models.Review.id, models.Review.content)\
+        .filter(models.Review.restaurant_id == restaurant_id, models.Review.source.in_([s for s, _ in SOCIAL_SCANS]))\
+        .order_by(models.Review.id.desc())\
+        .limit(SOCIAL_DEDUP_HISTORY).all()
+    for review_id, content in stored:
+        index.check(("stored", review_id), content)
+    return index
+
+def report_clusters(search_query: str, index: dedup.NearDuplicateIndex, captions: dict):
+    # Stored posts folding into each other were reported when they were scanned
+    clusters = {rep: [m for m in members if m[0] != "stored"] for rep, members in index.clusters().items()}
+    clusters = {rep: members for rep, members in clusters.items() if members}
+    if not clusters:
+        return
+    def caption(key):
+        return "stored review" if key[0] == "stored" else f"{key[0]}: {captions.get(key, '')[:60]!r}"
+    dropped = sum(len(members) for members in clusters.values())
+    print(f"Near-duplicate posts for {search_query}: {len(clusters)} clusters, {dropped} posts dropped")
+    for rep, members in clusters.items():
+        print(f"  {caption(rep)} <- {len(members)} copies ({', '.join(sorted({m[0] for m in members}))})")
+
+class ReviewIngest:
+    """
+    One restaurant's review stream: fetch -> normalize (match, dedup) -> sentiment -> persist.
+    normalize and persist run as single workers, so the dedup state and the DB session are only ever touched
+    from the event loop; sentiment calls go through the engine's SentimentDispatcher, SENTIMENT_CONCURRENCY at a time.
+    """
+    def __init__(self, ai: RankingEngine, db: Session, restaurant, create_restaurant, display_name: str, default_city: str, social_watermarks: dict):
+        self.ai = ai
+        self.db = db
+        self.restaurant = restaurant
+        self.create_restaurant = create_restaurant
+        self.display_name = display_name
+        self.default_city = default_city
+        self.seen = {source: watermarks.seen_urls(w) for source, w in social_watermarks.items()}
+        self._near_duplicates = None
+        self.captions = {}
+        self.counted = set()
+        self.contents = set()
+        self.matched = 0
+        self.new_reviews = 0
+        self.scan_ok = {}
+        self.social_seen = {}
+        self.trending_counters = {}
+        self.stream = pipeline.Pipeline()\
+            .add_stage("normalize", self.normalize)\
+            .add_stage("sentiment", self.score, concurrency=SENTIMENT_CONCURRENCY)\
+            .add_stage("persist", self.persist)
+
+    @property
+    def near_duplicates(self) -> dedup.NearDuplicateIndex:
+        # Signing the stored posts is only worth it once a social scan actually delivers something to compare
+        if self._near_duplicates is None:
+            self._near_duplicates = load_social_index(self.db, self.restaurant.id if self.restaurant else None)
+        return self._near_duplicates
+
+    async def feed_google(self, reviews: list):
+        for review in reviews:
+            await self.stream.put({"source": "google", "text": review.get("text") or "", "time": review.get("time")})
+
+    def scan_social(self, emit, social: SocialMediaScanner, source: str, scan, hashtag: str, query: str):
+        """ Runs in a thread: emits posts while the actor's dataset pages in, then an end marker with the scan status """
+        started = time.perf_counter()
+        ok = False
+        try:
+            items = scan(social, hashtag, query)
+            if items is not None:
+                for i, item in enumerate(items):
+                    emit({"source": source, "index": i, "text": item.get("text") or "", "url": item.get("url"), "time": None})
+                ok = True
+        except Exception as e:
+            print(f"Warning: {source} scan failed - {e}")
+        metrics.STAGE_SECONDS.labels(stage="social_scan").observe(time.perf_counter() - started)
+        emit({"source": source, "end": True, "ok": ok})
+
+    def is_stored(self, content: str) -> bool:
+        if self.restaurant is None:
+            return False
+        existing = self.db.query(models.Review.id).filter(
+            models.Review.restaurant_id == self.restaurant.id,
+            models.Review.content == content
+        ).first()
+        return existing is not None or retention.is_archived(self.db, self.restaurant.id, content)
+
+    async def normalize(self, item: dict):
+        source = item["source"]
+        if item.get("end"):
+            self.scan_ok[source] = item["ok"]
+            return None
+        content = item["text"]
+        if not content:
+            return None
+        if source != "google":
+            key = (source, item["index"])
+            if not mentions(content, self.display_name, self.default_city):
+                metrics.REVIEWS_INGESTED.labels(source=source, result="unmatched").inc()
+                return None
+            self.captions[key] = content
+            # Reposts and near-copies collapse into one post: scored once, counted once per scan
+            original = self.near_duplicates.check(key, content)
+            if original is not None:
+                metrics.REVIEWS_INGESTED.labels(source=source, result="near_duplicate").inc()
+                if original[0] == "stored" and original not in self.counted:
+                    self.counted.add(original)
+                    self.matched += 1
+                return None
+            self.matched += 1
+            url = item.get("url")
+            if url and url in self.seen.get(source, ()):
+                # Top posts repeat between scans; already scored last time
+                metrics.REVIEWS_INGESTED.labels(source=source, result="duplicate").inc()
+                return None
+            if url:
+                self.social_seen.setdefault(source, []).append(url)
+        if content in self.contents or self.is_stored(content):
+            metrics.REVIEWS_INGESTED.labels(source=source, result="duplicate").inc()
+            return None
+        self.contents.add(content)
+        return item
+
+    async def score(self, item: dict):
+        with metrics.stage("analyze_sentiment"):
+            # None when the API couldn't score it; stored unscored and retried on the next visit
+            item["sentiment"] = await self.ai.sentiment.score(item["text"])
+        return item
+
+    async def persist(self, item: dict):
+        if self.restaurant is None:
+            self.restaurant = self.create_restaurant()
+        # We need a proper datetime from Google's 'time' (timestamp)
+        timestamp = item.get("time")
+        published_at = datetime.fromtimestamp(timestamp, tz=timezone.utc) if timestamp else datetime.now(timezone.utc)
+        self.db.add(models.Review(
+            restaurant_id=self.restaurant.id,
+            source=item["source"],
+            content=item["text"],
+            sentiment_score=item["sentiment"],
+            weight=self.ai.calculate_recency_weight(published_at),
+            published_at=published_at
+        ))
+        if item["sentiment"] is not None:
+            # An unscored review would count as neutral; score_unscored_reviews records it once it has a score
+            trending.record(self.db, self.trending_counters, self.restaurant.id, item["sentiment"],
+                            social=item["source"] != "google", event_time=published_at.timestamp())
+        self.new_reviews += 1
+        metrics.REVIEWS_INGESTED.labels(source=item["source"], result="new").inc()
+        if self.new_reviews % PERSIST_BATCH_SIZE == 0:
+            self.db.commit()
+
+async def score_unscored_reviews(ai: RankingEngine, db: Session, restaurant_id: int) -> int:
+    """ Retries sentiment for the restaurant's reviews that earlier visits couldn't score. Returns how many got a score. """
+    if not os.getenv("OPENAI_API_KEY"):
+        return 0
+    unscored = db.query(models.Review)\
+        .filter(models.Review.restaurant_id == restaurant_id, models.Review.sentiment_score.is_(None))\
+        .order_by(models.Review.id.desc())\
+        .limit(UNSCORED_RETRY_LIMIT).all()
+    if not unscored:
+        return 0
+    with metrics.stage("analyze_sentiment"):
+        scores = await ai.sentiment.score_many([review.content for review in unscored])
+    scored = 0
+    trending_counters = {}
+    for review, score in zip(unscored, scores):
+        if score is not None:
+            review.sentiment_score = score
+            published_at = review.published_at
+            if published_at and published_at.tzinfo is None:
+                # SQLite hands timestamps back without tzinfo; they are stored in UTC
+                published_at = published_at.replace(tzinfo=timezone.utc)
+            trending.record(db, trending_counters, restaurant_id, score, social=review.source != "google",
+                            event_time=published_at.timestamp() if published_at else None)
+            scored += 1
+    db.commit()
+    print(f"Scored {scored} of {len(unscored)} reviews left unscored by earlier visits.")
+    return scored
+
+async def process_restaurant(scraper: GoogleBusinessScraper, social: SocialMediaScanner, wolt: WoltTracker, ai: RankingEngine, db: Session, search_query: str, default_city: str, blocking: BlockingIndex = None) -> str:
+    """
+    Scrapes, scores and stores one restaurant. Returns the outcome: updated, unchanged, not_found or no_data.
+    `blocking` is the cycle's index of tracked restaurants; a one-off scrape loads its own when it needs one.
+    """
     print(f"\n--- Processing {search_query} ---")
+    resolver = EntityResolver(db, blocking)
+    seed_key = checkpoints.seed_key({"query": search_query, "city": default_city})
+    # Using search_query as name for now, or extract from Google API (which we don't have deeply parsed right now)
+    display_name = search_query.replace(f" {default_city}", "").strip()
     
-    # 1. Search for Place ID
-    place_id, address = scraper.search_place(search_query)
+    # 1. Resolve the Place ID (confirmed match, tracked restaurant, or a fresh search)
+    place_id, address, location, google_match = resolve_google_place(scraper, resolver, seed_key, search_query, default_city)
     if not place_id:
         print(f"Could not find Place ID for {search_query}")
-        return
+        metrics.RESTAURANTS_PROCESSED.labels(outcome="not_found").inc()
+        return "not_found"
+        
+    restaurant = db.query(models.Restaurant).filter(models.Restaurant.platform_id == place_id).first()
+    restaurant_id = restaurant.id if restaurant else None
         
-    # 2. Fetch Reviews from all sources
-    google_data = scraper.fetch_recent_reviews(place_id)
+    # 2. Fetch Reviews from all sources (only what changed since the last visit)
+    google_watermark = watermarks.get(db, restaurant_id, "google")
+    google_data = fetch_google_data(scraper, google_watermark, place_id)
+    google_failed = google_data.get("failed", False)
+    if google_match and not google_failed:
+        # Cheap re-validation: the details call (full or rating-only) already returns the place name
+        if google_data.get("name") and similarity(search_query, google_data["name"], default_city) < MATCH_THRESHOLD:
+            resolver.invalidate(google_match, f"place now named '{google_data['name']}'")
+            metrics.RESTAURANTS_PROCESSED.labels(outcome="not_found").inc()
+            return "not_found"
+        resolver.touch(google_match)
     google_reviews = google_data.get("reviews", [])
     google_rating = google_data.get("rating")
     google_ratings_total = google_data.get("user_ratings_total", 0)
     
-    for gr in google_reviews:
-        gr["source"] = "google"
-        
-    social_reviews = []
-    if social and social.client:
-        base_hashtag = search_query.replace(" ", "")
-        print(f"Pulling Tiktok/Insta for #{base_hashtag}...")
-        try:
-            tiktok_data = social.scan_tiktok_hashtags([base_hashtag])
-            if tiktok_data:
-                for item in tiktok_data:
-                    social_reviews.append({"text": item.get("text", ""), "source": "tiktok", "time": None})
-            
-            insta_data = social.scan_instagram_tags([base_hashtag])
-            if insta_data:
-                for item in insta_data:
-                    social_reviews.append({"text": item.get("text", ""), "source": "instagram", "time": None})
-                    
-            fb_data = social.scan_facebook_posts(search_query)
-            if fb_data:
-                for item in fb_data:
-                    social_reviews.append({"text": item.get("text", ""), "source": "facebook", "time": None})
-                    
-        except Exception as e:
-            print(f"Warning: Social scraping failed - {e}")
-            
-    # Combine reviews
-    reviews_data = google_reviews + social_reviews
-    
-    if not reviews_data:
-        print(f"Skipping {search_query} due to lack of data.")
-        return
-        
-    # 3. Get or Create Restaurant in DB
-    restaurant = db.query(models.Restaurant).filter(models.Restaurant.platform_id == place_id).first()
+    lat = location.get("lat") if location else None
+    lng = location.get("lng") if location else None
     
-    if not restaurant:
-        # Determine Region
-        region = get_region_by_city(default_city) or "center" # fallback
-        
-        # Using search_query as name for now, or extract from Google API (which we don't have deeply parsed right now)
-        display_name = search_query.replace(f" {default_city}", "").strip()
+    if restaurant:
+        # Update ratings if changed; a failed Google call keeps the last known rating
+        if not google_failed:
+            restaurant.google_rating = google_rating
+            restaurant.google_ratings_total = google_ratings_total
+        if lat is not None and lng is not None and (restaurant.lat != lat or restaurant.lng != lng):
+            # Backfill coordinates for places created before we stored them, and re-file their region
+            restaurant.lat, restaurant.lng = lat, lng
+            restaurant.region = get_region_by_coords(lat, lng)
+        db.commit()
+
+    def create_restaurant():
+        # Determine Region: coordinates first, then the city name table
+        region = get_region_by_coords(lat, lng) or get_region_by_city(default_city) or "center" # fallback
         
-        restaurant = models.Restaurant(
+        created = models.Restaurant(
             name=display_name,
             city=default_city,
             region=region,
             platform_id=place_id,
             address=address,
+            lat=lat,
+            lng=lng,
             google_rating=google_rating,
             google_ratings_total=google_ratings_total
         )
-        db.add(restaurant)
-        db.commit()
-        db.refresh(restaurant)
-    else:
-        # Update ratings if changed
-        restaurant.google_rating = google_rating
-        restaurant.google_ratings_total = google_ratings_total
+        db.add(created)
         db.commit()
+        db.refresh(created)
+        # Later seeds of the cycle can adopt it without a search
+        resolver.remember(created)
+        return created
 
-    # 4. Process Reviews 
-    new_reviews_count = 0
-    for rev_data in reviews_data:
-        content = rev_data.get("text", "")
-        source_name = rev_data.get("source", "google")
-        if not content:
-            continue
-            
-        existing = db.query(models.Review).filter(
-            models.Review.restaurant_id == restaurant.id,
-            models.Review.content == content
-        ).first()
-        
-        if existing:
-            continue
-            
-        # Analyze new review
-        sentiment = ai.analyze_sentiment(content)
-        
-        # We need a proper datetime from Google's 'time' (timestamp)
-        timestamp = rev_data.get("time")
-        published_at = datetime.fromtimestamp(timestamp, tz=timezone.utc) if timestamp else datetime.now(timezone.utc)
-        
-        weight = ai.calculate_recency_weight(published_at)
-        
-        review = models.Review(
-            restaurant_id=restaurant.id,
-            source=source_name,
-            content=content,
-            sentiment_score=sentiment,
-            weight=weight,
-            published_at=published_at
-        )
-        db.add(review)
-        new_reviews_count += 1
-        
+    if restaurant_id is not None:
+        await score_unscored_reviews(ai, db, restaurant_id)
+
+    # 3. Stream the reviews through fetch -> normalize/dedup -> sentiment -> persist
+    social_watermarks = {}
+    social_plan = None
+    # Matched posts in this scan; stays None when a scan was skipped or failed, so the stored volume is used
+    social_volume = None if social and social.client else 0
+    if social and social.client:
+        social_watermarks = {source: watermarks.get(db, restaurant_id, source) for source, _ in SOCIAL_SCANS}
+        if not any(watermarks.due(w, watermarks.SOCIAL_RESCAN_HOURS) for w in social_watermarks.values()):
+            metrics.CACHE_HITS.labels(cache="social_watermark").inc()
+        else:
+            social_match = resolver.lookup(seed_key, "social")
+            base_hashtag = social_match.external_id if social_match else display_name.replace(" ", "")
+            if not social_match:
+                resolver.confirm(seed_key, "social", base_hashtag, display_name)
+            print(f"Pulling Tiktok/Insta for #{base_hashtag}...")
+            social_plan = base_hashtag
+
+    ingest = ReviewIngest(ai, db, restaurant, create_restaurant, display_name, default_city, social_watermarks)
+    producers = [ingest.feed_google(google_reviews)]
+    if social_plan:
+        # The actor runs block, so each goes to its own thread and they overlap with each other and with scoring
+        producers += [ingest.stream.produce_in_thread(ingest.scan_social, social, source, scan, social_plan, search_query)
+                      for source, scan in SOCIAL_SCANS]
+    await ingest.stream.run(*producers)
     db.commit()
+    if social_plan:
+        if all(ingest.scan_ok.get(source) for source, _ in SOCIAL_SCANS):
+            social_volume = ingest.matched
+        if ingest.captions:
+            report_clusters(search_query, ingest.near_duplicates, ingest.captions)
+    
+    restaurant = ingest.restaurant
+    if restaurant is None:
+        print(f"Skipping {search_query} due to lack of data.")
+        metrics.RESTAURANTS_PROCESSED.labels(outcome="no_data").inc()
+        return "no_data"
+    new_reviews_count = ingest.new_reviews
+
+    # Watermarks only advance once the reviews they vouch for are stored
+    if not google_failed:
+        if google_data.get("unchanged"):
+            watermarks.record(db, restaurant.id, "google")
+        else:
+            watermarks.record(db, restaurant.id, "google", full_fetch=True, reviews=google_reviews, ratings_total=google_ratings_total)
+    for source, ok in ingest.scan_ok.items():
+        if ok:
+            watermarks.record(db, restaurant.id, source, urls=ingest.social_seen.get(source))
     
     # 5. Get Wolt Rating (Optional)
-    wolt_rating = 0.0
-    try:
-        slug = wolt.search_venue(search_query)
-        if slug:
-            load = wolt.check_delivery_load(slug)
-            if load and load.get("rating"):
-                wolt_rating = float(load.get('rating').get('score', 0.0)) if isinstance(load.get('rating'), dict) else float(load.get('rating'))
-                print(f"Wolt rating found: {wolt_rating}")
-    except Exception as e:
-        pass
+    wolt_rating = None
+    if watermarks.due(watermarks.get(db, restaurant.id, "wolt"), watermarks.WOLT_RESCAN_HOURS):
+        try:
+            with metrics.stage("wolt"):
+                wolt_rating = fetch_wolt_rating(wolt, resolver, seed_key, display_name, default_city, restaurant.lat, restaurant.lng)
+                if wolt_rating:
+                    print(f"Wolt rating found: {wolt_rating}")
+        except Exception as e:
+            pass
+    if wolt_rating is None:
+        wolt_rating = restaurant.wolt_rating or 0.0
+    else:
+        restaurant.wolt_rating = wolt_rating
+        watermarks.record(db, restaurant.id, "wolt")
+    if social_volume is not None:
+        restaurant.social_volume = social_volume
+    social_volume = restaurant.social_volume or 0
     
     # 5. Recalculate Scores
+    rescore_timer = time.perf_counter()
     all_reviews = db.query(models.Review).filter(models.Review.restaurant_id == restaurant.id).all()
+    # Reviews moved to the cold archive still count, through their per-source totals
+    archived = retention.archived_summaries(db, restaurant.id)
+    all_reviews += archived
+    # Unscored reviews count as reviews but stay out of the sentiment averages until they get a score
+    scored_reviews = [r for r in all_reviews if r.sentiment_score is not None]
     
     if all_reviews:
         # Calculate Net Sentiment (just for tracking NLP portion separately)
-        restaurant.last_score = ai.calculate_net_sentiment_score(all_reviews)
-        restaurant.total_reviews = len(all_reviews)
+        restaurant.last_score = ai.calculate_net_sentiment_score(scored_reviews)
+        restaurant.total_reviews = len(all_reviews) - len(archived) + sum(a.review_count for a in archived)
         
         # New Scoring System: Base on long-term Google rating, modified by recent NLP chatters
         restaurant.bayesian_average = ai.calculate_final_radar_score(
             google_rating=restaurant.google_rating,
             google_ratings_total=restaurant.google_ratings_total,
-            recent_reviews=all_reviews,
+            recent_reviews=scored_reviews,
             wolt_rating=wolt_rating,
-            social_volume=len(social_reviews)
+            social_volume=social_volume
         )
         
         db.commit()
         print(f"Updated {restaurant.name} -> New Final Score: {restaurant.bayesian_average:.2f}")
+    metrics.STAGE_SECONDS.labels(stage="rescore").observe(time.perf_counter() - rescore_timer)
+    outcome = "unchanged" if google_data.get("unchanged") and not new_reviews_count else "updated"
+    metrics.RESTAURANTS_PROCESSED.labels(outcome=outcome).inc()
+    return outcome
 
-def run_single_scrape_sync(query: str, city: str = "ישראל"):
+def run_single_scrape_sync(query: str, city: str = "ישראל") -> str:
     print(f"Triggering manual scrape for {query}...")
     db: Session = next(get_db())
     scraper = GoogleBusinessScraper()
@@ -164,18 +486,80 @@ def run_single_scrape_sync(query: str, city: str = "ישראל"):
     wolt = WoltTracker()
     ai = RankingEngine()
     
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    loop.run_until_complete(process_restaurant(scraper, social, wolt, ai, db, query, city))
-    loop.close()
+    try:
+        with profiling.maybe_profile("restaurant", query), resilience.deadline(resilience.RESTAURANT_DEADLINE_SECONDS):
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            try:
+                return loop.run_until_complete(process_restaurant(scraper, social, wolt, ai, db, query, city))
+            finally:
+                loop.run_until_complete(ai.sentiment.aclose())
+                loop.close()
+    finally:
+        db.close()
 
-def run_cron_cycle_sync():
-    print("Starting background worker cycle...")
-    db: Session = next(get_db())
+def make_seed_handler(db: Session):
+    """ A sharding.work_seeds handler that runs process_restaurant for one seed on the given session """
     scraper = GoogleBusinessScraper()
     social = SocialMediaScanner()
     wolt = WoltTracker()
     ai = RankingEngine()
+    # Loaded once for the first seed, then shared by every seed this handler processes
+    blocking = None
+
+    def handle(target: dict, budget_left: float = None):
+        nonlocal blocking
+        seed_deadline = resilience.RESTAURANT_DEADLINE_SECONDS if budget_left is None else min(resilience.RESTAURANT_DEADLINE_SECONDS, budget_left)
+        outcome, error = "failed", None
+        with profiling.maybe_profile("restaurant", target["query"]), resilience.deadline(seed_deadline):
+            # Create a new event loop just for this thread execution
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            try:
+                if blocking is None:
+                    blocking = load_blocking_index(db)
+                outcome = loop.run_until_complete(process_restaurant(scraper, social, wolt, ai, db, target["query"], target["city"], blocking))
+            except Exception as e:
+                # One broken seed shouldn't abort the whole pass
+                print(f"Error processing {target['query']}: {e}")
+                db.rollback()
+                error = str(e)
+            finally:
+                # One OpenAI connection pool per seed, reused by every scoring burst in it
+                loop.run_until_complete(ai.sentiment.aclose())
+                loop.close()
+        return outcome, error
+
+    return handle
+
+def work_running_cycle_sync(holder: str, stop_event=None) -> int:
+    """
+    Helps with the cycle the leader is running, if any: claims and processes seeds until none are left to claim.
+    Completing and publishing the cycle stays with the leader. Returns the number of seeds processed.
+    """
+    db: Session = next(get_db())
+    try:
+        cycle_id = sharding.running_cycle_id(db)
+        if cycle_id is None:
+            return 0
+        processed, _ = sharding.work_seeds(db, cycle_id, holder, make_seed_handler(db), stop_event=stop_event,
+                                           budget_seconds=resilience.CYCLE_BUDGET_SECONDS)
+        if processed:
+            print(f"Processed {processed} seeds of cycle {cycle_id}.")
+        return processed
+    finally:
+        db.close()
+
+def run_cron_cycle_sync(stop_event=None, holder: str = None):
+    """
+    Runs one full pass over the seeds, resuming a checkpointed pass if one is unfinished.
+    Seeds are handed out through leases (see sharding.py), so other crawlers running work_running_cycle_sync
+    share the pass; this one waits for their seeds too, then completes and publishes the cycle.
+    `stop_event` (a threading.Event) aborts between seeds, e.g. when leadership is lost.
+    Returns the cycle summary, or None when the pass was interrupted.
+    """
+    print("Starting background worker cycle...")
+    holder = holder or make_holder_id()
     
     import json
     import os
@@ -197,14 +581,46 @@ def run_cron_cycle_sync():
             {"query": "שווארמה חזן חיפה", "city": "חיפה"}
         ]
     
-    for target in seed_targets:
-        # Create a new event loop just for this thread execution
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(process_restaurant(scraper, social, wolt, ai, db, target["query"], target["city"]))
-        loop.close()
-        
-    print("Cycle complete.")
+    metrics.CYCLE_IN_PROGRESS.set(1)
+    db: Session = None
+    try:
+        try:
+            db = next(get_db())
+            cycle, completed_keys = checkpoints.start_or_resume(db, len(seed_targets))
+            enqueued = sharding.enqueue_seeds(db, cycle.id, seed_targets, completed_keys)
+            if enqueued:
+                print(f"Queued {enqueued} seed leases for cycle {cycle.id}.")
+            with profiling.maybe_profile("cycle"):
+                processed_now, interrupted = sharding.work_seeds(
+                    db, cycle.id, holder, make_seed_handler(db), stop_event=stop_event,
+                    budget_seconds=resilience.CYCLE_BUDGET_SECONDS, wait_for_others=True
+                )
+        finally:
+            metrics.CYCLE_IN_PROGRESS.set(0)
+
+        metrics.CYCLE_LAST_SEEDS.set(processed_now)
+        if interrupted:
+            return None
+
+        summary = checkpoints.complete(db, cycle)
+        try:
+            # Rankings only move once per cycle, so this is when readers get a new static snapshot
+            with metrics.stage("publish"):
+                publish.publish_snapshots(db, cycle.id)
+        except Exception as e:
+            print(f"Snapshot publish failed: {e}")
+        try:
+            with metrics.stage("retention"):
+                retention.archive_old_reviews(db)
+        except Exception as e:
+            db.rollback()
+            print(f"Review archiving failed: {e}")
+    finally:
+        if db is not None:
+            db.close()
+    print("Cycle complete. " + checkpoints.format_report(summary))
+    metrics.CYCLE_LAST_DURATION.set(summary["wall_seconds"])
+    metrics.CYCLE_LAST_FINISHED.set_to_current_time()
     
     # 6. Dispatch Telegram Notification to Developer
     try:
@@ -213,7 +629,8 @@ def run_cron_cycle_sync():
         chat_id = os.getenv("TELEGRAM_CHAT_ID")
         
         if bot_token and chat_id:
-            msg = f"🔔 *ShawarmaRadar Update*\nהסורק השלים סיבוב מלא על {len(seed_targets)} עסקים בהצלחה! הנתונים סונכרנו למסד הנתונים."
+            msg = f"🔔 *ShawarmaRadar Update*\nהסורק השלים סיבוב מלא על {len(seed_targets)} עסקים בהצלחה! הנתונים סונכרנו למסד הנתונים.\n" \
+                  f"עודכנו: {summary['outcomes'].get('updated', 0)} | דולגו: {summary['skipped']} | נכשלו: {summary['failed']} | משך: {summary['wall_seconds'] / 60:.0f} דק'"
             url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
             
             payload = {
@@ -230,6 +647,8 @@ def run_cron_cycle_sync():
             print("Telegram credentials not found in ENV. Skipping notification.")
     except Exception as e:
         print(f"Failed to send Telegram notification: {e}")
+        
+    return summary
 
 async def run_cron_cycle():
     # Helper to prevent blocking main event loop since Apify client is sync
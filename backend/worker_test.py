@@ -17,7 +17,7 @@ async def run_tel_aviv_demo():
     
     for target in target_places:
         print(f"\n--- Scanning {target} ---")
-        place_id = scraper.search_place(target)
+        place_id, address, location = scraper.search_place(target)
         if not place_id:
             print(f"Could not find a place ID for {target}")
             continue
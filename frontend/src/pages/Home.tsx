@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { useTranslation } from 'react-i18next';
 import './Home.css';
 import { Crown, Info, Share2, Info as InfoIcon, Activity, MessageCircle, Download, Globe } from 'lucide-react';
+import { fetchView } from '../snapshots';
 
 const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
 
@@ -47,12 +48,9 @@ const Home: React.FC = () => {
 
   const fetchData = async () => {
     try {
-      const rankRes = await fetch(`${API_URL}/api/rankings/national`);
-      if (rankRes.ok) {
-        const rankData = await rankRes.json();
-        setNationalKing(rankData.king);
-        setRunnersUp(rankData.runnersUp || []);
-      }
+      const rankData = await fetchView<{ king: Restaurant | null; runnersUp: Restaurant[] }>('national', '/api/rankings/national');
+      setNationalKing(rankData.king);
+      setRunnersUp(rankData.runnersUp || []);
     } catch (error) {
       console.error("Failed to fetch data", error);
     } finally {
@@ -4,8 +4,7 @@ import { useTranslation } from 'react-i18next';
 import TensionMeter from '../components/TensionMeter';
 import { MapPin } from 'lucide-react';
 import './RegionalDashboard.css';
-
-const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
+import { fetchView } from '../snapshots';
 
 interface Restaurant {
   id: number;
@@ -38,11 +37,8 @@ const RegionalDashboard: React.FC = () => {
   const fetchRegionalRankings = async () => {
     if (!id) return;
     try {
-      const response = await fetch(`${API_URL}/api/rankings/region/${id}`);
-      if (response.ok) {
-        const data = await response.json();
-        setRestaurants(data);
-      }
+      const data = await fetchView<Restaurant[]>(`region-${id}`, `/api/rankings/region/${id}`);
+      setRestaurants(data);
     } catch (error) {
       console.error("Failed to fetch regional rankings", error);
     } finally {
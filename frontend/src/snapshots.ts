@@ -0,0 +1,59 @@
+// Leaderboard reads go to the static snapshots the crawler publishes after every cycle
+// (latest.json -> versioned, immutable files), falling back to the live API if they are unavailable.
+const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
+const SNAPSHOT_URL = import.meta.env.VITE_SNAPSHOT_URL || `${API_URL}/snapshots`;
+// A bucket doesn't negotiate encodings, so ask it for the precompressed copy (stored with Content-Encoding: gzip,
+// which the browser inflates); the API's /snapshots route picks the .gz itself when gzip is accepted
+const FILE_SUFFIX = import.meta.env.VITE_SNAPSHOT_URL ? '.gz' : '';
+// Nothing published there yet (404): go straight to the API for a while instead of asking on every poll
+const MISSING_RETRY_MS = 10 * 60 * 1000;
+// Any other failure (network, 5xx) is usually brief
+const ERROR_RETRY_MS = 60 * 1000;
+
+let snapshotsOffUntil = 0;
+
+interface SnapshotPointer {
+  version: string;
+  files: Record<string, string>;
+}
+
+class HttpError extends Error {
+  status: number;
+
+  constructor(url: string, status: number) {
+    super(`${url} answered ${status}`);
+    this.status = status;
+  }
+}
+
+const fetchJson = async <T,>(url: string, init?: RequestInit): Promise<T> => {
+  const res = await fetch(url, init);
+  if (!res.ok) throw new HttpError(url, res.status);
+  return res.json();
+};
+
+/** `view` is a snapshot name (national, recent, region-north); `apiPath` the equivalent live endpoint */
+export const fetchView = async <T,>(view: string, apiPath: string): Promise<T> => {
+  if (Date.now() < snapshotsOffUntil) {
+    return fetchJson<T>(`${API_URL}${apiPath}`);
+  }
+  let pointer: SnapshotPointer;
+  try {
+    // The pointer is tiny and revalidated every time; the versioned file it names is cached forever
+    pointer = await fetchJson<SnapshotPointer>(`${SNAPSHOT_URL}/latest.json`, { cache: 'no-cache' });
+  } catch (error) {
+    const missing = error instanceof HttpError && error.status === 404;
+    snapshotsOffUntil = Date.now() + (missing ? MISSING_RETRY_MS : ERROR_RETRY_MS);
+    console.warn(`Snapshot pointer unavailable, using the API for ${view}`, error);
+    return fetchJson<T>(`${API_URL}${apiPath}`);
+  }
+  try {
+    const file = pointer.files[view];
+    if (file) {
+      return await fetchJson<T>(`${SNAPSHOT_URL}/${file}${FILE_SUFFIX}`);
+    }
+  } catch (error) {
+    console.warn(`Snapshot for ${view} unavailable, using the API`, error);
+  }
+  return fetchJson<T>(`${API_URL}${apiPath}`);
+};